@@ -1,186 +1,37 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from datetime import datetime
 import plotly.express as px
 from st_aggrid import AgGrid, GridOptionsBuilder
 import os
 import io
-import sqlite3
+import json
 import time
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-import tempfile
+import uuid
+from collections import deque
 from kiteconnect import KiteConnect
 from dotenv import load_dotenv
-
-# Utility Functions
-def calculate_ev(row):
-    return (row['Number of equity shares'] * row['Current Price']) + row['Debt'] - row['Cash Equivalents']
-
-def calculate_ev_ebitda(row):
-    if row['EBITDA'] != 0:
-        return row['Enterprise Value'] / row['EBITDA']
-    return None
-
-def calculate_equity_value_per_share(row, scene_growth_multiplier):
-    estimated_growth = row['Operating profit growth'] / 100
-    estimated_growth *= scene_growth_multiplier
-    estimated_ebitda = row['EBITDA'] * (1 + estimated_growth)
-    expected_ev = estimated_ebitda * row['EV/EBITDA']
-    expected_equity_value = expected_ev - row['Debt']
-    if row['Number of equity shares'] <= 0:
-        return None
-    return expected_equity_value / row['Number of equity shares']
-
-def calculate_ev_ebitda_share_price(df):
-    scene_multipliers = [1, 0.8, 0.7, 0.6]
-    for index, row in df.iterrows():
-        equity_values_per_scene = []
-        for multiplier in scene_multipliers:
-            equity_value = calculate_equity_value_per_share(row, multiplier)
-            if equity_value is not None:
-                equity_values_per_scene.append(equity_value)
-        if equity_values_per_scene:
-            df.loc[index, 'Value as per EV/EBITDA Method'] = sum(equity_values_per_scene) / len(equity_values_per_scene)
-        else:
-            df.loc[index, 'Value as per EV/EBITDA Method'] = None
-    return df
-
-def calculate_revenue_method_share_price(df):
-    for index, row in df.iterrows():
-        try:
-            market_cap = row['Number of equity shares'] * row['Current Price']
-            ttm_revenue = row['Sales']
-            revenue_multiple = market_cap / ttm_revenue if ttm_revenue != 0 else None
-            if revenue_multiple is not None:
-                revenue_growth_a = row['Sales growth'] / 100
-                estimated_revenue_a = ttm_revenue * (1 + revenue_growth_a)
-                expected_mcap_a = estimated_revenue_a * revenue_multiple
-                price_per_share_a = expected_mcap_a / row['Number of equity shares']
-
-                revenue_growth_b = revenue_growth_a * 0.9
-                estimated_revenue_b = ttm_revenue * (1 + revenue_growth_b)
-                expected_mcap_b = estimated_revenue_b * revenue_multiple
-                price_per_share_b = expected_mcap_b / row['Number of equity shares']
-
-                df.loc[index, 'Value as per Revenue Method'] = (price_per_share_a + price_per_share_b) / 2
-            else:
-                df.loc[index, 'Value as per Revenue Method'] = None
-        except:
-            df.loc[index, 'Value as per Revenue Method'] = None
-    return df
-
-def calculate_pe_method_share_price(df):
-    for index, row in df.iterrows():
-        try:
-            ttm_pat = row['Profit after tax'] if pd.notnull(row['Profit after tax']) else 1
-            pat_growth = (row['Profit growth'] / 100) if pd.notnull(row['Profit growth']) else 0
-            price_to_earning = max(row['Price to Earning'], 1) if pd.notnull(row['Price to Earning']) else 1
-            industry_pe = max(row['Industry PE'], 1) if pd.notnull(row['Industry PE']) else 1
-            num_equity_shares = row['Number of equity shares'] if pd.notnull(row['Number of equity shares']) else 1
-
-            estimated_pat_a = ttm_pat * (1 + pat_growth)
-            expected_mcap_a = estimated_pat_a * price_to_earning
-            price_per_share_a = expected_mcap_a / num_equity_shares
-
-            pat_growth_b = pat_growth * 0.7
-            estimated_pat_b = ttm_pat * (1 + pat_growth_b)
-            expected_mcap_b = estimated_pat_b * price_to_earning
-            price_per_share_b = expected_mcap_b / num_equity_shares
-
-            estimated_pat_c = ttm_pat * (1 + pat_growth)
-            expected_mcap_c = estimated_pat_c * industry_pe
-            price_per_share_c = expected_mcap_c / num_equity_shares
-
-            pat_growth_d = pat_growth * 0.7
-            estimated_pat_d = ttm_pat * (1 + pat_growth_d)
-            expected_mcap_d = estimated_pat_d * industry_pe
-            price_per_share_d = expected_mcap_d / num_equity_shares
-
-            final_value_pe = (
-                (price_per_share_a * 0.2) +
-                (price_per_share_b * 0.2) +
-                (price_per_share_c * 0.3) +
-                (price_per_share_d * 0.3)
-            )
-
-            df.loc[index, 'Value as per PE Multiple'] = final_value_pe
-        except Exception as e:
-            df.loc[index, 'Value as per PE Multiple'] = None
-    return df
-
-def calculate_pb_method_share_price(df):
-    for index, row in df.iterrows():
-        try:
-            price_to_book = max(row['Price to book value'], 1) if pd.notnull(row['Price to book value']) else 1
-            industry_pb = max(row['Industry PBV'], 1) if pd.notnull(row['Industry PBV']) else 1
-            book_value_2yr_back = max(row['Book value preceding year'], 1) if pd.notnull(row['Book value preceding year']) else 1
-            book_value = max(row['Book value'], 1) if pd.notnull(row['Book value']) else 1
-
-            if price_to_book == 1 or industry_pb==1 or book_value_2yr_back==1 or book_value==1:
-                PB_elements_is_1 = "yes"
-            else:
-                PB_elements_is_1 = "no"
-
-            growth_in_book_value_a = ((book_value / book_value_2yr_back)**0.5 - 1) * 100
-            growth_in_book_value_b = growth_in_book_value_a * 0.8
-            growth_in_book_value_c = growth_in_book_value_a
-            growth_in_book_value_d = growth_in_book_value_c * 0.8
-
-            expected_book_value_a = book_value * (1 + growth_in_book_value_a / 100)
-            expected_book_value_b = book_value * (1 + growth_in_book_value_b / 100)
-            expected_book_value_c = book_value * (1 + growth_in_book_value_c / 100)
-            expected_book_value_d = book_value * (1 + growth_in_book_value_d / 100)
-
-            expected_market_price_a = expected_book_value_a * price_to_book
-            expected_market_price_b = expected_book_value_b * price_to_book
-            expected_market_price_c = expected_book_value_c * industry_pb
-            expected_market_price_d = expected_book_value_d * industry_pb
-
-            final_expected_market_price_a = expected_market_price_a * 0.3
-            final_expected_market_price_b = expected_market_price_b * 0.3
-            final_expected_market_price_c = expected_market_price_c * 0.2
-            final_expected_market_price_d = expected_market_price_d * 0.2
-
-            average_market_price_per_share = (
-                final_expected_market_price_a +
-                final_expected_market_price_b +
-                final_expected_market_price_c +
-                final_expected_market_price_d
-            )
-
-            df.loc[index, 'Value as per PB Multiple'] = average_market_price_per_share
-            df.loc[index, 'PB_elements_is_1'] = PB_elements_is_1
-        except Exception as e:
-            df.loc[index, 'Value as per PB Multiple'] = None
-            st.warning(f"Error processing row, for company {df.loc[index, 'Name']}: {e}")
-    return df
-
-def calculate_gain_percentage(df):
-    for index, row in df.iterrows():
-        try:
-            gain = ((
-                0.25 * row['Value as per PE Multiple'] +
-                0.25 * row['Value as per EV/EBITDA Method'] +
-                0.25 * row['Value as per Revenue Method'] +
-                0.25 * row['Value as per PB Multiple']
-            ) - row['Current Price']) / row['Current Price'] * 100
-
-            df.loc[index, 'Gain%'] = gain
-            df.loc[index, 'Final expected price'] = (
-                0.25 * row['Value as per PE Multiple'] +
-                0.25 * row['Value as per EV/EBITDA Method'] +
-                0.25 * row['Value as per Revenue Method'] +
-                0.25 * row['Value as per PB Multiple']
-            )
-        except Exception as e:
-            print(f"Error calculating gain for row {index}: {e}")
-            df.loc[index, 'Gain%'] = None 
-            df.loc[index, 'Final expected price'] = None 
-    return df
+from finx.cache import SnapshotCache, get_processed_snapshot
+from finx.broker import KiteData
+from finx.live import KiteTickStream, LivePortfolio
+from finx.backtest import build_panel, load_snapshot_history, run_backtest
+from finx.delta import GAIN_MOVE_THRESHOLD, change_report
+from finx.db import connect
+from finx.snapshots import get_latest_snapshot_info, get_latest_upload_time, get_previous_snapshot_info, get_storage_data, save_snapshot
+from finx.universe import load_universe
+from finx.montecarlo import MonteCarloConfig, run_monte_carlo
+from finx import portfolio_store
+from finx.portfolio import PORTFOLIO_COLUMNS, consolidate_portfolios, process_portfolio_data, summarise_portfolios
+from finx.scenarios import SWEEP_FIELDS, evaluate_scenarios, sweep
+from finx.grid import GridSource
+from finx.health import MAX_COMPARE, HealthTable
+from finx.instrumentation import INSTRUMENTATION, log_to_file, span
+from finx.fetcher import ScreenerHttpFetcher, fetch_screen_export
+from finx.scraper import ScreenerSessionPool
+from finx.screening import DISPLAY_COLUMNS, SPLIT_NAMES, default_screen, split_company_list, split_mask
+from finx.ranking import DEFAULT_WEIGHTS, factor_scores, rank_companies
+from finx.screens import CompiledScreen, ScreenData, ScreenError, delete_screen, load_compiled_screens, save_screen, screen_counts
 
 # Streamlit App
 st.set_page_config(page_title="Financial Dashboard & Portfolio Analysis", layout="wide", page_icon="📈")
@@ -196,75 +47,87 @@ USERNAME = os.getenv("SCRAPER_USERNAME", "default_username")
 PASSWORD = os.getenv("SCRAPER_PASSWORD", "default_password")
 CHROMEDRIVER_PATH = os.getenv("CHROMEDRIVER_PATH", "chromedriver-win64\\chromedriver.exe")
 
-def init_driver(download_dir):
-    options = Options()
-    prefs = {"download.default_directory": download_dir}
-    options.add_experimental_option("prefs", prefs)
-    options.add_argument("--no-sandbox")
-    options.add_argument("--headless")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--disable-extensions")
-    options.add_argument("--disable-gpu")
-    options.add_experimental_option("excludeSwitches", ["enable-automation"])
-    options.add_experimental_option("useAutomationExtension", False)
-    options.add_argument(
-        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    )
-    driver = webdriver.Chrome(service=Service(CHROMEDRIVER_PATH), options=options)
-    return driver
-
-def download_file_from_screener_with_login(url, download_dir):
-    driver = init_driver(download_dir)
+SCRAPER_POOL_SIZE = int(os.getenv("SCRAPER_POOL_SIZE", "1"))
+
+# Stage timing spans: off unless FINX_INSTRUMENTATION is set, and each session can switch them on
+# for its own reruns; spans can also be appended to a JSON lines file and the per-stage totals
+# written for a Prometheus textfile collector
+PERF_INSTRUMENTATION = os.getenv("FINX_INSTRUMENTATION", "").lower() in ("1", "true", "yes")
+PERF_SPAN_LOG = os.getenv("FINX_SPAN_LOG", "")
+PERF_PROMETHEUS_FILE = os.getenv("FINX_PROMETHEUS_FILE", "")
+
+# Reruns shown in the Performance panel
+PERF_HISTORY = int(os.getenv("PERF_HISTORY", "20"))
+
+# Configure the process-wide instrumentation once per server process
+@st.cache_resource
+def get_instrumentation():
+    INSTRUMENTATION.enabled = PERF_INSTRUMENTATION
+    INSTRUMENTATION.runs = deque(INSTRUMENTATION.runs, maxlen=PERF_HISTORY)
+    if PERF_SPAN_LOG:
+        log_to_file(PERF_SPAN_LOG)
+    return INSTRUMENTATION
+
+instrumentation = get_instrumentation()
+# Recording is a per-session setting (the "Record stage timings" checkbox); the process-wide
+# flag only sets its default. Runs are labelled with the session so each session sees its own.
+if "perf-session" not in st.session_state:
+    st.session_state["perf-session"] = uuid.uuid4().hex
+if "perf-enabled" not in st.session_state:
+    st.session_state["perf-enabled"] = instrumentation.enabled
+perf_session = st.session_state["perf-session"]
+# The panel shows the reruns before this one; this rerun's spans are grouped from here on
+previous_runs = [run for run in instrumentation.runs if run['label'] == perf_session]
+if st.session_state["perf-enabled"] and PERF_PROMETHEUS_FILE:
+    instrumentation.write_prometheus(PERF_PROMETHEUS_FILE)
+instrumentation.start_run(perf_session, enabled=st.session_state["perf-enabled"])
+
+# One logged-in HTTP session per server process; exports are fetched without a browser
+@st.cache_resource
+def get_screener_fetcher():
+    return ScreenerHttpFetcher(USERNAME, PASSWORD)
+
+# One pool of logged-in browser sessions per server process, only started when the HTTP fetch fails
+@st.cache_resource
+def get_screener_pool():
+    return ScreenerSessionPool(USERNAME, PASSWORD, CHROMEDRIVER_PATH, size=SCRAPER_POOL_SIZE)
+
+# Returns the scraped export, or None when it failed or the screen did not change since the last scrape
+def download_file_from_screener_with_login(url):
     try:
-        driver.get("https://www.screener.in/login/")
-        wait = WebDriverWait(driver, 10)
-
-        # Input credentials
-        username_field = wait.until(lambda d: d.find_element(By.NAME, "username"))
-        username_field.send_keys(USERNAME)
-
-        password_field = driver.find_element(By.NAME, "password")
-        password_field.send_keys(PASSWORD)
-
-        login_button = driver.find_element(By.XPATH, "//button[@type='submit']")
-        login_button.click()
-        time.sleep(3)  # Allow login
-
-        # Navigate to the target URL
-        driver.get(url)
-        time.sleep(3)  # Allow page load
-
-        # Trigger file download
-        download_button = wait.until(
-            lambda d: d.find_element(By.XPATH, "//button[contains(@class, 'tooltip-left')]")
-        )
-        download_button.click()
-        time.sleep(5)  # Wait for download
-
-        # Return downloaded file path
-        downloaded_files = [f for f in os.listdir(download_dir) if f.endswith(".csv")]
-        if downloaded_files:
-            return os.path.join(download_dir, downloaded_files[0])
-        else:
-            raise FileNotFoundError("Failed to download the file.")
+        with span('scrape'):
+            export = fetch_screen_export(url, get_screener_fetcher(), get_screener_pool())
     except Exception as e:
         st.error(f"An error occurred: {e}")
         return None
-    finally:
-        driver.quit()
-
-# Function to configure AgGrid table
+    if export is None:
+        st.info("The screen has not changed since the last scrape.")
+    return export
+
+# Rows per dashboard grid page
+GRID_PAGE_SIZE = 10
+
+# Titles of the dashboard lists
+LIST_LABELS = {
+    'non_sme': "Non-SME Companies",
+    'sme': "SME Companies",
+    'non_sme_screened': "Non-SME Screened Companies",
+    'sme_screened': "SME Screened Companies",
+}
+
+# Function to configure AgGrid table.
+# The grids only ever hold one page; paging, sorting and the Name filter run server-side in GridSource.
 def configure_aggrid(df):
     gb = GridOptionsBuilder.from_dataframe(df)
     gb.configure_default_column(
         wrapHeaderText=True,  # Wrap text in headers
         autoHeaderHeight=True,  # Adjust row height automatically
         resizable=True,  # Allow column resizing
-        filterable=True,  # Disable filtering (optional)
-        sortable=True  # Allow sorting
+        filterable=False,  # Filtering runs server-side
+        sortable=False  # Sorting runs server-side
     )
     # Set specific column widths
-    gb.configure_column("Name", filter="agTextColumnFilter", floatingFilter=True, width=90)
+    gb.configure_column("Name", width=90)
     gb.configure_column("Market Capitalisation", width=135)
     gb.configure_column("Current Price", width=100)
     gb.configure_column("Final expected price", width=120)
@@ -277,26 +140,21 @@ def configure_aggrid(df):
     gb.configure_grid_options(
         suppressHorizontalScroll=True,  # Prevent horizontal scrolling
         domLayout='autoHeight',  # Adjust table height dynamically
-        pagination=True,  # Enable pagination
-        paginationPageSize=10  # Show only 10 rows per page
     )
     grid_options = gb.build()
     return grid_options
 
 # Process Data Function
-def process_financial_data(input_file):
+# Returns the cached snapshot (processed data, valuation index and peer index) for a stored version,
+# valuing its typed columns only on a cache miss. When the version stored before it
+# (previous_info) is still in the cache's memory and few rows changed, only those are revalued.
+def load_stored_snapshot(snapshot_info, previous_info=None):
     try:
-        data = pd.read_csv(input_file)
-        data['EBITDA'] = data['Operating profit']
-        data['Market Capitalisation'] = data['Market Capitalization']
-        data['Enterprise Value'] = data.apply(calculate_ev, axis=1)
-        data['EV/EBITDA'] = data.apply(calculate_ev_ebitda, axis=1)
-        data = calculate_ev_ebitda_share_price(data)
-        data = calculate_revenue_method_share_price(data)
-        data= calculate_pe_method_share_price(data)
-        data = calculate_pb_method_share_price(data)
-        data = calculate_gain_percentage(data)
-        return data
+        _, _, _, storage_id, file_hash = snapshot_info
+        return get_processed_snapshot(
+            get_snapshot_cache(), file_hash, lambda: load_universe(DB_PATH, storage_id), source="universe",
+            previous_hash=previous_info[4] if previous_info else None, peer_mode=PEER_MULTIPLES_MODE,
+        )
     except Exception as e:
         st.error(f"An error occurred: {e}")
         return None
@@ -306,297 +164,320 @@ def convert_df_to_csv(df):
     return df.to_csv(index=False).encode('utf-8')
 
 
-def financial_health_summary(row):
-    # Create a dictionary for quick summary
-    summary = {
-        "SME": "Yes" if row['Is SME'] == 1 else "No",
-        "Market Capitalisation": f"{row['Market Capitalization']:,}",
-        "Promoters Holding%": f"{row['Promoter holding']/100:.2%}",
-        "Change in PM": f"{row['Change in promoter holding']:.2f}",
-        "Change in FII Hold%": f"{row['Change in FII holding']/100:.2%}",
-        "Change in DII Hold%": f"{row['Change in DII holding']/100:.2%}",
-        "Cash Conversion Cycle": f"{row['Cash Conversion Cycle']:.2f}",
-        "Price to Book Value%": f"{row['Price to book value']/100:.2%}",
-        "ROE%": f"{row['Return on equity']/100:.2%}",
-        "ROCE%": f"{row['Return on capital employed']/100:.2%}",
-        "ROIC%": f"{row['Return on invested capital']/100:.2%}",
-        "QOQ Sales%": f"{row['QoQ Sales']/100:.2%}",
-        "QOQ Profit%": f"{row['QoQ Profits']/100:.2%}",
-        "Net Profit (Latest Quarter)": f"{row['Net Profit latest quarter']:,}",
-        "Net Profit (3 Quarters Back)": f"{row['Net profit 3quarters back']:,}",
-        "OPM%": f"{row['OPM']/100:.2%}",
-        "YOY Sales%": f"{row['YOY Quarterly sales growth']/100:.2%}",
-        "YOY Profit%": f"{row['YOY Quarterly profit growth']/100:.2%}"
-    }
-
-    return pd.DataFrame([summary])
-
-
-def display_financial_health_summary(df):
+# Columns of metric tiles in the company summary
+SUMMARY_COLUMNS = 4
+
+# Function to show the health summary of one company, its metrics laid out in SUMMARY_COLUMNS columns
+def display_financial_health_summary(name, summary):
     st.markdown("## A Quick Look Into the Financial Health of the Company")
+    st.subheader(name)
+    columns = st.columns(SUMMARY_COLUMNS)
+    for i, (label, value) in enumerate(summary.items()):
+        columns[i % SUMMARY_COLUMNS].metric(label=label, value=value)
 
-    if isinstance(df, pd.Series):
-        df = df.to_frame().T  # Convert Series to DataFrame
+    # Add spacing between companies
+    st.markdown("<hr>", unsafe_allow_html=True)
 
-    for index, row in df.iterrows():
-        summary = financial_health_summary(row)
-        st.subheader(f"{row['Name']}")
-        # Use st.columns for layout
-        col1, col2, col3, col4 = st.columns(4)
+# Ensure directory exists
+UPLOAD_DIR = "uploaded_files"
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+DB_PATH = os.path.join(UPLOAD_DIR, "meta.db")
 
-        with col1:
-            st.metric(label="SME", value=summary['SME'].iloc[0]) # Or st.metric(label="SME", value=summary['SME'][0]) or st.metric(label="SME", value=summary['SME'].to_string())
-            st.metric(label="Market Capitalisation", value=summary['Market Capitalisation'].to_string())
-            st.metric(label="Promoters Holding%", value=summary['Promoters Holding%'].iloc[0])
-        with col2: 
-            st.metric(label="Change in PM", value=summary['Change in PM'].iloc[0])
-            st.metric(label="Cash Conversion Cycle", value=summary['Cash Conversion Cycle'].iloc[0])
-            st.metric(label="ROE%", value=summary['ROE%'].iloc[0])
+# Worker processes for parsing stored portfolios in the consolidated view
+PORTFOLIO_WORKERS = int(os.getenv("PORTFOLIO_WORKERS", "1"))
 
+# Default seconds between redraws of the live prices table
+LIVE_REFRESH_SECONDS = 1.0
 
-        with col3:
-            st.metric(label="Change in FII Hold%", value=summary['Change in FII Hold%'].iloc[0])
-            st.metric(label="Change in DII Hold%", value=summary['Change in DII Hold%'].iloc[0])
-            st.metric(label="Price to Book Value%", value=summary['Price to Book Value%'].iloc[0])
-        
-        with col4:
-            st.metric(label="ROCE%", value=summary['ROCE%'].iloc[0])
-            st.metric(label="QOQ Sales%", value=summary['QOQ Sales%'].iloc[0])
-            st.metric(label="YOY Profit%", value=summary['YOY Profit%'].iloc[0])
+# Seconds the live prices loop runs before the script reruns itself and picks up widget changes
+LIVE_RUN_SECONDS = float(os.getenv("LIVE_RUN_SECONDS", "60"))
 
+# Name of the live holdings entry in the portfolio list
+ZERODHA_PORTFOLIO = "Zerodha Holdings (live)"
 
-        # Add spacing between companies
-        st.markdown("<hr>", unsafe_allow_html=True)
+# Stored versions kept for the change report and the backtest
+SNAPSHOT_RETENTION = int(os.getenv("SNAPSHOT_RETENTION", "30"))
 
-# Ensure directory exists
-UPLOAD_DIR = "uploaded_files"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-DB_PATH = os.path.join(UPLOAD_DIR, "meta.db")
+# Industry PE / PBV from the universe's own peer multiples: "fill" gaps in the scraped values, "replace" them, or "" to keep them
+PEER_MULTIPLES_MODE = os.getenv("PEER_MULTIPLES", "") or None
 
-# Initialize SQLite database
+# Initialize SQLite database: opens this thread's connection, migrating the schema once per process
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('''CREATE TABLE IF NOT EXISTS file_metadata (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        filename TEXT,
-                        upload_time TEXT)''')
-    cursor.execute('''CREATE TABLE IF NOT EXISTS file_storage (
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            file_data BLOB)''')
-    conn.commit()
+    connect(DB_PATH)
+
+# Function to read the raw bytes of a Streamlit uploaded file or a downloaded file path
+def read_file_bytes(uploaded_file):
+    if isinstance(uploaded_file, str):
+        with open(uploaded_file, "rb") as f:
+            return f.read()
+    return uploaded_file.getvalue()
+
+# Processed snapshots are cached by content hash, shared across reruns and sessions
+@st.cache_resource
+def get_snapshot_cache():
+    return SnapshotCache(os.path.join(UPLOAD_DIR, "cache"))
 
 # Save file and update metadata
 def save_uploaded_file(uploaded_file):
-    # If uploaded_file is a path (str), read it as bytes
-    if isinstance(uploaded_file, str):  
-        with open(uploaded_file, "rb") as f:
-            file_data = f.read()
+    file_data = read_file_bytes(uploaded_file)
+    # If uploaded_file is a path (str), use its file name
+    if isinstance(uploaded_file, str):
         filename = os.path.basename(uploaded_file)
     else:
-        file_data = uploaded_file.getvalue()  # Handle Streamlit uploaded file
-        filename = uploaded_file.name
-    # file_data = uploaded_file.getvalue()
-    # Save metadata
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM file_metadata")  # Keep only last entry
-        cursor.execute("DELETE FROM file_storage")  # Keep only last file
-        # cursor.execute("INSERT INTO file_metadata (filename, upload_time, file_data) VALUES (?, ?, ?)",(uploaded_file.name, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), file_data))
-        cursor.execute("INSERT INTO file_metadata (filename, upload_time) VALUES (?, ?)", (filename, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
-        cursor.execute("INSERT INTO file_storage (file_data) VALUES (?)", (file_data,))
-        
-        conn.commit()
-    
+        filename = uploaded_file.name  # Handle Streamlit uploaded file
+    # A new version is only written when the content differs from the latest one
+    save_snapshot(DB_PATH, filename, file_data, retention=SNAPSHOT_RETENTION)
 
 # Get last upload time
 def get_last_upload_time():
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT upload_time FROM file_metadata ORDER BY id DESC LIMIT 1")
-        row = cursor.fetchone()
-    return row[0] if row else "No file uploaded yet"
-
-def get_last_uploaded_file():
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        
-        # Get the last uploaded filename from file_metadata
-        cursor.execute("SELECT filename FROM file_metadata ORDER BY id DESC LIMIT 1")
-        filename_row = cursor.fetchone()
-        
-        # Get the last uploaded file data from file_storage
-        cursor.execute("SELECT file_data FROM file_storage ORDER BY id DESC LIMIT 1")
-        file_row = cursor.fetchone()
-    
-    # Ensure both filename and file_data exist
-    if filename_row and file_row:
-        return filename_row[0], io.BytesIO(file_row[0])  # Convert bytes to BytesIO for Streamlit
-    
-    return None, None  # No file found
-
-# Function to get stored all stocks file from DB
-def get_stored_all_stocks_file():
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT file_data FROM file_storage ORDER BY id DESC LIMIT 1")
-        file_row = cursor.fetchone()
-    if file_row:
-        return io.BytesIO(file_row[0])
+    return get_latest_upload_time(DB_PATH) or "No file uploaded yet"
+
+# Function to get the raw CSV of a stored snapshot, only read for the download button
+@st.cache_data(max_entries=2)
+def get_stored_file_bytes(storage_id):
+    return get_storage_data(DB_PATH, storage_id)
+
+# Function to get the valuation index of the latest stored snapshot, shared with the dashboard through the snapshot cache
+def get_stored_valuation_index():
+    latest = get_latest_snapshot_info(DB_PATH)
+    if latest:
+        snapshot = load_stored_snapshot(latest)
+        if snapshot is not None:
+            return snapshot['valuation_index']
     return None
 
 # Function to save portfolio files in DB
 def save_portfolio_file(name, file):
-    file_data = file.getvalue()
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS portfolio_files (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT,
-                file_data BLOB,
-                upload_time TEXT
-            )
-        """)
-        cursor.execute("INSERT INTO portfolio_files (name, file_data, upload_time) VALUES (?, ?, ?)", 
-                       (name, file_data, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
-        conn.commit()
+    portfolio_store.save_portfolio_file(DB_PATH, name, file.getvalue())
 
 # Function to get all stored portfolio files
 def get_all_portfolio_files():
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        #Ensure the portfolio_files table exists
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS portfolio_files (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT,
-                file_data BLOB,
-                upload_time TEXT
-            )
-        """)
-        conn.commit()
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, name, upload_time FROM portfolio_files")
-        return cursor.fetchall()
+    return portfolio_store.list_portfolio_files(DB_PATH)
+
+# Function to parse every stored portfolio once into one frame with a Portfolio column
+@st.cache_data(max_entries=4)
+def get_consolidated_portfolios(file_ids):
+    files = portfolio_store.get_portfolio_files_data(DB_PATH, file_ids)
+    return consolidate_portfolios([files[file_id] for file_id in file_ids if file_id in files], workers=PORTFOLIO_WORKERS)
 
-# Function to get a specific portfolio file from DB
+# Function to get the "Export All Portfolios as CSV" export once per set of stored portfolios
+@st.cache_data(max_entries=4)
+def get_consolidated_portfolios_csv(file_ids):
+    return convert_df_to_csv(get_consolidated_portfolios(file_ids))
+
+# Function to get a specific portfolio file from DB, streamed from its blob
 def get_portfolio_file(file_id):
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT file_data FROM portfolio_files WHERE id = ?", (file_id,))
-        file_row = cursor.fetchone()
-    if file_row:
-        return io.BytesIO(file_row[0])
+    return portfolio_store.open_portfolio_file(DB_PATH, file_id)
+
+# Function to run the Monte Carlo simulation once per snapshot, simulation count and seed
+@st.cache_data(max_entries=4)
+def get_monte_carlo_bands(snapshot_key, simulations, seed, _processed_data):
+    return run_monte_carlo(_processed_data, MonteCarloConfig(simulations=simulations, seed=seed))
+
+# Function to build one dashboard list and its paging index, once per snapshot and only when the list is opened
+@st.cache_resource(max_entries=8)
+def get_grid_source(snapshot_key, split, _processed_data):
+    return GridSource(split_company_list(_processed_data, split), DISPLAY_COLUMNS)
+
+# Function to show one page of a dashboard list with server-side Name filter, sort and paging controls
+def display_grid(snapshot, split, key):
+    source = get_grid_source(snapshot['key'], split, snapshot['processed_data'])
+    filter_col, sort_col, order_col, page_col = st.columns([3, 3, 2, 2])
+    name_prefix = filter_col.text_input("Name starts with", key=f"{key}_filter").strip()
+    sort_column = sort_col.selectbox("Sort by", DISPLAY_COLUMNS, index=DISPLAY_COLUMNS.index('Gain%'), key=f"{key}_sort")
+    ascending = order_col.radio("Order", ["Descending", "Ascending"], key=f"{key}_order", horizontal=True) == "Ascending"
+    matches = len(source.name_matches(name_prefix)) if name_prefix else len(source)
+    pages = max(1, -(-matches // GRID_PAGE_SIZE))
+    page = page_col.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, step=1, key=f"{key}_page")
+    # The lists come sorted by Gain% descending, so that sort reuses their order
+    if sort_column == 'Gain%' and not ascending:
+        sort_column = None
+    page_df, matches = source.page(int(page) - 1, GRID_PAGE_SIZE, sort_column, ascending, name_prefix)
+    st.caption(f"{matches} companies")
+    with span('aggrid', len(page_df)):
+        AgGrid(page_df, gridOptions=configure_aggrid(page_df), fit_columns_on_grid_load=True, height=30, key=key)
+
+# Function to get the "Download All Companies as CSV" export once per snapshot
+@st.cache_data(max_entries=2)
+def get_companies_csv(snapshot_key, _processed_data):
+    return convert_df_to_csv(_processed_data[DISPLAY_COLUMNS].sort_values(by='Gain%', ascending=False))
+
+# Function to evaluate a scenario sweep once per snapshot and sweep setting
+@st.cache_data(max_entries=8)
+def get_scenario_sensitivity(snapshot_key, sweep_field, sweep_low, sweep_high, sweep_steps, _processed_data):
+    scenarios = sweep(sweep_field, np.linspace(sweep_low, sweep_high, sweep_steps))
+    scenario_gains = evaluate_scenarios(_processed_data, scenarios, output="gain")
+    return pd.DataFrame({
+        'Median Gain%': scenario_gains.median(),
+        'Companies with upside': (scenario_gains > 0).sum(),
+    })
+
+# Function to prepare the screen columns of a snapshot once, shared by every saved screen and the editor
+@st.cache_resource(max_entries=2)
+def get_screen_data(snapshot_key, _processed_data):
+    return ScreenData(_processed_data)
+
+# Function to score every company against its industry once per snapshot; reweighting reuses the scores
+@st.cache_resource(max_entries=2)
+def get_factor_scores(snapshot_key, _processed_data):
+    return factor_scores(_processed_data)
+
+# Function to format the health summary of every company and index them by Name and NSE Code, once per snapshot
+@st.cache_resource(max_entries=2)
+def get_health_table(snapshot_key, _processed_data):
+    return HealthTable(_processed_data)
+
+# Reruns only the decorated section when one of its widgets changes, where this Streamlit has fragments
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda func: func)
+
+# Company summary at the bottom of the dashboard; picking another company only reruns this section
+@fragment
+def display_company_summary(snapshot):
+    health_table = get_health_table(snapshot['key'], snapshot['processed_data'])
+    st.subheader("Select and Filter Company Data")
+    options = health_table.options()
+    filter_company = st.selectbox("Select a Company for Summary (search by name or NSE code)", options)
+
+    if filter_company:
+        position = health_table.position(filter_company)
+        display_financial_health_summary(health_table.names[position], health_table.summary(filter_company))
+    else:
+        st.info("Please upload a CSV file to proceed.")
+
+    # Health metrics of several companies side by side
+    with st.expander("Compare Companies", expanded=False):
+        compare_companies = st.multiselect(f"Companies to compare (up to {MAX_COMPARE})", options,
+                                           max_selections=MAX_COMPARE, key="compare-companies")
+        if compare_companies:
+            st.dataframe(health_table.compare(compare_companies), use_container_width=True)
+
+# Function to backtest the stored history, recomputed when a new version is stored
+@st.cache_data(max_entries=4)
+def get_backtest(latest_version_id, horizon_days):
+    return run_backtest(build_panel(load_snapshot_history(DB_PATH)), horizon_days)
+
+# Function to parse a stored portfolio once; stored portfolios never change after saving
+@st.cache_data(max_entries=64)
+def load_portfolio_frame(file_id):
+    portfolio_file = get_portfolio_file(file_id)
+    if portfolio_file:
+        with portfolio_file:
+            return pd.read_csv(portfolio_file)
     return None
 
+# One cached Zerodha data layer per API key and token, shared across reruns
+@st.cache_resource
+def get_kite_data(api_key, access_token):
+    kite = KiteConnect(api_key=api_key)
+    kite.set_access_token(access_token)
+    return KiteData(kite)
+
+# Function to get this session's tick stream, opened on first use and kept across reruns until
+# close_tick_stream; a new API key or token closes the old stream
+def get_tick_stream(api_key, access_token):
+    live = st.session_state.get("live-stream")
+    if live is not None and live[0] != (api_key, access_token):
+        close_tick_stream()
+        live = None
+    if live is None:
+        live = st.session_state["live-stream"] = ((api_key, access_token), KiteTickStream(api_key, access_token))
+    return live[1]
+
+# Function to close this session's tick stream and forget the prices it delivered
+def close_tick_stream():
+    live = st.session_state.pop("live-stream", None)
+    st.session_state.pop("live-prices", None)
+    if live is not None:
+        live[1].close()
+
 # Function to delete a portfolio file
 def delete_portfolio_file(file_id):
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM portfolio_files WHERE id = ?", (file_id,))
-        conn.commit()
+    portfolio_store.delete_portfolio_file(DB_PATH, file_id)
 
 # Initialize DB
 init_db()
 
+# Where the time of the last reruns went, stage by stage
+with st.sidebar.expander("Performance", expanded=False):
+    st.checkbox("Record stage timings", key="perf-enabled")
+    if previous_runs:
+        st.write(f"**Seconds per stage, last {len(previous_runs)} reruns**")
+        perf_breakdown = instrumentation.breakdown(previous_runs)
+        st.bar_chart(perf_breakdown)
+        st.dataframe(perf_breakdown.round(3), use_container_width=True)
+        last_spans = instrumentation.span_frame(previous_runs[-1:])
+        last_spans['Memory delta (MB)'] = (last_spans['memory_delta'] / 2 ** 20).round(1)
+        st.write("**Last rerun**")
+        st.dataframe(last_spans[['stage', 'parent', 'seconds', 'rows', 'Memory delta (MB)']].round(3),
+                     use_container_width=True, hide_index=True)
+        st.download_button("Download Prometheus metrics", instrumentation.prometheus_text(), "finx_metrics.prom", "text/plain")
+    elif st.session_state["perf-enabled"]:
+        st.write("Timings are shown from the next rerun on.")
+
 
 # Tab 1: Financial Dashboard (Existing functionality)
 with tabs[0]:
     st.header("Financial Dashboard")
     # Retrieve last stored file automatically
-    stored_filename, stored_file_data = get_last_uploaded_file()
+    stored_snapshot = get_latest_snapshot_info(DB_PATH)
     last_upload_time = get_last_upload_time()
     st.write(f"**Last Uploaded File:** {last_upload_time}")
 
     uploaded_file = st.file_uploader("Upload Stock Data (CSV)", type="csv")
     scraping_url = st.text_input("Enter the Screener.in URL:", "https://www.screener.in/screens/2284718/all-stocks-download/")
     if st.button("Scrape Data", key="scrape-button"):
-        download_dir = os.getcwd()
         with st.spinner("Scraping data..."):
-            downloaded_file = download_file_from_screener_with_login(scraping_url, download_dir)
+            downloaded_file = download_file_from_screener_with_login(scraping_url)
             if downloaded_file:
                 st.success("Data scraped successfully.")
-                with open(downloaded_file, "rb") as file:
-                    st.download_button(
-                        label="Download Scraped File",
-                        data=file,
-                        file_name="scraped_data.csv",
-                        mime="text/csv",
-                        key="down-button"
-                        )
+                st.download_button(
+                    label="Download Scraped File",
+                    data=downloaded_file.content,
+                    file_name="scraped_data.csv",
+                    mime="text/csv",
+                    key="down-button"
+                    )
                 uploaded_file = downloaded_file
 
     # Use stored file if no new upload
-    if uploaded_file is None and stored_filename and stored_file_data:
-        st.success(f"Using stored file: {stored_filename}")
-        # Save stored file as a temporary CSV
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".csv") as temp_file:
-            temp_file.write(stored_file_data.getvalue())  # Write binary content
-            temp_csv_path = temp_file.name  # Get temp file path
-
-        uploaded_file = temp_csv_path  # Pass temp file path for processing
-        filename = stored_filename
-    else:
-        filename = uploaded_file.name if uploaded_file else None  # Ensure filename is set correctly
-   
-                   
-    # Main Application
-    if uploaded_file:
+    if uploaded_file is None and stored_snapshot:
+        st.success(f"Using stored file: {stored_snapshot[1]}")
+    elif uploaded_file:
         save_uploaded_file(uploaded_file)
-        processed_data = process_financial_data(uploaded_file)
+        stored_snapshot = get_latest_snapshot_info(DB_PATH)
+
+    # Main Application
+    processed_data = None
+    if stored_snapshot:
+        previous_info = get_previous_snapshot_info(DB_PATH, stored_snapshot[0])
+        snapshot = load_stored_snapshot(stored_snapshot, previous_info)
+
+        if snapshot is not None:
+            processed_data = snapshot['processed_data']
+            # Only the selected list is built and rendered, so the other three cost nothing on a rerun
+            grid_keys = {
+                'non_sme': "non_sme_table",
+                'sme': "sme_table",
+                'non_sme_screened': "non_sme_s_table",
+                'sme_screened': "sme_s_table",
+            }
+            selected_list = st.radio("List", SPLIT_NAMES, format_func=LIST_LABELS.get, horizontal=True, label_visibility="collapsed")
+            st.subheader(LIST_LABELS[selected_list])
+            display_grid(snapshot, selected_list, grid_keys[selected_list])
 
-        if processed_data is not None:
-            # Split Data into Non-SME and SME
-            non_sme = processed_data[processed_data['Is SME'] == 0].sort_values(by='Gain%', ascending=False)
-            sme = processed_data[processed_data['Is SME'] == 1].sort_values(by='Gain%', ascending=False)
-            #'Value as per EV/EBITDA Method', 'Value as per Revenue Method', 'Value as per PE Multiple', 'Value as per PB Multiple'
-            non_sme_screened =  processed_data[(processed_data['Is SME'] == 0) & (processed_data['Sales']>50) & (processed_data['Operating profit']>10) & (processed_data['Value as per EV/EBITDA Method']>0) & (processed_data['Value as per Revenue Method']>0) & (processed_data['Value as per PE Multiple']>0) & (processed_data['Value as per PB Multiple']>0) ].sort_values(by='Gain%', ascending=False)
-            sme_screened =  processed_data[(processed_data['Is SME'] == 1) & (processed_data['Sales']>5) & (processed_data['Operating profit']>1) & (processed_data['Value as per EV/EBITDA Method']>0) & (processed_data['Value as per Revenue Method']>0) & (processed_data['Value as per PE Multiple']>0) & (processed_data['Value as per PB Multiple']>0) ].sort_values(by='Gain%', ascending=False)
-            # Tab Layout
-            tab1, tab2, tab3, tab4 = st.tabs(["Non-SME Companies", "SME Companies","Non-SME Screened Companies","SME Screened Companies"])
-
-            with tab1:
-                st.subheader("Non-SME Companies")
-                grid_options = configure_aggrid(non_sme[['Name', 'Market Capitalisation', 'Current Price', 'Final expected price', 'Gain%', 'Value as per EV/EBITDA Method', 'Value as per Revenue Method', 'Value as per PE Multiple', 'Value as per PB Multiple', 'PB_elements_is_1']])
-                AgGrid(non_sme[['Name', 'Market Capitalisation', 'Current Price', 'Final expected price', 'Gain%', 'Value as per EV/EBITDA Method', 'Value as per Revenue Method', 'Value as per PE Multiple', 'Value as per PB Multiple', 'PB_elements_is_1']], gridOptions=grid_options, fit_columns_on_grid_load=True, height=30, key="non_sme_table")
-
-                #st.dataframe(non_sme[['Name', 'Market Capitalisation', 'Current Price', 'Final expected price', 'Gain%', 'Value as per EV/EBITDA Method', 'Value as per Revenue Method', 'Value as per PE Multiple', 'Value as per PB Multiple', 'PB_elements_is_1']], use_container_width=True, hide_index=True)
-
-            with tab2:
-                st.subheader("SME Companies")
-                grid_options = configure_aggrid(non_sme[['Name', 'Market Capitalisation', 'Current Price', 'Final expected price', 'Gain%', 'Value as per EV/EBITDA Method', 'Value as per Revenue Method', 'Value as per PE Multiple', 'Value as per PB Multiple', 'PB_elements_is_1']])
-                AgGrid(sme[['Name', 'Market Capitalisation', 'Current Price', 'Final expected price', 'Gain%', 'Value as per EV/EBITDA Method', 'Value as per Revenue Method', 'Value as per PE Multiple', 'Value as per PB Multiple', 'PB_elements_is_1']], gridOptions=grid_options, fit_columns_on_grid_load=True, height=30, key="sme_table")
-                #st.dataframe(sme[['Name', 'Market Capitalisation', 'Current Price', 'Final expected price', 'Gain%', 'Value as per EV/EBITDA Method', 'Value as per Revenue Method', 'Value as per PE Multiple', 'Value as per PB Multiple', 'PB_elements_is_1']],use_container_width=True, hide_index=True)
-        
-            with tab3:
-                st.subheader("Non-SME Screened Companies")
-                grid_options = configure_aggrid(non_sme[['Name', 'Market Capitalisation', 'Current Price', 'Final expected price', 'Gain%', 'Value as per EV/EBITDA Method', 'Value as per Revenue Method', 'Value as per PE Multiple', 'Value as per PB Multiple', 'PB_elements_is_1']])
-                AgGrid(non_sme_screened[['Name', 'Market Capitalisation', 'Current Price', 'Final expected price', 'Gain%', 'Value as per EV/EBITDA Method', 'Value as per Revenue Method', 'Value as per PE Multiple', 'Value as per PB Multiple', 'PB_elements_is_1']], gridOptions=grid_options, fit_columns_on_grid_load=True, height=30, key="non_sme_s_table")
-                #st.dataframe(non_sme_screened[['Name', 'Market Capitalisation', 'Current Price', 'Final expected price', 'Gain%', 'Value as per EV/EBITDA Method', 'Value as per Revenue Method', 'Value as per PE Multiple', 'Value as per PB Multiple', 'PB_elements_is_1']], use_container_width=True, hide_index=True)
-
-            with tab4:
-                st.subheader("SME Screened Companies")
-                grid_options = configure_aggrid(non_sme[['Name', 'Market Capitalisation', 'Current Price', 'Final expected price', 'Gain%', 'Value as per EV/EBITDA Method', 'Value as per Revenue Method', 'Value as per PE Multiple', 'Value as per PB Multiple', 'PB_elements_is_1']])
-                AgGrid(sme_screened[['Name', 'Market Capitalisation', 'Current Price', 'Final expected price', 'Gain%', 'Value as per EV/EBITDA Method', 'Value as per Revenue Method', 'Value as per PE Multiple', 'Value as per PB Multiple', 'PB_elements_is_1']], gridOptions=grid_options, fit_columns_on_grid_load=True, height=30, key="sme_s_table")
-                #st.dataframe(sme_screened[['Name', 'Market Capitalisation', 'Current Price', 'Final expected price', 'Gain%', 'Value as per EV/EBITDA Method', 'Value as per Revenue Method', 'Value as per PE Multiple', 'Value as per PB Multiple', 'PB_elements_is_1']], use_container_width=True, hide_index=True)
-        
     # Provide a download button for the last stored file
-    if stored_filename and stored_file_data:
+    if stored_snapshot:
         st.download_button(
         label="Download Last Stored File",
-        data=stored_file_data,
-        file_name=stored_filename,
+        data=get_stored_file_bytes(stored_snapshot[3]),
+        file_name=stored_snapshot[1],
         mime="text/csv"
         )  
 
         # After processing the data, add this button for download
-        if uploaded_file and processed_data is not None:
-            # Prepare the data for downloading
-            download_data = processed_data[['Name', 'Market Capitalisation', 'Current Price', 'Final expected price', 'Gain%', 'Value as per EV/EBITDA Method', 'Value as per Revenue Method', 'Value as per PE Multiple', 'Value as per PB Multiple', 'PB_elements_is_1']].sort_values(by='Gain%', ascending=False)
-
-            # Convert the dataframe to CSV format
-            csv_data = convert_df_to_csv(download_data)
+        if processed_data is not None:
+            # Prepare the data for downloading as CSV
+            csv_data = get_companies_csv(snapshot['key'], processed_data)
 
             # Add the download button on the Streamlit app
             st.download_button(
@@ -609,31 +490,148 @@ with tabs[0]:
             
             # Automate scraping if URL is provided
             if st.button("Scrape Data"):
-                download_dir = os.getcwd()
                 with st.spinner("Scraping data..."):
-                    downloaded_file = download_file_from_screener_with_login(scraping_url, download_dir)
+                    downloaded_file = download_file_from_screener_with_login(scraping_url)
                     if downloaded_file:
                         st.success("Data scraped successfully.")
-                        with open(downloaded_file, "rb") as file:
-                            st.download_button(
-                                label="Download Scraped File",
-                                data=file,
-                                file_name="scraped_data.csv",
-                                mime="text/csv",
-                                )
+                        st.download_button(
+                            label="Download Scraped File",
+                            data=downloaded_file.content,
+                            file_name="scraped_data.csv",
+                            mime="text/csv",
+                            )
                         uploaded_file = downloaded_file
 
+            # Scenario sensitivity: one broadcast evaluation across all companies
+            with st.expander("Scenario Sensitivity", expanded=False):
+                sweep_field = st.selectbox("Assumption to sweep", SWEEP_FIELDS)
+                sweep_low, sweep_high = st.slider("Range", 0.0, 1.5, (0.5, 1.0), step=0.05)
+                sweep_steps = st.number_input("Number of scenarios", min_value=2, max_value=200, value=50)
+                sensitivity = get_scenario_sensitivity(snapshot['key'], sweep_field, sweep_low, sweep_high, int(sweep_steps), processed_data)
+                st.line_chart(sensitivity['Median Gain%'])
+                st.dataframe(sensitivity, use_container_width=True)
+
+            # Monte Carlo bands, simulated once per snapshot and setting
+            with st.expander("Monte Carlo Valuation Bands", expanded=False):
+                mc_simulations = st.number_input("Simulations", min_value=100, max_value=20000, value=2000, step=100)
+                mc_seed = st.number_input("Seed", value=0, step=1)
+                if st.checkbox("Run simulation", key="run-monte-carlo"):
+                    with st.spinner("Simulating..."):
+                        bands = get_monte_carlo_bands(snapshot['key'], int(mc_simulations), int(mc_seed), processed_data)
+                    st.dataframe(
+                        processed_data[['Name', 'Current Price', 'Final expected price']].join(bands)
+                        .sort_values(by='Probability of upside', ascending=False),
+                        use_container_width=True, hide_index=True
+                    )
 
-            # Bottom Filter Section
-            st.subheader("Select and Filter Company Data")
-            filter_company = st.selectbox("Select a Company for Summary", processed_data['Name'].unique())
+            # How well Final expected price predicted later prices across the stored versions
+            with st.expander("Backtest", expanded=False):
+                st.write(f"Runs over the stored versions (up to {SNAPSHOT_RETENTION}, set SNAPSHOT_RETENTION to keep more).")
+                horizon_days = st.number_input("Horizon (days)", min_value=1, max_value=365, value=30)
+                if st.checkbox("Run backtest", key="run-backtest"):
+                    with st.spinner("Backtesting..."):
+                        backtest = get_backtest(stored_snapshot[0], int(horizon_days))
+                    if backtest['summary']['Observations'].sum() == 0:
+                        st.info(f"No stored versions are at least {int(horizon_days)} days apart yet.")
+                    else:
+                        st.dataframe(backtest['summary'], use_container_width=True)
+                        st.line_chart(backtest['rank_ic'])
+                        st.bar_chart(backtest['deciles'])
+
+            # Saved screens: match counts of every screen and an editor that counts matches as you type
+            with st.expander("Saved Screens", expanded=False):
+                screen_data = get_screen_data(snapshot['key'], processed_data)
+                saved_screens = load_compiled_screens(DB_PATH)
+                if saved_screens:
+                    st.dataframe(screen_counts(saved_screens, screen_data), use_container_width=True)
+
+                edit_name = st.selectbox("Screen", ["New screen"] + list(saved_screens), key="screen-select")
+                editing = saved_screens.get(edit_name)
+                screen_name = st.text_input("Screen name", value=edit_name if editing else "", key=f"screen-name-{edit_name}")
+                screen_text = st.text_area(
+                    "Definition (JSON)",
+                    value=json.dumps(editing.definition if editing else default_screen(0), indent=2),
+                    height=250, key=f"screen-definition-{edit_name}",
+                )
+                try:
+                    screen = CompiledScreen(json.loads(screen_text))
+                    screen_mask = screen.mask(screen_data)
+                except (ValueError, ScreenError) as e:
+                    st.error(f"Invalid screen: {e}")
+                    screen = None
+                if screen is not None:
+                    st.write(f"**Matches:** {int(screen_mask.sum())} of {len(screen_data)}")
+                    condition_counts = pd.DataFrame(screen.conditions)
+                    condition_counts['value'] = condition_counts['value'].astype(str)
+                    condition_counts['Matches on its own'] = screen.condition_counts(screen_data)
+                    st.dataframe(condition_counts, use_container_width=True, hide_index=True)
+                    numeric_columns = [column for column in screen.columns if pd.api.types.is_numeric_dtype(processed_data[column])]
+                    if numeric_columns:
+                        st.dataframe(screen_data.column_stats(numeric_columns), use_container_width=True)
+                    st.dataframe(
+                        processed_data.loc[screen_mask, DISPLAY_COLUMNS].sort_values(by='Gain%', ascending=False),
+                        use_container_width=True, hide_index=True,
+                    )
+                    save_col, delete_col = st.columns(2)
+                    if save_col.button("Save screen", disabled=not screen_name):
+                        save_screen(DB_PATH, screen_name, screen.definition)
+                        st.success(f"Saved {screen_name}.")
+                    if editing and delete_col.button("Delete screen"):
+                        delete_screen(DB_PATH, edit_name)
+                        st.success(f"Deleted {edit_name}.")
+
+            # Peer multiples computed from the universe, per industry and per market-cap bucket
+            with st.expander("Industry Peer Multiples", expanded=False):
+                if PEER_MULTIPLES_MODE:
+                    st.write(f"Industry PE and Industry PBV are taken from these peer medians ({PEER_MULTIPLES_MODE}).")
+                peer_level = st.radio("Group by", ["industry", "bucket"], horizontal=True,
+                                      format_func={'industry': "Industry", 'bucket': "Market cap"}.get, key="peer-level")
+                peer_statistic = st.radio("Statistic", ["median", "trimmed mean"], horizontal=True, key="peer-statistic")
+                peer_table = snapshot['peer_index'][peer_level]
+                st.dataframe(
+                    peer_table.xs(peer_statistic, axis=1, level=1).join(
+                        peer_table.xs('count', axis=1, level=1).add_suffix(' peers')),
+                    use_container_width=True,
+                )
 
-            if filter_company:
-                filtered_company = processed_data[processed_data['Name'] == filter_company].iloc[0]
-                display_financial_health_summary(filtered_company)
+            # Weighted multi-factor ranking against industry peers
+            with st.expander("Multi-Factor Ranking", expanded=False):
+                scores = get_factor_scores(snapshot['key'], processed_data)
+                rank_list = st.selectbox("Rank within", ["all"] + SPLIT_NAMES,
+                                         format_func=lambda split: LIST_LABELS.get(split, "All Companies"), key="rank-list")
+                rank_col, score_col = st.columns(2)
+                rank_k = rank_col.number_input("Top", min_value=1, max_value=1000, value=50, step=10, key="rank-k")
+                rank_kind = score_col.radio("Score factors by industry", ["percentile", "zscore"], horizontal=True,
+                                            format_func={'percentile': "Percentile", 'zscore': "Z-score"}.get, key="rank-kind")
+                weight_cols = st.columns(5)
+                rank_weights = {
+                    factor: weight_cols[i % 5].slider(factor, 0.0, 5.0, DEFAULT_WEIGHTS[factor], step=0.5, key=f"rank-weight-{factor}")
+                    for i, factor in enumerate(scores[rank_kind].columns)
+                }
+                rank_mask = None if rank_list == "all" else split_mask(processed_data, rank_list)
+                st.dataframe(rank_companies(processed_data, scores, rank_weights, int(rank_k), rank_kind, rank_mask),
+                             use_container_width=True, hide_index=True)
+                st.write("**Industry averages**")
+                st.dataframe(scores['industry']['mean'], use_container_width=True)
+
+            # What moved since the version stored before this one; that version is only loaded (and
+            # valued on a cache miss) once asked for
+            previous_snapshot = None
+            if previous_info and st.checkbox(f"Show changes since {previous_info[1]} ({previous_info[2]})", key="show-changes"):
+                previous_snapshot = load_stored_snapshot(previous_info)
+            if previous_snapshot is not None:
+                with st.expander(f"Changes Since {previous_info[1]} ({previous_info[2]})", expanded=True):
+                    gain_threshold = st.number_input("Minimum Gain% move", min_value=0.0, value=GAIN_MOVE_THRESHOLD, step=5.0)
+                    changes = change_report(previous_snapshot['processed_data'], processed_data, gain_threshold)
+                    st.write(f"**New listings:** {len(changes['new_listings'])}")
+                    st.dataframe(changes['new_listings'], use_container_width=True, hide_index=True)
+                    st.write(f"**Removed listings:** {len(changes['removed_listings'])}")
+                    st.dataframe(changes['removed_listings'], use_container_width=True, hide_index=True)
+                    st.write(f"**Gain% moves:** {len(changes['gain_moves'])}")
+                    st.dataframe(changes['gain_moves'], use_container_width=True, hide_index=True)
 
-            else:
-                st.info("Please upload a CSV file to proceed.")
+            # Bottom Filter Section
+            display_company_summary(snapshot)
 
 
 # Tab 2: Portfolio Analysis
@@ -641,40 +639,27 @@ with tabs[1]:
     st.header("Portfolio Analysis")
     
     # Retrieve all stocks file from Tab 1
-    tab1_all_stocks_file = get_stored_all_stocks_file()
+    valuation_index = get_stored_valuation_index()
 
     # Zerodha API Key Input
     st.subheader("Zerodha Portfolio Import")
     api_key = st.text_input("Enter Zerodha API Key")
     access_token = st.text_input("Enter Access Token", type="password")
 
-    def fetch_zerodha_holdings(api_key, access_token):
-        kite = KiteConnect(api_key=api_key)
-        kite.set_access_token(access_token)
-        holdings = kite.holdings()
-        df = pd.DataFrame(holdings)
-        df = df[['tradingsymbol', 'quantity', 'average_price', 'last_price']]
-        df.rename(columns={
-            'tradingsymbol': 'Instrument',
-            'quantity': 'Qty.',
-            'average_price': 'Avg. cost',
-            'last_price': 'LTP'
-        }, inplace=True)
-        return df
-    
-    if not tab1_all_stocks_file:
+    kite_data = get_kite_data(api_key, access_token) if api_key and access_token else None
+    if kite_data is None:
+        close_tick_stream()
+
+    if valuation_index is None:
         st.error("No All Stocks file found from Tab 1. Please upload a file in Tab 1 first.")
         st.stop()
 
     if st.button("Fetch Portfolio from Zerodha"):
-        if api_key and access_token:
+        if kite_data is not None:
             try:
-                portfolio_df = fetch_zerodha_holdings(api_key, access_token)
-                conn = sqlite3.connect(DB_PATH)
-                portfolio_df.to_sql("zerodha_portfolio", conn, if_exists="replace", index=False)
-                conn.close()
-                st.success("Portfolio fetched and stored successfully!")
-                st.dataframe(portfolio_df)
+                holdings_df = kite_data.holdings(refresh=True)
+                st.success(f"Portfolio fetched successfully! Select '{ZERODHA_PORTFOLIO}' below to analyse it.")
+                st.dataframe(holdings_df)
             except Exception as e:
                 st.error(f"Error fetching portfolio: {e}")
         else:
@@ -700,9 +685,8 @@ with tabs[1]:
                 col1, col2, col3 = st.columns([3, 1, 1])
                 col1.write(f"📂 **{name}** (Uploaded: {upload_time})")
                 if col2.button("Load", key=f"load_{file_id}"):
-                    selected_portfolio = get_portfolio_file(file_id)
-                    if selected_portfolio:
-                        portfolio_df = pd.read_csv(selected_portfolio)
+                    portfolio_df = load_portfolio_frame(file_id)
+                    if portfolio_df is not None:
                         st.write("Portfolio Data:", portfolio_df.head())
                 if col3.button("🗑️ Delete", key=f"delete_{file_id}"):
                     delete_portfolio_file(file_id)
@@ -710,60 +694,57 @@ with tabs[1]:
         else:
             st.write("No portfolios stored.")
 
-    # Export portfolio data
-    if portfolio_files:
-        if st.button("Export All Portfolios as CSV"):
-            with sqlite3.connect(DB_PATH) as conn:
-                query = "SELECT name, file_data FROM portfolio_files"
-                df = pd.read_sql_query(query, conn)
-                df.to_csv("all_portfolios.csv", index=False)
-            with open("all_portfolios.csv", "rb") as f:
-                st.download_button("Download CSV", f, "all_portfolios.csv", "text/csv")
-                
-    if portfolio_files:
+    # Export portfolio data; the stored portfolios are only parsed and consolidated once asked for
+    if portfolio_files and st.checkbox("Consolidate stored portfolios", key="consolidate-portfolios"):
+        portfolio_ids = tuple(file_id for file_id, _, _ in portfolio_files)
+        consolidated_portfolios = get_consolidated_portfolios(portfolio_ids)
+        st.download_button(
+            "Export All Portfolios as CSV", get_consolidated_portfolios_csv(portfolio_ids), "all_portfolios.csv", "text/csv"
+        )
+
+        # All stored portfolios valued in one pass against the snapshot
+        if st.checkbox("Analyse all portfolios together", key="consolidated-view"):
+            consolidated_summary = summarise_portfolios(process_portfolio_data(consolidated_portfolios, valuation_index))
+            st.subheader("Household Summary")
+            st.dataframe(consolidated_summary['portfolios'], use_container_width=True)
+            st.subheader("Combined Holdings")
+            st.dataframe(consolidated_summary['holdings'], use_container_width=True, hide_index=True)
+            st.plotly_chart(px.pie(
+                consolidated_summary['industry'].reset_index(), names='Industry', values='Current value',
+                title='Household Exposure by Industry'
+            ))
+
+    # Stored portfolios, plus the live Zerodha holdings once a token is entered
+    portfolio_options = {f"{name} ({upload_time})": file_id for file_id, name, upload_time in portfolio_files}
+    if kite_data is not None:
+        portfolio_options = {ZERODHA_PORTFOLIO: None, **portfolio_options}
+
+    if portfolio_options:
         # Create a dropdown for users to select a portfolio file
-        selected_portfolio_name = st.selectbox("Select Portfolio File", [f"{name} ({upload_time})" for _, name, upload_time in portfolio_files])
-    
-        # Find the selected file's ID
-        selected_file_id = next(file_id for file_id, name, upload_time in portfolio_files if f"{name} ({upload_time})" == selected_portfolio_name)
-
-        # Retrieve the selected portfolio file
-        portfolio_file = get_portfolio_file(selected_file_id)
-
-        if portfolio_file and tab1_all_stocks_file:
-            # Load data
-            portfolio_df = pd.read_csv(portfolio_file)
-            all_stocks_df = pd.read_csv(tab1_all_stocks_file)
-
-            # Process data
-            def process_portfolio_data(portfolio_df, all_stocks_df):
-                merged_df = portfolio_df.merge(all_stocks_df, left_on="Instrument", right_on="NSE Code", how="left", suffixes=("_portfolio","_stocks"))
-                merged_df['P&L/%'] = ((merged_df['LTP'] * merged_df['Qty.']) - 
-                                  (merged_df['Avg. cost'] * merged_df['Qty.'])) / \
-                                 (merged_df['Avg. cost'] * merged_df['Qty.']) * 100
-                merged_df['Max Value'] = merged_df[['Avg. cost', 'LTP']].max(axis=1)
-                merged_df['EBITDA'] = merged_df['Operating profit']
-                merged_df['Market Capitalisation'] = merged_df['Market Capitalization']
-                merged_df['Enterprise Value'] = merged_df.apply(calculate_ev, axis=1)
-                merged_df['EV/EBITDA'] = merged_df.apply(calculate_ev_ebitda, axis=1)
-                merged_df = calculate_ev_ebitda_share_price(merged_df)
-                merged_df = calculate_revenue_method_share_price(merged_df)
-                merged_df = calculate_pe_method_share_price(merged_df)
-                merged_df = calculate_pb_method_share_price(merged_df)
-                merged_df = calculate_gain_percentage(merged_df)
-                merged_df['HOLD/SELL'] = merged_df.apply(
-                    lambda row: f"Hold and Sell at {row['Final expected price']}" if row['Final expected price'] > row['Max Value'] else 'SELL', axis=1
-                )
-                return merged_df
-            
+        selected_portfolio_name = st.selectbox("Select Portfolio File", list(portfolio_options))
+        selected_file_id = portfolio_options[selected_portfolio_name]
 
-            processed_portfolio = process_portfolio_data(portfolio_df, all_stocks_df)
+        # Retrieve the selected portfolio file, or the cached holdings
+        portfolio_df = None
+        try:
+            if selected_file_id is None:
+                portfolio_df = kite_data.holdings()
+            else:
+                portfolio_df = load_portfolio_frame(selected_file_id)
+            # Current prices of all holdings in batched, cached quote requests
+            if portfolio_df is not None and kite_data is not None and st.checkbox("Use live Zerodha prices", value=True):
+                portfolio_df = kite_data.refresh_prices(portfolio_df)
+        except Exception as e:
+            st.error(f"Error fetching prices from Zerodha: {e}")
+
+        if portfolio_df is not None:
+            # Look up the precomputed valuations of the stored snapshot
+            processed_portfolio = process_portfolio_data(portfolio_df, valuation_index)
 
             # Display processed portfolio
             #'Value as per EV/EBITDA Method', 'Value as per Revenue Method', 'Value as per PE Multiple', 'Value as per PB Multiple'
             st.subheader("Processed Portfolio Data")
-            selected_columns = ['Instrument','Qty.', 'Avg. cost', 'LTP', 'P&L/%', 'Max Value', 'Final expected price','HOLD/SELL', 'Value as per EV/EBITDA Method', 'Value as per Revenue Method', 'Value as per PE Multiple', 'Value as per PB Multiple', 'PB_elements_is_1']
-            st.dataframe(processed_portfolio[selected_columns])
+            st.dataframe(processed_portfolio[PORTFOLIO_COLUMNS])
 
             # Generate and display graphs
             st.subheader("Graphs")
@@ -786,7 +767,9 @@ with tabs[1]:
                 return fig
 
             def generate_industry_chart(df):
-                industry_counts = df['Industry'].value_counts().reset_index()
+                # Industry is categorical, so industries without holdings are left out explicitly
+                industry_counts = df['Industry'].value_counts()
+                industry_counts = industry_counts[industry_counts > 0].reset_index()
                 industry_counts.columns = ['Industry', 'Count']
                 fig = px.bar(
                     industry_counts, 
@@ -815,6 +798,41 @@ with tabs[1]:
                 file_name="processed_portfolio.csv",
                 mime="text/csv"
             )
+
+            # Live prices: ticks are coalesced in the stream's buffer and drained once per refresh
+            # interval, updating only the rows that ticked and redrawing the table in place
+            if kite_data is not None:
+                st.subheader("Live Prices")
+                refresh_seconds = st.slider("Refresh every (seconds)", 0.5, 10.0, LIVE_REFRESH_SECONDS, step=0.5)
+                if st.checkbox("Stream live ticks", key="live-ticks"):
+                    try:
+                        stream = get_tick_stream(api_key, access_token)
+                        tokens = kite_data.instrument_tokens(processed_portfolio['Instrument'].dropna())
+                        stream.subscribe(tokens.values())
+                    except Exception as e:
+                        close_tick_stream()
+                        st.error(f"Error starting the live stream: {e}")
+                    else:
+                        # Prices delivered in earlier runs of the loop, so a rerun does not lose them
+                        live_prices = st.session_state.setdefault("live-prices", {})
+                        live_portfolio = LivePortfolio(processed_portfolio, tokens)
+                        live_portfolio.apply(live_prices)
+                        live_table = st.empty()
+                        live_status = st.empty()
+                        live_table.dataframe(live_portfolio.frame[PORTFOLIO_COLUMNS + ['Gain%']])
+                        # Runs for LIVE_RUN_SECONDS (or until another widget triggers a rerun), then
+                        # reruns the script, which closes the stream once the checkbox is cleared
+                        deadline = time.monotonic() + LIVE_RUN_SECONDS
+                        while time.monotonic() < deadline:
+                            time.sleep(refresh_seconds)
+                            prices = stream.buffer.drain()
+                            live_prices.update(prices)
+                            if live_portfolio.apply(prices):
+                                live_table.dataframe(live_portfolio.frame[PORTFOLIO_COLUMNS + ['Gain%']])
+                            live_status.caption(f"{stream.buffer.received} ticks received, {live_portfolio.updates} table updates")
+                        st.rerun()
+                else:
+                    close_tick_stream()
         else:
             st.info("Please upload both Portfolio and All Stocks CSV files.")
 
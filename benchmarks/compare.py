@@ -0,0 +1,50 @@
+# Compare two benchmark results files from benchmarks.run.
+#   python -m benchmarks.compare baseline.json results.json [--threshold 1.25]
+# A benchmark regresses when its best time or its peak memory grows by more than the threshold
+# factor; the exit code is 1 when anything regressed. Peaks below MIN_PEAK_MB are too small to
+# compare and never count as a memory regression.
+import argparse
+import json
+import sys
+
+import pandas as pd
+
+REGRESSION_THRESHOLD = 1.25
+
+MIN_PEAK_MB = 1.0
+
+# Function to line up two results documents by (benchmark, rows) and flag regressions
+def compare_results(baseline, current, threshold=REGRESSION_THRESHOLD):
+    columns = ['benchmark', 'rows', 'best_seconds', 'peak_mb']
+    before = pd.DataFrame(baseline['results'], columns=columns)
+    after = pd.DataFrame(current['results'], columns=columns)
+    comparison = before.merge(after, on=['benchmark', 'rows'], suffixes=(' before', ' after'))
+    comparison['time ratio'] = comparison['best_seconds after'] / comparison['best_seconds before']
+    comparison['memory ratio'] = comparison['peak_mb after'] / comparison['peak_mb before']
+    memory_regressed = (comparison['memory ratio'] > threshold) & (comparison['peak_mb after'] >= MIN_PEAK_MB)
+    comparison['regressed'] = (comparison['time ratio'] > threshold) | memory_regressed
+    return comparison
+
+# Function to print a comparison; returns the number of regressions
+def print_comparison(comparison):
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print(comparison.to_string(index=False, float_format=lambda value: f"{value:.4g}"))
+    regressions = int(comparison['regressed'].sum())
+    print(f"{regressions} regression(s) out of {len(comparison)} benchmarks")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark results files.")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help=f"Slowdown or memory growth factor counted as a regression (default: {REGRESSION_THRESHOLD})")
+    args = parser.parse_args(argv)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    return 1 if print_comparison(compare_results(baseline, current, args.threshold)) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+# Benchmark suite: times and memory-profiles the valuation, portfolio, SQLite and CSV export
+# paths on synthetic universes and writes the results as JSON.
+#   python -m benchmarks.run --sizes 1000 10000 --output results.json
+#   python -m benchmarks.compare baseline.json results.json
+# Every benchmark is timed `repeat` times (best and mean are reported) and then run once more
+# under tracemalloc for its peak allocation. The row-wise calculate_* functions are skipped
+# above --rowwise-limit rows, where a single run takes minutes.
+import argparse
+import gc
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.compare import compare_results, print_comparison
+from benchmarks.synthetic import BENCHMARK_SIZES, write_datasets
+from finx import ingest, portfolio, snapshots, universe, valuation
+from finx.health import HealthTable
+from finx.screening import DISPLAY_COLUMNS
+
+ROWWISE_LIMIT = 10_000
+
+RESULTS_FORMAT = 1
+
+
+class Fixture:
+    # Inputs shared by the benchmarks of one universe size
+    def __init__(self, rows, screener_path, holdings_path, work_dir):
+        self.rows = rows
+        self.screener_path = screener_path
+        self.work_dir = work_dir
+        with open(screener_path, "rb") as f:
+            self.screener_bytes = f.read()
+        self.raw = pd.read_csv(screener_path)
+        self.processed = valuation.calculate_valuations(self.raw)
+        self.valuation_index = portfolio.build_valuation_index(self.processed)
+        self.holdings = pd.read_csv(holdings_path)
+        self.merged = self.holdings.join(self.valuation_index, on="Instrument", rsuffix="_stocks")
+        # The row-wise functions read the columns earlier steps add
+        self.rowwise_input = self.processed.copy()
+        self._databases = 0
+        self.db_path = self.new_database()
+        snapshots.save_snapshot(self.db_path, "screener.csv", self.screener_bytes)
+        self.storage_id = snapshots.get_latest_snapshot_info(self.db_path)[3]
+        universe.load_universe(self.db_path, self.storage_id)
+
+    def new_database(self):
+        self._databases += 1
+        db_path = os.path.join(self.work_dir, f"bench_{self.rows}_{self._databases}.db")
+        snapshots.init_snapshot_store(db_path)
+        return db_path
+
+    def save_snapshot(self):
+        snapshots.save_snapshot(self.new_database(), "screener.csv", self.screener_bytes)
+
+    def materialise_universe(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(f"DROP TABLE IF EXISTS {universe.universe_table(self.storage_id)}")
+        return universe.load_universe(self.db_path, self.storage_id)
+
+
+def _apply(function, *args):
+    return lambda fixture: fixture.rowwise_input.apply(lambda row: function(row, *args), axis=1)
+
+# (name, callable taking the Fixture, row-wise)
+BENCHMARKS = [
+    ('valuation.calculate_ev', _apply(valuation.calculate_ev), True),
+    ('valuation.calculate_ev_ebitda', _apply(valuation.calculate_ev_ebitda), True),
+    ('valuation.calculate_equity_value_per_share', _apply(valuation.calculate_equity_value_per_share, 1), True),
+    ('valuation.calculate_ev_ebitda_share_price', lambda f: valuation.calculate_ev_ebitda_share_price(f.rowwise_input), True),
+    ('valuation.calculate_revenue_method_share_price', lambda f: valuation.calculate_revenue_method_share_price(f.rowwise_input), True),
+    ('valuation.calculate_pe_method_share_price', lambda f: valuation.calculate_pe_method_share_price(f.rowwise_input), True),
+    ('valuation.calculate_pb_method_share_price', lambda f: valuation.calculate_pb_method_share_price(f.rowwise_input), True),
+    ('valuation.calculate_gain_percentage', lambda f: valuation.calculate_gain_percentage(f.rowwise_input), True),
+    ('valuation.calculate_enterprise_value', lambda f: valuation.calculate_enterprise_value(f.raw), False),
+    ('valuation.calculate_ev_ebitda_multiple', lambda f: valuation.calculate_ev_ebitda_multiple(f.processed), False),
+    ('valuation.calculate_valuations', lambda f: valuation.calculate_valuations(f.raw), False),
+    ('valuation.process_financial_data', lambda f: valuation.process_financial_data(f.screener_path), False),
+    ('ingest.load_processed_csv', lambda f: ingest.load_processed_csv(f.screener_path), False),
+    ('health.HealthTable', lambda f: HealthTable(f.processed), False),
+    ('portfolio.build_valuation_index', lambda f: portfolio.build_valuation_index(f.processed), False),
+    ('portfolio.calculate_hold_sell', lambda f: portfolio.calculate_hold_sell(f.merged.copy()), False),
+    ('portfolio.process_portfolio_data', lambda f: portfolio.process_portfolio_data(f.holdings, f.valuation_index), False),
+    ('snapshots.save_snapshot', lambda f: f.save_snapshot(), False),
+    ('snapshots.get_storage_data', lambda f: snapshots.get_storage_data(f.db_path, f.storage_id), False),
+    ('universe.load_universe (materialise)', lambda f: f.materialise_universe(), False),
+    ('universe.load_universe', lambda f: universe.load_universe(f.db_path, f.storage_id), False),
+    ('csv export (dashboard columns)',
+     lambda f: f.processed[DISPLAY_COLUMNS].sort_values(by='Gain%', ascending=False).to_csv(index=False).encode('utf-8'), False),
+    ('csv export (processed)', lambda f: f.processed.to_csv(index=False).encode('utf-8'), False),
+]
+
+# Function to time `function(fixture)` and measure its peak traced allocation
+def measure(function, fixture, repeat):
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        function(fixture)
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function(fixture)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'best_seconds': min(times),
+        'mean_seconds': float(np.mean(times)),
+        'repeat': repeat,
+        'peak_mb': peak / 2 ** 20,
+    }
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def environment():
+    return {
+        'commit': _git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+# Function to run the suite; returns the results document that is written as JSON
+def run_suite(sizes=BENCHMARK_SIZES, repeat=3, rowwise_limit=ROWWISE_LIMIT, only=None, seed=0, data_dir=None, log=print):
+    results, skipped = [], []
+    with tempfile.TemporaryDirectory() as work_dir:
+        paths = write_datasets(data_dir or work_dir, sizes, seed)
+        for rows in sizes:
+            fixture = Fixture(rows, *paths[rows], work_dir)
+            for name, function, rowwise in BENCHMARKS:
+                if only and not any(pattern in name for pattern in only):
+                    continue
+                if rowwise and rows > rowwise_limit:
+                    skipped.append({'benchmark': name, 'rows': rows, 'reason': f"row-wise, above {rowwise_limit} rows"})
+                    continue
+                result = {'benchmark': name, 'rows': rows, **measure(function, fixture, repeat)}
+                results.append(result)
+                log(f"{name:<50} {rows:>9}  {result['best_seconds']:>9.4f} s  {result['peak_mb']:>9.1f} MB")
+            del fixture
+            gc.collect()
+    return {'format': RESULTS_FORMAT, 'environment': environment(), 'results': results, 'skipped': skipped}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time and memory-profile finx on synthetic screener universes.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=BENCHMARK_SIZES, help="Universe sizes (default: 1k, 10k, 100k, 1M)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark (default: 3)")
+    parser.add_argument("--rowwise-limit", type=int, default=ROWWISE_LIMIT,
+                        help=f"Skip the row-wise calculate_* functions above this many rows (default: {ROWWISE_LIMIT})")
+    parser.add_argument("--only", nargs="+", help="Only run benchmarks whose name contains one of these")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", help="Also keep the generated CSVs in this directory")
+    parser.add_argument("--output", help="JSON results file (default: benchmark_results/<commit or time>.json)")
+    parser.add_argument("--compare", metavar="BASELINE", help="Compare the results with an earlier results file")
+    args = parser.parse_args(argv)
+
+    with warnings.catch_warnings():
+        # The kernels divide by zero on the synthetic zero-EBITDA and missing rows by design
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        document = run_suite(args.sizes, args.repeat, args.rowwise_limit, args.only, args.seed, args.data_dir)
+
+    output = args.output
+    if output is None:
+        tag = document['environment']['commit'] or datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join("benchmark_results", f"{tag}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(document, f, indent=2)
+    print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        return 1 if print_comparison(compare_results(baseline, document)) else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
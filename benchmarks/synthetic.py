@@ -0,0 +1,135 @@
+# Synthetic screener universes and Zerodha holdings for the benchmarks.
+# The screener CSV has the columns app.py reads from a screener.in export (identifiers, valuation
+# inputs and the health summary fields) with roughly realistic distributions, plus the awkward
+# rows real exports have: missing values, zero operating profit (EBITDA) and negative book values.
+# Holdings are drawn from the universe's NSE codes, with a few instruments the universe does not list.
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from finx.universe import UNIVERSE_COLUMNS
+
+BENCHMARK_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+INDUSTRIES = [
+    'Banks', 'Finance', 'IT - Software', 'Pharmaceuticals', 'Auto Ancillaries', 'Chemicals', 'Textiles',
+    'FMCG', 'Steel', 'Cement', 'Power Generation', 'Realty', 'Capital Goods', 'Telecom', 'Healthcare',
+    'Construction', 'Trading', 'Media', 'Logistics', 'Agro Chemicals', 'Plastic Products', 'Hotels',
+    'Retail', 'Paper', 'Sugar', 'Insurance', 'Oil & Gas', 'Electrical Equipment', 'Consumer Durables', 'Mining',
+]
+
+# Share of missing values in every numeric column
+MISSING_SHARE = 0.05
+
+# Share of companies with zero operating profit, and with a negative book value
+ZERO_EBITDA_SHARE = 0.02
+NEGATIVE_BOOK_SHARE = 0.03
+
+# Share of holdings that are not in the universe
+UNLISTED_HOLDING_SHARE = 0.02
+
+# Function to generate a screener universe with the columns of UNIVERSE_COLUMNS, in that order
+def screener_universe(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    is_sme = (rng.random(rows) < 0.15).astype(int)
+    market_cap = np.exp(rng.normal(np.where(is_sme == 1, 4.0, 7.5), 1.6))  # crore
+    price = np.exp(rng.normal(5.0, 1.3, rows))
+    shares = market_cap * 1e7 / price
+    sales = market_cap * np.exp(rng.normal(-0.2, 0.8, rows))
+    opm = rng.normal(14, 12, rows)
+    operating_profit = sales * opm / 100
+    operating_profit[rng.random(rows) < ZERO_EBITDA_SHARE] = 0.0
+    profit_after_tax = operating_profit * rng.uniform(0.4, 0.8, rows)
+    book_value = price / np.exp(rng.normal(1.0, 0.8, rows))
+    book_value[rng.random(rows) < NEGATIVE_BOOK_SHARE] *= -1
+    price_to_earning = np.where(profit_after_tax > 0, market_cap / np.maximum(profit_after_tax, 1e-9), np.nan)
+    industry = rng.choice(INDUSTRIES, rows)
+    industry_pe = pd.Series(price_to_earning).groupby(industry).transform('median').to_numpy()
+
+    data = {
+        'Name': [f"Synthetic Company {i}" for i in range(rows)],
+        'NSE Code': [f"SYN{i}" for i in range(rows)],
+        'Industry': industry,
+        'Is SME': is_sme,
+        'Number of equity shares': shares,
+        'Current Price': price,
+        'Debt': sales * rng.uniform(0, 0.6, rows),
+        'Cash Equivalents': sales * rng.uniform(0, 0.3, rows),
+        'Operating profit': operating_profit,
+        'Operating profit growth': rng.normal(12, 25, rows),
+        'Sales': sales,
+        'Sales growth': rng.normal(11, 18, rows),
+        'Profit after tax': profit_after_tax,
+        'Profit growth': rng.normal(12, 35, rows),
+        'Price to Earning': price_to_earning,
+        'Industry PE': industry_pe,
+        'Price to book value': price / book_value,
+        'Industry PBV': np.exp(rng.normal(1.0, 0.4, rows)),
+        'Book value preceding year': book_value / np.exp(rng.normal(0.1, 0.15, rows)),
+        'Book value': book_value,
+        'Market Capitalization': market_cap,
+        'Promoter holding': rng.uniform(0, 75, rows),
+        'Change in promoter holding': rng.normal(0, 1.5, rows),
+        'Change in FII holding': rng.normal(0, 1.0, rows),
+        'Change in DII holding': rng.normal(0, 1.0, rows),
+        'Cash Conversion Cycle': rng.normal(60, 50, rows),
+        'Return on equity': rng.normal(13, 12, rows),
+        'Return on capital employed': rng.normal(15, 12, rows),
+        'Return on invested capital': rng.normal(12, 12, rows),
+        'QoQ Sales': rng.normal(3, 12, rows),
+        'QoQ Profits': rng.normal(3, 30, rows),
+        'Net Profit latest quarter': profit_after_tax / 4 * rng.normal(1, 0.2, rows),
+        'Net profit 3quarters back': profit_after_tax / 4 * rng.normal(1, 0.2, rows),
+        'OPM': opm,
+        'YOY Quarterly sales growth': rng.normal(11, 20, rows),
+        'YOY Quarterly profit growth': rng.normal(12, 40, rows),
+    }
+    universe = pd.DataFrame(data)[UNIVERSE_COLUMNS]
+    numeric = universe.columns[4:]
+    universe[numeric] = universe[numeric].round(2).mask(rng.random((rows, len(numeric))) < MISSING_SHARE)
+    return universe
+
+# Function to generate Zerodha-style holdings of `rows` positions in instruments of `universe`
+def holdings(rows, universe, seed=0):
+    rng = np.random.default_rng(seed + 1)
+    listed = universe.dropna(subset=['Current Price']).reset_index(drop=True)
+    picks = rng.integers(0, len(listed), rows)
+    instrument = listed['NSE Code'].to_numpy(dtype=object)[picks]
+    unlisted = rng.random(rows) < UNLISTED_HOLDING_SHARE
+    instrument[unlisted] = [f"UNLISTED{i}" for i in range(int(unlisted.sum()))]
+    ltp = listed['Current Price'].to_numpy()[picks]
+    return pd.DataFrame({
+        'Instrument': instrument,
+        'Qty.': rng.integers(1, 500, rows),
+        'Avg. cost': (ltp * np.exp(rng.normal(0, 0.3, rows))).round(2),
+        'LTP': ltp,
+    })
+
+# Function to write screener_<rows>.csv and holdings_<rows>.csv for each size, returns {rows: (screener path, holdings path)}
+def write_datasets(output_dir, sizes=BENCHMARK_SIZES, seed=0):
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {}
+    for rows in sizes:
+        universe = screener_universe(rows, seed)
+        screener_path = os.path.join(output_dir, f"screener_{rows}.csv")
+        holdings_path = os.path.join(output_dir, f"holdings_{rows}.csv")
+        universe.to_csv(screener_path, index=False)
+        holdings(rows, universe, seed).to_csv(holdings_path, index=False)
+        paths[rows] = (screener_path, holdings_path)
+    return paths
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write synthetic screener and holdings CSVs.")
+    parser.add_argument("--rows", type=int, nargs="+", default=BENCHMARK_SIZES, help="Universe sizes (default: 1k, 10k, 100k, 1M)")
+    parser.add_argument("--output-dir", default="benchmark_data", help="Directory for the CSVs (default: benchmark_data)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    for screener_path, holdings_path in write_datasets(args.output_dir, args.rows, args.seed).values():
+        print(screener_path)
+        print(holdings_path)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
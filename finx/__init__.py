@@ -0,0 +1,6 @@
+# Headless valuation, screening and portfolio logic shared by app.py and the CLI.
+from finx.delta import change_report, delta_valuations
+from finx.portfolio import build_valuation_index, process_portfolio_data
+from finx.screening import split_companies
+from finx.scenarios import evaluate_scenarios, sweep
+from finx.valuation import DEFAULT_SCENARIO, ValuationScenario, calculate_valuations, process_financial_data
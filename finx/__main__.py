@@ -0,0 +1,5 @@
+import sys
+
+from finx.cli import main
+
+sys.exit(main())
@@ -0,0 +1,175 @@
+# Backtest of the blended valuation over a history of dated snapshots.
+# All snapshots are stacked and valued in one calculate_valuations call, then laid out as
+# dates x stocks matrices. The realised return of every (date, stock) is read from the first
+# snapshot at least `horizon_days` later, and hit rate, rank IC and decile returns are
+# computed across the whole panel at once for each of the dashboard lists.
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from finx.screening import screen_mask
+from finx.snapshots import list_snapshots
+from finx.universe import IDENTIFIER_COLUMNS, load_universe
+from finx.valuation import VALUATION_INPUT_COLUMNS, calculate_valuations, column_values
+
+# Columns of the panel built from the history
+PANEL_COLUMNS = ['Date', 'NSE Code', 'Is SME', 'Screened', 'Current Price', 'Final expected price', 'Gain%']
+
+# Raw columns a snapshot needs for the backtest
+BACKTEST_COLUMNS = IDENTIFIER_COLUMNS + [column for column in VALUATION_INPUT_COLUMNS if column not in IDENTIFIER_COLUMNS]
+
+# Lists the backtest is broken down by, as in split_companies
+BACKTEST_GROUPS = ['all', 'non_sme', 'sme', 'non_sme_screened', 'sme_screened']
+
+DECILES = 10
+
+# Fewer stocks than this on a date give no rank IC for that date
+MIN_IC_STOCKS = 3
+
+# Function to value a history of (date, raw all stocks DataFrame) pairs into one long panel.
+# Rows without an NSE Code cannot be followed over time and are dropped; for a code listed
+# twice on one date the first row wins.
+def build_panel(history):
+    frames = [data.assign(Date=pd.Timestamp(date)) for date, data in history]
+    if not frames:
+        return pd.DataFrame(columns=PANEL_COLUMNS)
+    processed = calculate_valuations(pd.concat(frames, ignore_index=True))
+    processed['Screened'] = screen_mask(processed, 0) | screen_mask(processed, 1)
+    panel = processed[PANEL_COLUMNS].dropna(subset=['NSE Code'])
+    return panel.drop_duplicates(subset=['Date', 'NSE Code'], keep='first').reset_index(drop=True)
+
+# Function to read the stored versions of a snapshot store as (upload time, raw data) pairs, oldest first
+def load_snapshot_history(db_path):
+    history = []
+    for _, _, upload_time, storage_id, _ in reversed(list_snapshots(db_path)):
+        data = load_universe(db_path, storage_id, BACKTEST_COLUMNS)
+        if data is not None:
+            history.append((upload_time, data))
+    return history
+
+# Function to lay out a long panel as dates x stocks matrices
+def panel_matrices(panel):
+    panel_dates = panel['Date'].to_numpy(dtype='datetime64[ns]')
+    dates = np.unique(panel_dates)
+    codes = pd.Index(panel['NSE Code'].unique())
+    rows = np.searchsorted(dates, panel_dates)
+    cols = codes.get_indexer(panel['NSE Code'])
+    shape = (len(dates), len(codes))
+
+    def matrix(values, fill):
+        result = np.full(shape, fill, dtype=np.asarray(values).dtype)
+        result[rows, cols] = values
+        return result
+
+    return dates, codes, {
+        'price': matrix(column_values(panel, 'Current Price'), np.nan),
+        'predicted': matrix(column_values(panel, 'Gain%') / 100, np.nan),
+        'is_sme': matrix(column_values(panel, 'Is SME'), np.nan),
+        'screened': matrix(panel['Screened'].to_numpy(dtype=bool), False),
+    }
+
+# Function to get, for every snapshot date, the realised return to the first snapshot at least horizon_days later
+def realised_returns(dates, price, horizon_days):
+    future = np.searchsorted(dates, dates + np.timedelta64(horizon_days, 'D'))
+    has_future = future < len(dates)
+    future_price = np.full(price.shape, np.nan)
+    future_price[has_future] = price[future[has_future]]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = future_price / price - 1
+    returns[~(price > 0)] = np.nan
+    return returns
+
+def _group_masks(matrices, valid):
+    is_sme = matrices['is_sme']
+    screened = matrices['screened']
+    return {
+        'all': valid,
+        'non_sme': valid & (is_sme == 0),
+        'sme': valid & (is_sme == 1),
+        'non_sme_screened': valid & (is_sme == 0) & screened,
+        'sme_screened': valid & (is_sme == 1) & screened,
+    }
+
+# Function to rank the masked cells of every date (row), ties averaged; other cells are NaN
+def masked_ranks(values, mask):
+    return pd.DataFrame(np.where(mask, values, np.nan)).rank(axis=1).to_numpy()
+
+# Function to get the per-date Spearman correlation from the masked ranks of two matrices
+def rank_ic(predicted_rank, realised_rank, mask):
+    counts = mask.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'), warnings.catch_warnings():
+        # Dates without any masked stock give NaN
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        predicted_rank = predicted_rank - np.nanmean(predicted_rank, axis=1, keepdims=True)
+        realised_rank = realised_rank - np.nanmean(realised_rank, axis=1, keepdims=True)
+        covariance = np.nansum(predicted_rank * realised_rank, axis=1)
+        scale = np.sqrt(np.nansum(predicted_rank ** 2, axis=1) * np.nansum(realised_rank ** 2, axis=1))
+        ic = covariance / scale
+    ic[counts < MIN_IC_STOCKS] = np.nan
+    return ic
+
+# Function to get the mean realised return of each predicted-upside decile per date, a (dates, DECILES) matrix
+def decile_returns(predicted_rank, realised, mask):
+    date_index, stock_index = np.nonzero(mask)
+    counts = mask.sum(axis=1)
+    percentile = predicted_rank[date_index, stock_index] / counts[date_index]
+    bucket = date_index * DECILES + np.clip(np.ceil(percentile * DECILES) - 1, 0, DECILES - 1).astype(int)
+    size = mask.shape[0] * DECILES
+    totals = np.bincount(bucket, weights=realised[date_index, stock_index], minlength=size)
+    bucket_counts = np.bincount(bucket, minlength=size)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (totals / bucket_counts).reshape(mask.shape[0], DECILES)
+
+# Run the backtest on a long panel from build_panel.
+# Returns a dict of DataFrames:
+#   observations: predicted upside and realised return of every stock and date with a realised price
+#   summary: observations, hit rate, mean rank IC and decile spread per group
+#   rank_ic: rank IC per date and group
+#   deciles: mean realised return per predicted-upside decile and group, dates weighted equally
+def run_backtest(panel, horizon_days=30):
+    dates, codes, matrices = panel_matrices(panel)
+    predicted = matrices['predicted']
+    realised = realised_returns(dates, matrices['price'], horizon_days)
+    valid = np.isfinite(predicted) & np.isfinite(realised)
+    groups = _group_masks(matrices, valid)
+    hits = (predicted > 0) == (realised > 0)
+
+    summary, daily_ic, deciles = {}, {}, {}
+    for group, mask in groups.items():
+        predicted_rank = masked_ranks(predicted, mask)
+        ic = rank_ic(predicted_rank, masked_ranks(realised, mask), mask)
+        with warnings.catch_warnings():
+            # Deciles that are empty on every date stay NaN
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            mean_deciles = np.nanmean(decile_returns(predicted_rank, realised, mask), axis=0)
+        ic_dates = int(np.isfinite(ic).sum())
+        observations = int(mask.sum())
+        summary[group] = {
+            'Observations': observations,
+            'Dates': int(mask.any(axis=1).sum()),
+            'Hit rate': hits[mask].mean() if observations else np.nan,
+            'Mean rank IC': np.nanmean(ic) if ic_dates else np.nan,
+            'IC t-stat': np.nanmean(ic) / np.nanstd(ic, ddof=1) * np.sqrt(ic_dates) if ic_dates > 1 else np.nan,
+            'Top decile return': mean_deciles[-1],
+            'Bottom decile return': mean_deciles[0],
+            'Top - bottom spread': mean_deciles[-1] - mean_deciles[0],
+        }
+        daily_ic[group] = ic
+        deciles[group] = mean_deciles
+
+    date_index, stock_index = np.nonzero(valid)
+    observations = pd.DataFrame({
+        'Date': dates[date_index],
+        'NSE Code': codes[stock_index],
+        'Is SME': matrices['is_sme'][date_index, stock_index],
+        'Screened': matrices['screened'][date_index, stock_index],
+        'Predicted upside': predicted[date_index, stock_index],
+        'Realised return': realised[date_index, stock_index],
+    })
+    return {
+        'observations': observations,
+        'summary': pd.DataFrame.from_dict(summary, orient='index').rename_axis('List'),
+        'rank_ic': pd.DataFrame(daily_ic, index=pd.DatetimeIndex(dates, name='Date')),
+        'deciles': pd.DataFrame(deciles, index=pd.RangeIndex(1, DECILES + 1, name='Decile')),
+    }
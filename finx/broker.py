@@ -0,0 +1,141 @@
+# Zerodha holdings and prices for the portfolio analysis.
+# KiteData wraps a KiteConnect client (or anything with the same holdings() / ltp() methods,
+# such as a local fake). Holdings and last traded prices are cached with a TTL, prices of all
+# held instruments are requested in as few ltp() calls as the API allows, and every call goes
+# through a rate limiter so refreshes stay inside the Kite Connect request limits.
+import threading
+import time
+
+import pandas as pd
+
+DEFAULT_EXCHANGE = "NSE"
+
+# Instruments per ltp() call allowed by Kite Connect
+LTP_BATCH_SIZE = 1000
+
+# Requests per second allowed by Kite Connect for quotes and for the other endpoints
+QUOTE_RATE = 1
+API_RATE = 10
+
+# Retries of a call rejected with HTTP 429
+RATE_LIMIT_RETRIES = 3
+
+# Holdings fields and the portfolio columns they map to
+HOLDINGS_COLUMNS = {
+    'tradingsymbol': 'Instrument',
+    'quantity': 'Qty.',
+    'average_price': 'Avg. cost',
+    'last_price': 'LTP',
+}
+
+
+class RateLimiter:
+    # Allows at most `rate` calls per `per` seconds, sleeping the caller when needed
+    def __init__(self, rate, per=1.0, clock=time.monotonic, sleep=time.sleep):
+        self.interval = per / rate
+        self.clock = clock
+        self.sleep = sleep
+        self._next_call = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = self.clock()
+            if now < self._next_call:
+                self.sleep(self._next_call - now)
+                now = self._next_call
+            self._next_call = now + self.interval
+
+
+def _is_rate_limited(error):
+    return getattr(error, 'code', None) == 429
+
+
+class KiteData:
+    def __init__(self, kite, quote_ttl=5.0, holdings_ttl=60.0, exchange=DEFAULT_EXCHANGE,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.kite = kite
+        self.quote_ttl = quote_ttl
+        self.holdings_ttl = holdings_ttl
+        self.exchange = exchange
+        self.clock = clock
+        self.sleep = sleep
+        self.quote_limiter = RateLimiter(QUOTE_RATE, clock=clock, sleep=sleep)
+        self.api_limiter = RateLimiter(API_RATE, clock=clock, sleep=sleep)
+        self._holdings = None
+        self._holdings_time = None
+        # instrument key ("NSE:TCS") -> (last price, fetch time)
+        self._prices = {}
+        # instrument key -> instrument token, as reported with each quote
+        self._tokens = {}
+        # trading symbol -> exchange of each holding, so held instruments are quoted where they are held
+        self._exchanges = {}
+        self._lock = threading.Lock()
+
+    def _call(self, limiter, method, *args):
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            limiter.wait()
+            try:
+                return method(*args)
+            except Exception as e:
+                if not _is_rate_limited(e) or attempt == RATE_LIMIT_RETRIES:
+                    raise
+                self.sleep(2 ** attempt)
+
+    def _fresh(self, fetch_time, ttl):
+        return fetch_time is not None and self.clock() - fetch_time < ttl
+
+    def instrument_key(self, instrument, exchange=None):
+        return f"{exchange or self._exchanges.get(instrument, self.exchange)}:{instrument}"
+
+    # Function to get the holdings as a portfolio frame (Instrument, Qty., Avg. cost, LTP), refetched after holdings_ttl
+    def holdings(self, refresh=False):
+        with self._lock:
+            if refresh or not self._fresh(self._holdings_time, self.holdings_ttl):
+                holdings = self._call(self.api_limiter, self.kite.holdings)
+                frame = pd.DataFrame(holdings, columns=list(HOLDINGS_COLUMNS) + ['exchange'])
+                frame['exchange'] = frame['exchange'].fillna(self.exchange)
+                self._exchanges = dict(zip(frame['tradingsymbol'], frame['exchange']))
+                now = self.clock()
+                # The holdings already carry a last price, so they warm the price cache
+                for row in frame.itertuples(index=False):
+                    self._prices[self.instrument_key(row.tradingsymbol, row.exchange)] = (row.last_price, now)
+                self._holdings = frame.rename(columns=HOLDINGS_COLUMNS).drop(columns='exchange')
+                self._holdings_time = now
+            return self._holdings.copy()
+
+    # Function to get {instrument: last price} for the given trading symbols.
+    # Cached prices younger than quote_ttl are reused; the rest are fetched in LTP_BATCH_SIZE batches.
+    def last_prices(self, instruments, refresh=False):
+        keys = {instrument: self.instrument_key(instrument) for instrument in dict.fromkeys(instruments)}
+        with self._lock:
+            stale = [key for key in keys.values()
+                     if refresh or not self._fresh(self._prices.get(key, (None, None))[1], self.quote_ttl)]
+            for start in range(0, len(stale), LTP_BATCH_SIZE):
+                batch = stale[start:start + LTP_BATCH_SIZE]
+                quotes = self._call(self.quote_limiter, self.kite.ltp, batch)
+                now = self.clock()
+                for key, quote in quotes.items():
+                    self._prices[key] = (quote['last_price'], now)
+                    if 'instrument_token' in quote:
+                        self._tokens[key] = quote['instrument_token']
+            return {
+                instrument: self._prices[key][0] for instrument, key in keys.items() if key in self._prices
+            }
+
+    # Function to replace the LTP of a portfolio frame with current prices; instruments without a quote keep theirs
+    def refresh_prices(self, portfolio_df, refresh=False):
+        prices = self.last_prices(portfolio_df['Instrument'].dropna(), refresh)
+        portfolio_df = portfolio_df.copy()
+        portfolio_df['LTP'] = portfolio_df['Instrument'].map(prices).fillna(portfolio_df['LTP'])
+        return portfolio_df
+
+    # Function to get {instrument: instrument token} for subscribing to the tick stream
+    def instrument_tokens(self, instruments):
+        instruments = list(dict.fromkeys(instruments))
+        if any(self.instrument_key(instrument) not in self._tokens for instrument in instruments):
+            self.last_prices(instruments, refresh=True)
+        return {
+            instrument: self._tokens[self.instrument_key(instrument)]
+            for instrument in instruments if self.instrument_key(instrument) in self._tokens
+        }
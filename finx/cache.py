@@ -0,0 +1,146 @@
+# Persistent cache of processed screener snapshots.
+# Entries are keyed by the SHA-256 of the raw CSV bytes plus VALUATION_VERSION, so the
+# same upload is only valued once and a formula change invalidates every entry.
+import hashlib
+import io
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from finx.delta import DELTA_MAX_CHANGED, delta_valuations
+from finx.instrumentation import span
+from finx.peers import build_peer_index, with_peer_multiples
+from finx.portfolio import build_valuation_index
+from finx.valuation import VALUATION_VERSION, calculate_valuations
+
+CACHE_SUFFIX = ".pkl"
+
+# Bump whenever the layout of a cached snapshot changes
+CACHE_FORMAT = 6
+
+# Function to hash raw file bytes
+def content_hash(file_bytes):
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+class SnapshotCache:
+    # Pickled entries live in `directory`; the most recently used ones are also kept in memory.
+    # The disk side is evicted least-recently-used first once it exceeds max_bytes or max_entries.
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024, max_entries=32, memory_entries=4):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + CACHE_SUFFIX)
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+            path = self._path(key)
+            try:
+                with open(path, "rb") as f:
+                    value = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                return None
+            # Touch the file so eviction sees it as recently used
+            os.utime(path)
+            self._remember(key, value)
+            return value
+
+    # Function to get an entry only when it is held in memory; never reads the disk
+    def peek(self, key):
+        with self._lock:
+            return self._memory.get(key)
+
+    def put(self, key, value):
+        with self._lock:
+            path = self._path(key)
+            temp_path = path + ".tmp"
+            with open(temp_path, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+            self._remember(key, value)
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(CACHE_SUFFIX):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        entries.sort()
+        total_bytes = sum(size for _, size, _ in entries)
+        while entries and (total_bytes > self.max_bytes or len(entries) > self.max_entries):
+            _, size, name = entries.pop(0)
+            os.remove(os.path.join(self.directory, name))
+            self._memory.pop(name[:-len(CACHE_SUFFIX)], None)
+            total_bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            for name in os.listdir(self.directory):
+                if name.endswith(CACHE_SUFFIX):
+                    os.remove(os.path.join(self.directory, name))
+
+
+def _snapshot_key(file_hash, source, peer_mode):
+    key = f"{file_hash}-{source}-v{VALUATION_VERSION}.{CACHE_FORMAT}"
+    if peer_mode:
+        key += f"-peers-{peer_mode}"
+    return key
+
+# Function to get the processed data, valuation index and peer index for a snapshot, valuing it only on a cache miss.
+# load_data is called on a miss and returns the raw all stocks DataFrame, or None when the
+# snapshot's data is gone, which raises LookupError; source tells
+# apart loaders that return different column sets for the same content. A miss values the
+# snapshot in full, unless previous_hash names a snapshot whose result is already in the cache's
+# memory and at most DELTA_MAX_CHANGED of the rows changed since; then only those rows are
+# revalued. The previous snapshot is never read from disk, loaded or valued for this.
+# peer_mode ('fill' or 'replace', see finx.peers) values Industry PE / PBV from the peer index.
+# The dashboard lists are not stored; the app builds each one when its view is opened.
+def get_processed_snapshot(cache, file_hash, load_data, source="csv", previous_hash=None, peer_mode=None):
+    key = _snapshot_key(file_hash, source, peer_mode)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        data = load_data()
+        if data is None:
+            raise LookupError(f"The data of snapshot {file_hash} is missing from the store.")
+        with span('peer_index', len(data)):
+            peer_index = build_peer_index(data)
+            if peer_mode:
+                data = with_peer_multiples(data, peer_index, peer_mode)
+        previous = cache.peek(_snapshot_key(previous_hash, source, peer_mode)) if previous_hash else None
+        if previous is not None:
+            with span('valuation.delta', len(data)):
+                processed_data, _ = delta_valuations(previous['processed_data'], data, max_changed=DELTA_MAX_CHANGED)
+        else:
+            processed_data = calculate_valuations(data)
+        snapshot = {
+            'key': key,
+            'processed_data': processed_data,
+            'valuation_index': build_valuation_index(processed_data),
+            'peer_index': peer_index,
+        }
+        cache.put(key, snapshot)
+    return snapshot
+
+# Function to get the processed snapshot for raw CSV bytes
+def load_processed_snapshot(cache, file_bytes):
+    return get_processed_snapshot(cache, content_hash(file_bytes), lambda: pd.read_csv(io.BytesIO(file_bytes)))
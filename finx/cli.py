@@ -0,0 +1,154 @@
+# Command line entry point: python -m finx <screener csv or directory>... [--holdings holdings.csv]
+import argparse
+import os
+import re
+import sys
+
+import pandas as pd
+
+from finx.backtest import BACKTEST_COLUMNS, build_panel, run_backtest
+from finx.instrumentation import INSTRUMENTATION, log_to_file
+from finx.ingest import load_processed_csv, stream_valuations
+from finx.montecarlo import MonteCarloConfig, run_monte_carlo
+from finx.portfolio import build_valuation_index, process_portfolio_data, stack_portfolios, summarise_portfolios
+from finx.screening import split_companies
+from finx.universe import UNIVERSE_COLUMNS
+
+# Function to expand files and directories into a sorted list of CSV paths
+def collect_input_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith(".csv")
+            ))
+        else:
+            files.append(path)
+    return files
+
+# Function to process one screener snapshot and write its outputs, returns the written paths.
+# Only UNIVERSE_COLUMNS are read unless columns=None.
+def process_snapshot(input_file, output_dir, holdings=(), write_splits=False, monte_carlo=None, workers=None, consolidate=False,
+                     columns=UNIVERSE_COLUMNS):
+    stem = os.path.splitext(os.path.basename(input_file))[0]
+    processed_data = load_processed_csv(input_file, columns)
+    written = []
+
+    output_path = os.path.join(output_dir, f"{stem}_processed.csv")
+    processed_data.sort_values(by='Gain%', ascending=False).to_csv(output_path, index=False)
+    written.append(output_path)
+
+    if write_splits:
+        for split_name, split_df in split_companies(processed_data).items():
+            split_path = os.path.join(output_dir, f"{stem}_{split_name}.csv")
+            split_df.to_csv(split_path, index=False)
+            written.append(split_path)
+
+    if monte_carlo is not None:
+        bands = run_monte_carlo(processed_data, monte_carlo, workers=workers)
+        bands_path = os.path.join(output_dir, f"{stem}_monte_carlo.csv")
+        processed_data[['Name', 'NSE Code', 'Current Price', 'Final expected price']].join(bands).to_csv(bands_path, index=False)
+        written.append(bands_path)
+
+    valuation_index = build_valuation_index(processed_data) if holdings else None
+    for holdings_file, portfolio_df in holdings:
+        holdings_stem = os.path.splitext(os.path.basename(holdings_file))[0]
+        portfolio_path = os.path.join(output_dir, f"{stem}_{holdings_stem}_portfolio.csv")
+        process_portfolio_data(portfolio_df, valuation_index).to_csv(portfolio_path, index=False)
+        written.append(portfolio_path)
+
+    if consolidate and holdings:
+        names = [os.path.splitext(os.path.basename(holdings_file))[0] for holdings_file, _ in holdings]
+        consolidated = stack_portfolios(names, [portfolio_df for _, portfolio_df in holdings])
+        for summary_name, summary in summarise_portfolios(process_portfolio_data(consolidated, valuation_index)).items():
+            summary_path = os.path.join(output_dir, f"{stem}_household_{summary_name}.csv")
+            summary.to_csv(summary_path, index=summary_name != 'holdings')
+            written.append(summary_path)
+    return written
+
+# Function to value one snapshot in chunks of chunksize rows straight into its processed CSV, returns the written path.
+# Rows keep the order of the export instead of being sorted by Gain%.
+def stream_snapshot(input_file, output_dir, chunksize, columns=UNIVERSE_COLUMNS):
+    stem = os.path.splitext(os.path.basename(input_file))[0]
+    output_path = os.path.join(output_dir, f"{stem}_processed.csv")
+    stream_valuations(input_file, output_path, columns, chunksize)
+    return output_path
+
+# Function to date a snapshot file by a YYYY-MM-DD in its name, or else by its modification time
+def snapshot_date(path):
+    match = re.search(r"\d{4}-\d{2}-\d{2}", os.path.basename(path))
+    return pd.Timestamp(match.group()) if match else pd.Timestamp(os.path.getmtime(path), unit='s')
+
+# Function to backtest the snapshots as one dated history and write its tables, returns the written paths
+def write_backtest(input_files, output_dir, horizon_days):
+    history = [
+        (snapshot_date(path), pd.read_csv(path, usecols=lambda column: column in BACKTEST_COLUMNS))
+        for path in input_files
+    ]
+    written = []
+    for name, table in run_backtest(build_panel(history), horizon_days).items():
+        table_path = os.path.join(output_dir, f"backtest_{name}.csv")
+        table.to_csv(table_path, index=name != 'observations')
+        written.append(table_path)
+    return written
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="finx", description="Value screener.in exports without starting the Streamlit app.")
+    parser.add_argument("inputs", nargs="+", help="Screener CSV files or directories of CSV snapshots")
+    parser.add_argument("--holdings", action="append", default=[], help="Holdings CSV to analyse against every snapshot (repeatable)")
+    parser.add_argument("--output-dir", default="processed", help="Directory for the processed CSVs (default: processed)")
+    parser.add_argument("--splits", action="store_true", help="Also write the SME / non-SME and screened lists")
+    parser.add_argument("--consolidate", action="store_true", help="Also write household summaries across all --holdings files")
+    parser.add_argument("--monte-carlo", type=int, metavar="SIMULATIONS", help="Also write P5/P50/P95 price bands from this many simulations")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for --monte-carlo (default: 0)")
+    parser.add_argument("--workers", type=int, help="Worker processes for --monte-carlo")
+    parser.add_argument("--backtest", type=int, metavar="DAYS", help="Also backtest the inputs as a dated history against prices DAYS later")
+    parser.add_argument("--chunksize", type=int, metavar="ROWS",
+                        help="Value each input in chunks of ROWS rows and write the processed CSV as it goes, in export order")
+    parser.add_argument("--all-columns", action="store_true", help="Keep every column of the export instead of only the ones the valuation and health summary use")
+    parser.add_argument("--span-log", metavar="PATH", help="Append the timing of every stage (parsing, each valuation method, ...) to PATH as JSON lines")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    input_files = collect_input_files(args.inputs)
+    if not input_files:
+        print("No CSV files found.", file=sys.stderr)
+        return 1
+
+    if args.chunksize and (args.holdings or args.splits or args.monte_carlo):
+        print("--chunksize only writes the processed CSV; it cannot be combined with --holdings, --splits or --monte-carlo.", file=sys.stderr)
+        return 2
+    columns = None if args.all_columns else UNIVERSE_COLUMNS
+    if args.span_log:
+        log_to_file(args.span_log)
+        INSTRUMENTATION.enabled = True
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    # Holdings are parsed once and reused for every snapshot
+    holdings = [(path, pd.read_csv(path)) for path in args.holdings]
+
+    monte_carlo = MonteCarloConfig(simulations=args.monte_carlo, seed=args.seed) if args.monte_carlo else None
+
+    failures = 0
+    for input_file in input_files:
+        INSTRUMENTATION.start_run(input_file)
+        try:
+            if args.chunksize:
+                print(stream_snapshot(input_file, args.output_dir, args.chunksize, columns))
+                continue
+            for path in process_snapshot(input_file, args.output_dir, holdings, args.splits, monte_carlo, args.workers, args.consolidate,
+                                         columns):
+                print(path)
+        except Exception as e:
+            failures += 1
+            print(f"An error occurred while processing {input_file}: {e}", file=sys.stderr)
+
+    if args.backtest:
+        try:
+            for path in write_backtest(input_files, args.output_dir, args.backtest):
+                print(path)
+        except Exception as e:
+            failures += 1
+            print(f"An error occurred while backtesting: {e}", file=sys.stderr)
+    return 1 if failures else 0
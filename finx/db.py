@@ -0,0 +1,226 @@
+# SQLite access layer shared by the snapshot, universe, screen and portfolio stores.
+# The process keeps one long-lived connection per database file, shared by every thread (Streamlit
+# runs each rerun on a new thread), instead of a connect per call; a lock serialises its transactions.
+# Connections run in WAL mode with foreign keys on, and the schema is brought up to date once
+# per process through the numbered migrations below (tracked in PRAGMA user_version).
+# Large files are written and read through SQLite's incremental BLOB I/O, one chunk at a time.
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+
+# Seconds a connection waits for a lock held by another connection
+BUSY_TIMEOUT = 30
+
+# Memory map up to 256 MB of the database file for reads
+MMAP_SIZE = 256 * 1024 * 1024
+
+# Bytes moved per incremental BLOB read or write
+BLOB_CHUNK_SIZE = 1024 * 1024
+
+# Incremental BLOB I/O needs Python 3.11; older versions bind and fetch whole blobs
+HAS_BLOBOPEN = hasattr(sqlite3.Connection, "blobopen")
+
+_connections = {}
+_connections_lock = threading.Lock()
+
+# Function to add a column to an existing table if an older database does not have it yet
+def _ensure_column(cursor, table, column, definition):
+    columns = [row[1] for row in cursor.execute(f"PRAGMA table_info({table})")]
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+# 1: the tables as the earlier per-helper CREATE TABLE IF NOT EXISTS statements left them, and the
+# upgrade of databases from the delete-and-reinsert version, which kept one unlinked row per table
+def _create_base_tables(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS file_metadata (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        filename TEXT,
+                        upload_time TEXT)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS file_storage (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        file_data BLOB)''')
+    _ensure_column(cursor, "file_metadata", "storage_id", "INTEGER REFERENCES file_storage(id)")
+    _ensure_column(cursor, "file_storage", "content_hash", "TEXT")
+    for storage_id, file_data in cursor.execute(
+        "SELECT id, file_data FROM file_storage WHERE content_hash IS NULL"
+    ).fetchall():
+        cursor.execute("UPDATE file_storage SET content_hash = ? WHERE id = ?",
+                       (hashlib.sha256(file_data).hexdigest(), storage_id))
+    cursor.execute("""UPDATE file_metadata SET storage_id = (SELECT MAX(id) FROM file_storage)
+                      WHERE storage_id IS NULL""")
+    cursor.execute('''CREATE TABLE IF NOT EXISTS saved_screens (
+                        name TEXT PRIMARY KEY,
+                        definition TEXT NOT NULL)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS portfolio_files (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        name TEXT,
+                        file_data BLOB,
+                        upload_time TEXT)''')
+
+# 2: enforced links from metadata to storage. SQLite cannot add a constraint to an existing
+# column, so file_metadata is rebuilt; portfolio blobs move out of the listed table into
+# portfolio_storage, and deleting a stored portfolio's blob deletes its metadata with it.
+def _link_metadata_to_storage(cursor):
+    cursor.execute("DELETE FROM file_metadata WHERE storage_id IS NULL OR storage_id NOT IN (SELECT id FROM file_storage)")
+    cursor.execute('''CREATE TABLE file_metadata_new (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        filename TEXT NOT NULL,
+                        upload_time TEXT NOT NULL,
+                        storage_id INTEGER NOT NULL REFERENCES file_storage(id))''')
+    cursor.execute("""INSERT INTO file_metadata_new (id, filename, upload_time, storage_id)
+                      SELECT id, COALESCE(filename, ''), COALESCE(upload_time, ''), storage_id FROM file_metadata""")
+    cursor.execute("DROP TABLE file_metadata")
+    cursor.execute("ALTER TABLE file_metadata_new RENAME TO file_metadata")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_file_storage_hash ON file_storage(content_hash)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_file_metadata_storage ON file_metadata(storage_id)")
+
+    cursor.execute('''CREATE TABLE portfolio_storage (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        file_data BLOB NOT NULL)''')
+    cursor.execute('''CREATE TABLE portfolio_files_new (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        name TEXT NOT NULL,
+                        upload_time TEXT NOT NULL,
+                        storage_id INTEGER NOT NULL UNIQUE REFERENCES portfolio_storage(id) ON DELETE CASCADE)''')
+    cursor.execute("INSERT INTO portfolio_storage (id, file_data) SELECT id, COALESCE(file_data, X'') FROM portfolio_files")
+    cursor.execute("""INSERT INTO portfolio_files_new (id, name, upload_time, storage_id)
+                      SELECT id, COALESCE(name, ''), COALESCE(upload_time, ''), id FROM portfolio_files""")
+    cursor.execute("DROP TABLE portfolio_files")
+    cursor.execute("ALTER TABLE portfolio_files_new RENAME TO portfolio_files")
+
+# Schema migrations in order; migration n brings a database to user_version n
+MIGRATIONS = [
+    _create_base_tables,
+    _link_metadata_to_storage,
+]
+
+# Function to bring a database up to the latest schema version; returns the version.
+# Each migration runs in its own transaction with foreign keys checked at the end.
+def migrate(conn):
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= len(MIGRATIONS):
+        return len(MIGRATIONS)
+    # Foreign keys can only be switched outside a transaction; tables are rebuilt with them off
+    conn.execute("PRAGMA foreign_keys = OFF")
+    try:
+        for number, migration in enumerate(MIGRATIONS, start=1):
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                # Re-read under the write lock in case another process migrated in the meantime
+                if conn.execute("PRAGMA user_version").fetchone()[0] >= number:
+                    continue
+                cursor = conn.cursor()
+                migration(cursor)
+                violations = cursor.execute("PRAGMA foreign_key_check").fetchall()
+                if violations:
+                    raise sqlite3.IntegrityError(f"Migration {number} left {len(violations)} broken foreign keys")
+                cursor.execute(f"PRAGMA user_version = {number}")
+    finally:
+        conn.execute("PRAGMA foreign_keys = ON")
+    return len(MIGRATIONS)
+
+def _configure(conn):
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+
+
+class SharedConnection:
+    # The process-wide connection to one database. `with` holds its lock for the whole transaction,
+    # so transactions from different threads never interleave; other attributes are the connection's.
+    def __init__(self, conn):
+        self._conn = conn
+        self._lock = threading.RLock()
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            return self._conn.__enter__()
+        except BaseException:
+            self._lock.release()
+            raise
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            return self._conn.__exit__(exc_type, exc, tb)
+        finally:
+            self._lock.release()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+# Function to get the process's connection to a database, opening, configuring and migrating it
+# on first use. Use it as `with connect(path) as conn:` for a transaction that commits on success
+# and rolls back on error, and holds the connection's lock meanwhile; the connection stays open.
+def connect(db_path):
+    key = os.path.abspath(db_path)
+    shared = _connections.get(key)
+    if shared is None:
+        with _connections_lock:
+            shared = _connections.get(key)
+            if shared is None:
+                conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+                # WAL is a property of the database file, so setting it once is enough
+                conn.execute("PRAGMA journal_mode = WAL")
+                migrate(conn)
+                _configure(conn)
+                shared = _connections[key] = SharedConnection(conn)
+    return shared
+
+# Function to close the process's connections, e.g. before deleting a database file
+def close_connections():
+    with _connections_lock:
+        for shared in _connections.values():
+            shared.close()
+        _connections.clear()
+
+# Function to insert a row holding `data` in `column` and the given other column values;
+# the blob is written in BLOB_CHUNK_SIZE pieces into a zeroblob. Returns the new rowid.
+def insert_blob(conn, table, column, data, **values):
+    columns = ", ".join([column, *values])
+    placeholders = ", ?" * len(values)
+    if not HAS_BLOBOPEN:
+        return conn.execute(f"INSERT INTO {table} ({columns}) VALUES (?{placeholders})", (data, *values.values())).lastrowid
+    view = memoryview(data).cast("B")
+    rowid = conn.execute(f"INSERT INTO {table} ({columns}) VALUES (zeroblob(?){placeholders})",
+                         (len(view), *values.values())).lastrowid
+    with conn.blobopen(table, column, rowid, readonly=False) as blob:
+        for start in range(0, len(view), BLOB_CHUNK_SIZE):
+            blob.write(view[start:start + BLOB_CHUNK_SIZE])
+    return rowid
+
+
+class BlobReader(io.RawIOBase):
+    # Raw binary file over an open sqlite3.Blob
+    def __init__(self, blob):
+        self._blob = blob
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._blob.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._blob.close()
+        super().close()
+
+# Function to open a blob as a buffered binary file that reads BLOB_CHUNK_SIZE at a time, so
+# parsers can stream it without the whole blob in memory. Returns None when the row does not exist.
+def open_blob(conn, table, column, rowid):
+    if not HAS_BLOBOPEN:
+        row = conn.execute(f"SELECT {column} FROM {table} WHERE rowid = ?", (rowid,)).fetchone()
+        return io.BytesIO(row[0]) if row else None
+    try:
+        blob = conn.blobopen(table, column, rowid, readonly=True)
+    except sqlite3.OperationalError:
+        return None
+    return io.BufferedReader(BlobReader(blob), buffer_size=BLOB_CHUNK_SIZE)
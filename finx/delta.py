@@ -0,0 +1,148 @@
+# Incremental revaluation between successive all stocks snapshots.
+# Rows are matched to the previous processed snapshot by NSE Code. A valuation term is only
+# recomputed for the rows where one of its input columns changed; every other value is
+# copied over. The kernels are element-wise, so the result is identical to a full
+# calculate_valuations run with the same scenario.
+import numpy as np
+import pandas as pd
+
+from finx.valuation import (
+    DEFAULT_SCENARIO, VALUATION_INPUT_COLUMNS, VALUATION_OUTPUT_COLUMNS, blended_price_and_gain,
+    calculate_enterprise_value, calculate_valuations, column_values, ev_ebitda_method_values,
+    pb_method_values, pe_method_values, revenue_method_values, safe_divide,
+)
+
+_ENTERPRISE_INPUTS = ['Number of equity shares', 'Current Price', 'Debt', 'Cash Equivalents', 'Operating profit']
+_REVENUE_INPUTS = ['Number of equity shares', 'Current Price', 'Sales', 'Sales growth']
+_PE_INPUTS = ['Profit after tax', 'Profit growth', 'Price to Earning', 'Industry PE', 'Number of equity shares']
+_PB_INPUTS = ['Price to book value', 'Industry PBV', 'Book value preceding year', 'Book value']
+
+# EBITDA and Market Capitalisation are plain copies of input columns and are always taken from the new data.
+# Valuation terms in evaluation order: (name, input columns, columns read, output columns).
+# Current Price feeds the EV/EBITDA multiple and the revenue multiple, but not the PE and PB
+# methods, which take the reported ratios as they are.
+VALUATION_TERMS = [
+    ('Enterprise Value', _ENTERPRISE_INPUTS, _ENTERPRISE_INPUTS, ['Enterprise Value', 'EV/EBITDA']),
+    ('EV/EBITDA Method', _ENTERPRISE_INPUTS + ['Operating profit growth'],
+     ['EBITDA', 'EV/EBITDA', 'Debt', 'Number of equity shares', 'Operating profit growth'], ['Value as per EV/EBITDA Method']),
+    ('Revenue Method', _REVENUE_INPUTS, _REVENUE_INPUTS, ['Value as per Revenue Method']),
+    ('PE Multiple', _PE_INPUTS, _PE_INPUTS, ['Value as per PE Multiple']),
+    ('PB Multiple', _PB_INPUTS, _PB_INPUTS, ['Value as per PB Multiple', 'PB_elements_is_1']),
+]
+
+# The blend reads every method value and Current Price
+_BLEND_READS = ['Value as per PE Multiple', 'Value as per EV/EBITDA Method', 'Value as per Revenue Method',
+                'Value as per PB Multiple', 'Current Price']
+
+# Share of rows with a changed valuation input above which delta_valuations falls back to a full
+# calculate_valuations run; gathering and scattering the dirty rows costs more than it saves
+DELTA_MAX_CHANGED = 0.2
+
+# Default threshold, in Gain% points, for a move to show up in the change report
+GAIN_MOVE_THRESHOLD = 10.0
+
+def _term_values(term, df, scenario):
+    if term == 'Enterprise Value':
+        enterprise_value = calculate_enterprise_value(df)
+        return [enterprise_value, safe_divide(enterprise_value, column_values(df, 'Operating profit'))]
+    if term == 'EV/EBITDA Method':
+        return [ev_ebitda_method_values(df, scenario)]
+    if term == 'Revenue Method':
+        return [revenue_method_values(df, scenario)]
+    if term == 'PE Multiple':
+        return [pe_method_values(df, scenario)]
+    return list(pb_method_values(df, scenario))
+
+# Function to match rows of `data` to a unique NSE Code of the previous snapshot.
+# Returns the positions in `previous` (-1 for no match).
+def match_previous(previous, data):
+    previous_codes = previous['NSE Code']
+    # Intraday refreshes usually list the same companies in the same order
+    if previous_codes.equals(data['NSE Code']) and previous_codes.is_unique and not previous_codes.hasnans:
+        return np.arange(len(data))
+    unique = previous_codes.notna() & ~previous_codes.duplicated(keep=False)
+    lookup = pd.Index(previous_codes[unique])
+    positions = np.flatnonzero(unique.to_numpy())
+    matched = lookup.get_indexer(data['NSE Code'])
+    codes = data['NSE Code']
+    # A code that is duplicated in the new snapshot cannot be matched either
+    matched[(codes.isna() | codes.duplicated(keep=False)).to_numpy()] = -1
+    found = matched >= 0
+    matched[found] = positions[matched[found]]
+    return matched
+
+# Function to gather `columns` of the dirty rows into a small frame, output columns from `values`
+def _dirty_rows(data, values, columns, dirty):
+    return pd.DataFrame({
+        column: (values[column] if column in values else data[column].to_numpy())[dirty] for column in columns
+    })
+
+# Function to value `data` against the processed previous snapshot, recomputing only what changed.
+# `previous` must have been valued with the same scenario. When more than `max_changed` of the
+# rows changed (or are new), `data` is valued in full instead. Returns (processed data,
+# {term: rows recomputed}).
+def delta_valuations(previous, data, scenario=DEFAULT_SCENARIO, max_changed=1.0):
+    if previous is None or previous.empty:
+        return calculate_valuations(data, scenario), {term[0]: len(data) for term in VALUATION_TERMS}
+    matched = match_previous(previous, data)
+    has_match = matched >= 0
+    source = np.where(has_match, matched, 0)
+
+    changed = {}
+    for column in VALUATION_INPUT_COLUMNS:
+        new_values = column_values(data, column)
+        old_values = column_values(previous, column)[source]
+        same = (new_values == old_values) | (np.isnan(new_values) & np.isnan(old_values))
+        changed[column] = ~(same & has_match)
+    if np.logical_or.reduce(list(changed.values())).mean() > max_changed:
+        return calculate_valuations(data, scenario), {term[0]: len(data) for term in VALUATION_TERMS}
+
+    # Start from the previous values of every derived column and overwrite the dirty rows
+    values = {'EBITDA': data['Operating profit'].to_numpy()}
+    for column in VALUATION_OUTPUT_COLUMNS[2:]:
+        values[column] = previous[column].to_numpy()[source]
+
+    recomputed = {}
+    any_changed = np.zeros(len(data), dtype=bool)
+    for term, inputs, reads, outputs in VALUATION_TERMS:
+        dirty = np.logical_or.reduce([changed[column] for column in inputs])
+        recomputed[term] = int(dirty.sum())
+        if dirty.any():
+            for column, term_values in zip(outputs, _term_values(term, _dirty_rows(data, values, reads, dirty), scenario)):
+                values[column][dirty] = term_values
+        any_changed |= dirty
+
+    dirty = any_changed | changed['Current Price']
+    recomputed['Final expected price'] = int(dirty.sum())
+    if dirty.any():
+        final_expected_price, gain = blended_price_and_gain(_dirty_rows(data, values, _BLEND_READS, dirty), scenario)
+        values['Gain%'][dirty] = gain
+        values['Final expected price'][dirty] = final_expected_price
+
+    df = data.copy()
+    df['EBITDA'] = df['Operating profit']
+    df['Market Capitalisation'] = df['Market Capitalization']
+    for column in VALUATION_OUTPUT_COLUMNS[2:]:
+        df[column] = values[column]
+    return df, recomputed
+
+# Function to summarise what changed between two processed snapshots.
+# Returns a dict of DataFrames: new listings, removed listings and Gain% moves of at least `gain_threshold` points.
+def change_report(previous, current, gain_threshold=GAIN_MOVE_THRESHOLD):
+    columns = ['Name', 'NSE Code', 'Current Price', 'Gain%']
+    new_listings = current[current['NSE Code'].notna() & ~current['NSE Code'].isin(previous['NSE Code'].dropna())]
+    removed_listings = previous[previous['NSE Code'].notna() & ~previous['NSE Code'].isin(current['NSE Code'].dropna())]
+
+    matched = match_previous(previous, current)
+    has_match = matched >= 0
+    moves = current.loc[has_match, columns].copy()
+    moves.insert(3, 'Previous Gain%', column_values(previous, 'Gain%')[matched[has_match]])
+    moves['Gain% change'] = moves['Gain%'] - moves['Previous Gain%']
+    moves = moves[moves['Gain% change'].abs() >= gain_threshold]
+    moves = moves.iloc[np.argsort(-moves['Gain% change'].abs().to_numpy(), kind='stable')]
+
+    return {
+        'new_listings': new_listings[columns].reset_index(drop=True),
+        'removed_listings': removed_listings[columns].reset_index(drop=True),
+        'gain_moves': moves.reset_index(drop=True),
+    }
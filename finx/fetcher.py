@@ -0,0 +1,190 @@
+# Browserless fetching of screener.in CSV exports.
+# ScreenerHttpFetcher logs in once with a pooled requests session, submits a screen's export
+# form and streams the CSV into memory while hashing it. The validators of the last export
+# (ETag / Last-Modified and the content hash) are remembered per screen, so a screen that did
+# not change since the previous fetch is reported as not modified instead of stored again.
+# fetch_screen_export falls back to the Selenium session pool when the HTTP path fails.
+import hashlib
+import html
+import io
+import os
+import re
+import threading
+from dataclasses import dataclass
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from finx.scraper import SCREENER_BASE_URL, discard_download
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+CHUNK_SIZE = 64 * 1024
+
+# Only idempotent requests are retried; a resent login or export POST could act twice
+RETRY_METHODS = frozenset({'GET', 'HEAD'})
+
+_FORM_PATTERN = re.compile(r"<form\b(?P<attrs>[^>]*)>(?P<body>.*?)</form>", re.IGNORECASE | re.DOTALL)
+_ACTION_PATTERN = re.compile(r"""\baction\s*=\s*["'](?P<action>[^"']*)["']""", re.IGNORECASE)
+_CSRF_PATTERN = re.compile(
+    r"""<input\b[^>]*\bname\s*=\s*["']csrfmiddlewaretoken["'][^>]*\bvalue\s*=\s*["'](?P<token>[^"']*)["']""",
+    re.IGNORECASE,
+)
+_FILENAME_PATTERN = re.compile(r"""filename\*?=(?:UTF-8'')?["']?(?P<filename>[^"';]+)""", re.IGNORECASE)
+
+
+class FetchError(Exception):
+    pass
+
+
+# A downloaded export. Exposes name and getvalue() like a Streamlit upload, so it can be
+# stored through the same path as an uploaded file.
+@dataclass(frozen=True)
+class ScreenExport:
+    url: str
+    name: str
+    content: bytes
+    content_hash: str
+
+    def getvalue(self):
+        return self.content
+
+
+# Function to find the CSRF token of a Django form page
+def csrf_token(page):
+    match = _CSRF_PATTERN.search(page)
+    if match is None:
+        raise FetchError("No CSRF token found on the page.")
+    return html.unescape(match.group('token'))
+
+# Function to find (action, csrf token) of the export form on a screen page.
+# The export is the form holding the download button (class tooltip-left), as clicked by the Selenium path.
+def export_form(page, page_url):
+    for match in _FORM_PATTERN.finditer(page):
+        attrs, body = match.group('attrs'), match.group('body')
+        action = _ACTION_PATTERN.search(attrs)
+        if action and ('tooltip-left' in body or 'export' in action.group('action')):
+            return urljoin(page_url, html.unescape(action.group('action'))), csrf_token(body)
+    raise FetchError(f"No export form found on {page_url}.")
+
+def _export_filename(response, default):
+    match = _FILENAME_PATTERN.search(response.headers.get('Content-Disposition', ''))
+    return match.group('filename').strip() if match else default
+
+
+class ScreenerHttpFetcher:
+    def __init__(self, username, password, base_url=SCREENER_BASE_URL, pool_size=4, timeout=30, retries=3):
+        self.username = username
+        self.password = password
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = USER_AGENT
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size,
+            max_retries=Retry(total=retries, backoff_factor=0.5, status_forcelist=(502, 503, 504), allowed_methods=RETRY_METHODS),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._logged_in = False
+        self._lock = threading.Lock()
+        # url -> {'etag', 'last_modified', 'content_hash'} of the last export seen
+        self._validators = {}
+
+    def login(self):
+        login_url = f"{self.base_url}/login/"
+        page = self.session.get(login_url, timeout=self.timeout)
+        page.raise_for_status()
+        response = self.session.post(
+            login_url,
+            data={
+                'csrfmiddlewaretoken': csrf_token(page.text),
+                'username': self.username,
+                'password': self.password,
+            },
+            headers={'Referer': login_url},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        # Logged in once the form redirected away from the login page
+        if "/login" in response.url:
+            raise FetchError("Login to screener failed.")
+        self._logged_in = True
+
+    def _ensure_login(self):
+        with self._lock:
+            if not self._logged_in:
+                self.login()
+
+    def _screen_page(self, url):
+        self._ensure_login()
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        if "/login" in response.url:
+            # Session expired, log in again and go back to the screen
+            with self._lock:
+                self._logged_in = False
+            self._ensure_login()
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+        return response
+
+    # Fetch the CSV export of a screen. Returns a ScreenExport, or None when the screen is
+    # unchanged since the last fetch (HTTP 304, or the same content hash as last time).
+    def fetch(self, url):
+        page = self._screen_page(url)
+        action, token = export_form(page.text, page.url)
+
+        validators = self._validators.get(url, {})
+        headers = {'Referer': page.url}
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+
+        with self.session.post(action, data={'csrfmiddlewaretoken': token}, headers=headers,
+                               stream=True, timeout=self.timeout) as response:
+            if response.status_code == 304:
+                return None
+            response.raise_for_status()
+            if 'html' in response.headers.get('Content-Type', ''):
+                raise FetchError(f"Export of {url} returned a page instead of a CSV.")
+
+            digest = hashlib.sha256()
+            buffer = io.BytesIO()
+            for chunk in response.iter_content(CHUNK_SIZE):
+                digest.update(chunk)
+                buffer.write(chunk)
+            file_hash = digest.hexdigest()
+            filename = _export_filename(response, "screener_export.csv")
+            unchanged = file_hash == validators.get('content_hash')
+            self._validators[url] = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'content_hash': file_hash,
+            }
+
+        if unchanged:
+            return None
+        return ScreenExport(url, filename, buffer.getvalue(), file_hash)
+
+    def close(self):
+        self.session.close()
+
+
+# Function to fetch a screen export over HTTP, falling back to a Selenium session pool.
+# Returns a ScreenExport, or None when the screen did not change since the last fetch.
+def fetch_screen_export(url, fetcher, browser_pool=None):
+    try:
+        return fetcher.fetch(url)
+    except (FetchError, requests.RequestException):
+        if browser_pool is None:
+            raise
+    path = browser_pool.fetch(url)
+    try:
+        with open(path, "rb") as f:
+            content = f.read()
+    finally:
+        discard_download(path)
+    return ScreenExport(url, os.path.basename(path), content, hashlib.sha256(content).hexdigest())
@@ -0,0 +1,65 @@
+# Server-side paging for the dashboard grids.
+# A GridSource keeps one dashboard list in memory together with sort orders (built on first
+# use and then reused) and a lower-cased, pre-sorted Name index. A page request only slices
+# the requested window out of a precomputed order, and a Name filter is a binary search on
+# the Name index, so only page_size rows are ever sent to the browser.
+import numpy as np
+
+# Sorts past the last code point of any name prefix
+_PREFIX_END = chr(0x10FFFF)
+
+
+class GridSource:
+    def __init__(self, frame, columns):
+        self.frame = frame[columns].reset_index(drop=True)
+        self.columns = columns
+        names = self.frame['Name'].astype(str).str.lower().to_numpy()
+        self._name_order = np.argsort(names, kind='stable')
+        self._sorted_names = names[self._name_order]
+        self._orders = {}
+        self._ranks = {}
+
+    def __len__(self):
+        return len(self.frame)
+
+    # Function to get the row positions in sort order; NaN always sorts last and Name sorts case-insensitively
+    def order(self, column=None, ascending=True):
+        if column is None:
+            return np.arange(len(self.frame))
+        if column == 'Name':
+            return self._name_order if ascending else self._name_order[::-1]
+        key = (column, ascending)
+        if key not in self._orders:
+            values = self.frame[column].reset_index(drop=True)
+            self._orders[key] = values.sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+        return self._orders[key]
+
+    def _rank(self, column, ascending):
+        key = (column, ascending)
+        if key not in self._ranks:
+            order = self.order(column, ascending)
+            rank = np.empty(len(order), dtype=np.int64)
+            rank[order] = np.arange(len(order))
+            self._ranks[key] = rank
+        return self._ranks[key]
+
+    # Function to get the row positions whose Name starts with `prefix`, case-insensitive, in Name order
+    def name_matches(self, prefix):
+        prefix = prefix.lower()
+        start = np.searchsorted(self._sorted_names, prefix, side='left')
+        stop = np.searchsorted(self._sorted_names, prefix + _PREFIX_END, side='left')
+        return self._name_order[start:stop]
+
+    # Function to get one page and the number of matching rows.
+    # Without a sort column the rows keep the order of the frame the source was built from.
+    def page(self, page=0, page_size=10, sort_column=None, ascending=True, name_prefix=""):
+        if name_prefix:
+            positions = self.name_matches(name_prefix)
+            if sort_column is not None:
+                positions = positions[np.argsort(self._rank(sort_column, ascending)[positions], kind='stable')]
+            else:
+                positions = np.sort(positions)
+        else:
+            positions = self.order(sort_column, ascending)
+        start = page * page_size
+        return self.frame.iloc[positions[start:start + page_size]], len(positions)
@@ -0,0 +1,103 @@
+# Financial health summary of every company in a processed snapshot.
+# HealthTable converts the health metrics of the whole universe to numeric arrays once and
+# indexes the companies by Name, NSE Code and "Name (NSE Code)" label. Looking up a company is
+# then a dict lookup and a few array reads; only the rows a summary or comparison shows are
+# formatted, without building a frame per company.
+import numpy as np
+import pandas as pd
+
+# Metrics of the summary as (label, source column, format):
+#   yes_no: "Yes" when the value is 1; thousands: thousands separators;
+#   percent: a percentage value shown with two decimals; fixed: two decimals
+HEALTH_METRICS = [
+    ("SME", 'Is SME', 'yes_no'),
+    ("Market Capitalisation", 'Market Capitalization', 'thousands'),
+    ("Promoters Holding%", 'Promoter holding', 'percent'),
+    ("Change in PM", 'Change in promoter holding', 'fixed'),
+    ("Change in FII Hold%", 'Change in FII holding', 'percent'),
+    ("Change in DII Hold%", 'Change in DII holding', 'percent'),
+    ("Cash Conversion Cycle", 'Cash Conversion Cycle', 'fixed'),
+    ("Price to Book Value%", 'Price to book value', 'percent'),
+    ("ROE%", 'Return on equity', 'percent'),
+    ("ROCE%", 'Return on capital employed', 'percent'),
+    ("ROIC%", 'Return on invested capital', 'percent'),
+    ("QOQ Sales%", 'QoQ Sales', 'percent'),
+    ("QOQ Profit%", 'QoQ Profits', 'percent'),
+    ("Net Profit (Latest Quarter)", 'Net Profit latest quarter', 'thousands'),
+    ("Net Profit (3 Quarters Back)", 'Net profit 3quarters back', 'thousands'),
+    ("OPM%", 'OPM', 'percent'),
+    ("YOY Sales%", 'YOY Quarterly sales growth', 'percent'),
+    ("YOY Profit%", 'YOY Quarterly profit growth', 'percent'),
+]
+
+# Companies the compare view shows side by side
+MAX_COMPARE = 50
+
+_FORMATS = {'thousands': '{:,}'.format, 'percent': '{:.2%}'.format, 'fixed': '{:.2f}'.format}
+
+# Function to get a metric column as a numeric array; values keep their dtype, so float32
+# columns format as they would one company at a time
+def metric_values(column):
+    return pd.to_numeric(column, errors='coerce').to_numpy()
+
+# Function to format metric values (an array from metric_values, or a selection of one)
+def format_metric(values, kind):
+    if kind == 'yes_no':
+        return np.where(values == 1, "Yes", "No").astype(object)
+    if kind == 'percent':
+        values = values / 100
+    return np.array(list(map(_FORMATS[kind], values.tolist())), dtype=object)
+
+
+class HealthTable:
+    def __init__(self, processed_data):
+        self.names = processed_data['Name'].astype(str).to_numpy(dtype=object)
+        codes = processed_data['NSE Code'] if 'NSE Code' in processed_data.columns else pd.Series('', index=processed_data.index)
+        self.codes = codes.fillna('').astype(str).to_numpy(dtype=object)
+        self.metrics = [(label, column, kind) for label, column, kind in HEALTH_METRICS if column in processed_data.columns]
+        self.values = {label: metric_values(processed_data[column]) for label, column, _ in self.metrics}
+        # Selectbox labels; a search matches the name or the NSE code
+        self.labels = np.where(self.codes == '', self.names, self.names + " (" + self.codes + ")")
+        # First row of every key
+        self._by_label = _first_positions(self.labels)
+        self._by_name = _first_positions(self.names)
+        self._by_code = _first_positions(self.codes[self.codes != ''], np.flatnonzero(self.codes != ''))
+
+    def __len__(self):
+        return len(self.names)
+
+    # Function to get the unique selectbox labels, in snapshot order
+    def options(self):
+        return list(self._by_label)
+
+    # Function to get the row position of a company by label, Name or NSE Code, or None
+    def position(self, key):
+        for index in (self._by_label, self._by_name, self._by_code):
+            if key in index:
+                return index[key]
+        return None
+
+    # Function to get {label: formatted value} of one company, or None when it is not in the snapshot
+    def summary(self, key):
+        position = self.position(key)
+        if position is None:
+            return None
+        return {label: format_metric(self.values[label][[position]], kind)[0] for label, _, kind in self.metrics}
+
+    # Function to lay out up to MAX_COMPARE companies side by side: metrics as rows, one column per
+    # company headed by its "Name (NSE Code)" label. Keys that are not in the snapshot are skipped.
+    def compare(self, keys):
+        positions = [position for position in map(self.position, keys) if position is not None]
+        positions = np.array(positions[:MAX_COMPARE], dtype=np.intp)
+        values = np.empty((len(self.metrics), len(positions)), dtype=object)
+        for row, (label, _, kind) in enumerate(self.metrics):
+            values[row] = format_metric(self.values[label][positions], kind)
+        return pd.DataFrame(values, index=[label for label, _, _ in self.metrics], columns=self.labels[positions])
+
+
+def _first_positions(keys, positions=None):
+    positions = np.arange(len(keys)) if positions is None else positions
+    index = {}
+    for key, position in zip(keys.tolist(), positions.tolist()):
+        index.setdefault(key, position)
+    return index
@@ -0,0 +1,53 @@
+# Memory-lean reading of screener exports.
+# Only the columns the valuation and the health summary use are parsed, and they get the same
+# compact dtypes as the stored universes (finx.universe.compact_dtypes); the valuation inputs
+# stay float64 so results match a full-precision read. Exports too large to hold at once are
+# streamed in chunks through the valuation engine, and every valued chunk is appended to the
+# output as soon as it is ready.
+import pandas as pd
+
+from finx.instrumentation import span
+from finx.universe import UNIVERSE_COLUMNS, compact_dtypes
+from finx.valuation import DEFAULT_SCENARIO, calculate_valuations
+
+# Rows per chunk when streaming
+CHUNK_SIZE = 50_000
+
+def _read_options(columns):
+    if columns is None:
+        return {}
+    wanted = set(columns)
+    return {'usecols': lambda column: column in wanted}
+
+# Function to read the given columns of an export with compact dtypes.
+# Columns the export does not have are skipped; columns=None reads every column.
+def read_screener_csv(source, columns=UNIVERSE_COLUMNS):
+    with span('csv_parse') as parse:
+        data = pd.read_csv(source, **_read_options(columns))
+        parse.rows = len(data)
+        return compact_dtypes(data)
+
+# Function to iterate over an export in compact chunks of chunksize rows
+def iter_screener_csv(source, columns=UNIVERSE_COLUMNS, chunksize=CHUNK_SIZE):
+    with pd.read_csv(source, chunksize=chunksize, **_read_options(columns)) as reader:
+        for chunk in reader:
+            yield compact_dtypes(chunk)
+
+# Function to value an export chunk by chunk and append every valued chunk to `output`
+# (a path or a text file). The kernels are row-wise, so the result equals valuing the whole
+# export at once; rows keep the export's order. Returns the number of rows written.
+def stream_valuations(source, output, columns=UNIVERSE_COLUMNS, chunksize=CHUNK_SIZE, scenario=DEFAULT_SCENARIO):
+    rows = 0
+    handle = open(output, "w", newline="") if isinstance(output, str) else output
+    try:
+        for number, chunk in enumerate(iter_screener_csv(source, columns, chunksize)):
+            calculate_valuations(chunk, scenario, copy=False).to_csv(handle, header=number == 0, index=False)
+            rows += len(chunk)
+    finally:
+        if handle is not output:
+            handle.close()
+    return rows
+
+# Function to read and value an export in one go, without copying the parsed frame
+def load_processed_csv(source, columns=UNIVERSE_COLUMNS, scenario=DEFAULT_SCENARIO):
+    return calculate_valuations(read_screener_csv(source, columns), scenario, copy=False)
@@ -0,0 +1,214 @@
+# Timing spans around the expensive stages of a rerun: CSV parsing, the valuation methods,
+# screening, grid rendering, snapshot writes and the screener scrape.
+#   with span('csv_parse') as s:
+#       data = pd.read_csv(...)
+#       s.rows = len(data)
+# A span records its wall time, the rows it processed and the change in resident memory,
+# logs itself as one JSON line on the "finx.instrumentation" logger and adds to per-stage
+# totals that can be exported in the Prometheus text format. Spans opened after start_run on
+# the same thread are grouped into that run, so the app can show a breakdown per rerun, and
+# start_run can switch recording on or off for that thread's run only, e.g. per browser session.
+# Disabled (the default), span() returns a shared no-op context manager and records nothing.
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger("finx.instrumentation")
+
+# Runs kept for the breakdown
+RUN_HISTORY = 20
+
+_STATM_PATH = "/proc/self/statm"
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# Function to get the resident memory of this process in bytes, or None where it cannot be read
+def resident_memory():
+    try:
+        with open(_STATM_PATH) as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        if psutil is not None:
+            return psutil.Process().memory_info().rss
+        return None
+
+
+class _NullSpan:
+    # Returned while instrumentation is disabled; it is shared, so setting rows or any other
+    # attribute on it is ignored
+    rows = None
+
+    def __setattr__(self, name, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    __slots__ = ('instrumentation', 'stage', 'rows', 'parent', '_start', '_memory')
+
+    def __init__(self, instrumentation, stage, rows=None):
+        self.instrumentation = instrumentation
+        self.stage = stage
+        self.rows = rows
+        self.parent = None
+
+    def __enter__(self):
+        stack = self.instrumentation._stack()
+        self.parent = stack[-1].stage if stack else None
+        stack.append(self)
+        self._memory = resident_memory()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._start
+        memory = resident_memory()
+        self.instrumentation._stack().pop()
+        memory_delta = memory - self._memory if memory is not None and self._memory is not None else None
+        self.instrumentation._record(self, seconds, memory_delta, failed=exc_type is not None)
+        return False
+
+
+class Instrumentation:
+    def __init__(self, enabled=False, history=RUN_HISTORY):
+        self.enabled = enabled
+        self.runs = deque(maxlen=history)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._totals = {}
+        self._run_ids = 0
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    # Function to tell whether spans on this thread are recorded: the setting of the current run
+    # when start_run was given one, the process-wide `enabled` otherwise
+    def active(self):
+        enabled = getattr(self._local, 'enabled', None)
+        return self.enabled if enabled is None else enabled
+
+    def span(self, stage, rows=None):
+        if not self.active():
+            return NULL_SPAN
+        return Span(self, stage, rows)
+
+    # Start grouping this thread's spans into a new run; `enabled` overrides the process-wide
+    # setting until the next start_run on this thread. Returns the run, or None while disabled.
+    def start_run(self, label=None, enabled=None):
+        self._local.run = None
+        self._local.enabled = enabled
+        if not self.active():
+            return None
+        with self._lock:
+            self._run_ids += 1
+            run = {'id': self._run_ids, 'label': label, 'started': datetime.now().isoformat(timespec='seconds'), 'spans': []}
+            self.runs.append(run)
+        self._local.run = run
+        return run
+
+    def _record(self, span, seconds, memory_delta, failed=False):
+        run = getattr(self._local, 'run', None)
+        record = {
+            'run': run['id'] if run is not None else None,
+            'stage': span.stage,
+            'parent': span.parent,
+            'seconds': seconds,
+            'rows': span.rows,
+            'memory_delta': memory_delta,
+            'failed': failed,
+        }
+        with self._lock:
+            totals = self._totals.setdefault(span.stage, {'calls': 0, 'seconds': 0.0, 'rows': 0, 'memory_delta': 0})
+            totals['calls'] += 1
+            totals['seconds'] += seconds
+            totals['rows'] += span.rows or 0
+            totals['memory_delta'] = memory_delta or 0
+            if run is not None:
+                run['spans'].append(record)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(record))
+
+    # Function to get the spans of the given runs (default: the kept history) as one row per span
+    def span_frame(self, runs=None):
+        runs = list(self.runs) if runs is None else runs
+        columns = ['run', 'stage', 'parent', 'seconds', 'rows', 'memory_delta', 'failed']
+        spans = pd.DataFrame([record for run in runs for record in run['spans']], columns=columns)
+        for column in ('seconds', 'rows', 'memory_delta'):
+            spans[column] = pd.to_numeric(spans[column], errors='coerce').astype('float64')
+        return spans
+
+    # Function to get the seconds spent in every stage per run, runs as rows and stages as columns
+    def breakdown(self, runs=None):
+        spans = self.span_frame(runs)
+        return spans.pivot_table(index='run', columns='stage', values='seconds', aggfunc='sum', sort=False)
+
+    # Function to get the totals since start: calls, seconds, rows and the memory delta of the last call per stage
+    def totals(self):
+        with self._lock:
+            return pd.DataFrame.from_dict({stage: dict(values) for stage, values in self._totals.items()}, orient='index')
+
+    # Function to export the totals in the Prometheus text exposition format
+    def prometheus_text(self):
+        with self._lock:
+            totals = {stage: dict(values) for stage, values in self._totals.items()}
+        metrics = [
+            ('finx_stage_calls_total', 'counter', "Completed spans per stage.", 'calls'),
+            ('finx_stage_seconds_total', 'counter', "Wall time spent in each stage.", 'seconds'),
+            ('finx_stage_rows_total', 'counter', "Rows processed by each stage.", 'rows'),
+            ('finx_stage_memory_delta_bytes', 'gauge', "Resident memory change of the last span of each stage.", 'memory_delta'),
+        ]
+        lines = []
+        for name, kind, help_text, field in metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for stage, values in totals.items():
+                lines.append(f'{name}{{stage="{_label_value(stage)}"}} {values[field]}')
+        return "\n".join(lines) + "\n"
+
+    # Function to write the Prometheus export for a node_exporter textfile collector, replacing the file atomically
+    def write_prometheus(self, path):
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as f:
+            f.write(self.prometheus_text())
+        os.replace(temp_path, path)
+
+def _label_value(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+# Function to append the JSON span records to a file, one per line
+def log_to_file(path):
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return handler
+
+# Process-wide instrumentation used by span(); enable it with INSTRUMENTATION.enabled = True
+INSTRUMENTATION = Instrumentation()
+
+# Function to open a span on the process-wide instrumentation
+def span(stage, rows=None):
+    if not INSTRUMENTATION.active():
+        return NULL_SPAN
+    return Span(INSTRUMENTATION, stage, rows)
@@ -0,0 +1,126 @@
+# Live prices for the portfolio analysis.
+# Ticks from a KiteTicker websocket (or a TickReplay of recorded ticks) land in a TickBuffer,
+# which only keeps the latest price per instrument. The UI drains the buffer at its own pace
+# and LivePortfolio applies the drained prices to the rows of the instruments that ticked,
+# so a burst of ticks costs one small update instead of a rerun of process_portfolio_data.
+import threading
+import time
+
+import numpy as np
+from kiteconnect import KiteTicker
+
+from finx.portfolio import calculate_hold_sell
+from finx.valuation import safe_divide
+
+# Columns LivePortfolio keeps current
+LIVE_COLUMNS = ['LTP', 'P&L/%', 'Max Value', 'Gain%', 'HOLD/SELL']
+
+
+class TickBuffer:
+    # Coalesces ticks: only the latest price of every instrument is kept until the next drain
+    def __init__(self):
+        self._latest = {}
+        self._lock = threading.Lock()
+        self.received = 0
+
+    # Ticks are dicts with the instrument key under `key` and the price under 'last_price'
+    def push(self, ticks, key='instrument_token'):
+        with self._lock:
+            for tick in ticks:
+                self._latest[tick[key]] = tick['last_price']
+                self.received += 1
+
+    def drain(self):
+        with self._lock:
+            latest, self._latest = self._latest, {}
+        return latest
+
+
+class KiteTickStream:
+    # Runs a KiteTicker in its own thread and feeds LTP-mode ticks into a TickBuffer.
+    # root points the websocket at another server, e.g. a local stand-in.
+    def __init__(self, api_key, access_token, root=None):
+        self.buffer = TickBuffer()
+        self.tokens = set()
+        self._lock = threading.Lock()
+        options = {'root': root} if root else {}
+        self.ticker = KiteTicker(api_key, access_token, **options)
+        self.ticker.on_ticks = lambda ws, ticks: self.buffer.push(ticks)
+        self.ticker.on_connect = self._on_connect
+        self.ticker.connect(threaded=True)
+
+    def _subscribe(self, ws, tokens):
+        ws.subscribe(tokens)
+        ws.set_mode(ws.MODE_LTP, tokens)
+
+    def _on_connect(self, ws, response):
+        # Also resubscribes everything after a reconnect
+        with self._lock:
+            tokens = list(self.tokens)
+        if tokens:
+            self._subscribe(ws, tokens)
+
+    def subscribe(self, tokens):
+        with self._lock:
+            new_tokens = [int(token) for token in tokens if int(token) not in self.tokens]
+            self.tokens.update(new_tokens)
+        if new_tokens and self.ticker.is_connected():
+            self._subscribe(self.ticker, new_tokens)
+
+    def close(self):
+        self.ticker.close()
+
+
+class TickReplay(threading.Thread):
+    # Replays recorded ticks into a TickBuffer. `ticks` is a DataFrame with a 'time' column in
+    # seconds, 'last_price' and the instrument key column; speed > 1 replays faster.
+    def __init__(self, ticks, buffer, key='instrument_token', speed=1.0, sleep=time.sleep):
+        super().__init__(daemon=True)
+        self.ticks = ticks.sort_values('time', kind='stable')
+        self.buffer = buffer
+        self.key = key
+        self.speed = speed
+        self.sleep = sleep
+
+    def run(self):
+        previous_time = None
+        for tick_time, group in self.ticks.groupby('time', sort=False):
+            if previous_time is not None:
+                self.sleep((tick_time - previous_time) / self.speed)
+            self.buffer.push(group[[self.key, 'last_price']].to_dict('records'), key=self.key)
+            previous_time = tick_time
+
+
+class LivePortfolio:
+    # Keeps LIVE_COLUMNS of a processed portfolio current. `tokens` maps Instrument to the key
+    # the ticks carry (instrument token for KiteTicker); without it ticks are keyed by Instrument.
+    # Final expected price stays the snapshot's valuation; Gain% is measured from the live price.
+    def __init__(self, processed_portfolio, tokens=None):
+        self.frame = processed_portfolio.reset_index(drop=True).copy()
+        keys = self.frame['Instrument'].map(tokens) if tokens is not None else self.frame['Instrument']
+        self._rows = {key: rows for key, rows in keys.groupby(keys).indices.items()}
+        self._columns = [self.frame.columns.get_loc(column) for column in LIVE_COLUMNS]
+        self.updates = 0
+
+    # Apply {key: last price}; returns the number of rows that changed
+    def apply(self, prices):
+        rows, values = [], []
+        for key, price in prices.items():
+            key_rows = self._rows.get(key)
+            if key_rows is not None:
+                rows.append(key_rows)
+                values.append(np.full(len(key_rows), price, dtype='float64'))
+        if not rows:
+            return 0
+        rows = np.concatenate(rows)
+        ticked = self.frame.iloc[rows][['Qty.', 'Avg. cost', 'Final expected price']].copy()
+        ticked['LTP'] = np.concatenate(values)
+        ticked = calculate_hold_sell(ticked)
+        final_expected_price = ticked['Final expected price'].to_numpy(dtype='float64')
+        ltp = ticked['LTP'].to_numpy(dtype='float64')
+        ticked['Gain%'] = safe_divide(final_expected_price - ltp, ltp) * 100
+
+        for column, position in zip(LIVE_COLUMNS, self._columns):
+            self.frame.iloc[rows, position] = ticked[column].to_numpy()
+        self.updates += 1
+        return len(rows)
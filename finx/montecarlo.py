@@ -0,0 +1,123 @@
+# Monte Carlo valuation bands.
+# Growth rates and valuation multiples are sampled around each company's point inputs and
+# pushed through the same kernels as calculate_valuations. Stocks are simulated in chunks
+# so only a (chunk x simulations) block is ever in memory, and every chunk draws from its
+# own child of one SeedSequence, so results do not depend on chunking order or worker count.
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from finx.valuation import (
+    DEFAULT_SCENARIO, blended_values, calculate_enterprise_value, column_values, ev_ebitda_values,
+    pb_inputs, pb_values, pe_inputs, pe_values, revenue_values, safe_divide,
+)
+
+MONTE_CARLO_COLUMNS = ['P5 price', 'P50 price', 'P95 price', 'Probability of upside']
+
+# Sampling assumptions. Growth rates get normal noise in percentage points around the
+# reported value; multiples are scaled by a lognormal factor with median 1.
+@dataclass(frozen=True)
+class MonteCarloConfig:
+    simulations: int = 10_000
+    profit_growth_sd: float = 10.0
+    sales_growth_sd: float = 10.0
+    operating_profit_growth_sd: float = 10.0
+    multiple_sigma: float = 0.15
+    seed: int = 0
+    stocks_per_chunk: int = 50
+    scenario: object = DEFAULT_SCENARIO
+
+# Function to pull the per-stock inputs once, as plain arrays that are cheap to send to workers
+def simulation_inputs(df):
+    shares = column_values(df, 'Number of equity shares')
+    current_price = column_values(df, 'Current Price')
+    debt = column_values(df, 'Debt')
+    ebitda = column_values(df, 'Operating profit')
+    enterprise_value = calculate_enterprise_value(df)
+    return {
+        'shares': shares,
+        'current_price': current_price,
+        'debt': debt,
+        'ebitda': ebitda,
+        'ev_ebitda': safe_divide(enterprise_value, ebitda),
+        'operating_profit_growth': column_values(df, 'Operating profit growth'),
+        'sales': column_values(df, 'Sales'),
+        'sales_growth': column_values(df, 'Sales growth'),
+        'pe_inputs': pe_inputs(df),
+        'pb_inputs': pb_inputs(df),
+    }
+
+def _slice_inputs(inputs, start, stop):
+    sliced = {}
+    for name, values in inputs.items():
+        if isinstance(values, tuple):
+            sliced[name] = tuple(array[start:stop, np.newaxis] for array in values)
+        else:
+            sliced[name] = values[start:stop, np.newaxis]
+    return sliced
+
+# Function to simulate one chunk of stocks; returns a (chunk, 4) array of MONTE_CARLO_COLUMNS
+def simulate_chunk(chunk, config, seed_sequence):
+    rng = np.random.default_rng(seed_sequence)
+    size = (chunk['shares'].shape[0], config.simulations)
+    scenario = config.scenario
+
+    def multiple_shock():
+        return np.exp(config.multiple_sigma * rng.standard_normal(size))
+
+    operating_growth = (chunk['operating_profit_growth'] + config.operating_profit_growth_sd * rng.standard_normal(size)) / 100
+    ev_ebitda_value = ev_ebitda_values(
+        chunk['ebitda'], chunk['ev_ebitda'] * multiple_shock(), chunk['debt'], chunk['shares'],
+        operating_growth, scenario.ev_ebitda_growth_multipliers,
+    )
+    del operating_growth
+
+    # Scaling the price inside the revenue multiple scales the multiple itself
+    sales_growth = (chunk['sales_growth'] + config.sales_growth_sd * rng.standard_normal(size)) / 100
+    revenue_value = revenue_values(
+        chunk['shares'], chunk['current_price'] * multiple_shock(), chunk['sales'],
+        sales_growth, scenario.revenue_growth_haircut,
+    )
+    del sales_growth
+
+    ttm_pat, pat_growth, price_to_earning, industry_pe, num_equity_shares = chunk['pe_inputs']
+    pe_shock = multiple_shock()
+    pe_value = pe_values(
+        ttm_pat, pat_growth + config.profit_growth_sd * rng.standard_normal(size) / 100,
+        price_to_earning * pe_shock, industry_pe * pe_shock, num_equity_shares,
+        scenario.pe_growth_haircut, scenario.pe_weights,
+    )
+    del pe_shock
+
+    # Book value growth is not sampled, so the PB method stays a point estimate
+    pb_value = pb_values(*chunk['pb_inputs'], scenario.pb_growth_haircut, scenario.pb_weights)
+    final_expected_price, _ = blended_values(
+        pe_value, ev_ebitda_value, revenue_value, pb_value, chunk['current_price'], scenario.blend_weights,
+    )
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        bands = np.nanpercentile(final_expected_price, [5, 50, 95], axis=1).T
+        valid = ~np.isnan(final_expected_price)
+        upside = np.sum(final_expected_price > chunk['current_price'], axis=1) / np.sum(valid, axis=1)
+    return np.column_stack([bands, upside])
+
+# Run the simulation for every stock of a raw all stocks frame.
+# workers > 1 fans the chunks out over a process pool; the output is identical either way.
+def run_monte_carlo(df, config=MonteCarloConfig(), workers=None):
+    inputs = simulation_inputs(df)
+    starts = list(range(0, len(df), config.stocks_per_chunk))
+    seeds = np.random.SeedSequence(config.seed).spawn(len(starts))
+    chunks = [_slice_inputs(inputs, start, start + config.stocks_per_chunk) for start in starts]
+
+    if workers and workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(simulate_chunk, chunks, [config] * len(chunks), seeds))
+    else:
+        results = [simulate_chunk(chunk, config, seed) for chunk, seed in zip(chunks, seeds)]
+
+    values = np.vstack(results) if results else np.empty((0, len(MONTE_CARLO_COLUMNS)))
+    return pd.DataFrame(values, index=df.index, columns=MONTE_CARLO_COLUMNS)
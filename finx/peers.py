@@ -0,0 +1,134 @@
+# Peer-group multiples derived from the all stocks universe itself.
+# build_peer_index computes the median and trimmed mean of PE, PBV, EV/EBITDA and EV/Sales for
+# every Industry and every market-cap bucket in one sort per multiple. peer_multiples then
+# looks the multiples of each company up by position: its industry when the industry has
+# enough peers with a usable multiple, its market-cap bucket otherwise.
+import numpy as np
+import pandas as pd
+
+from finx.valuation import calculate_enterprise_value, column_values, safe_divide
+
+PEER_MULTIPLES = ['PE', 'PBV', 'EV/EBITDA', 'EV/Sales']
+
+PEER_STATISTICS = ['count', 'median', 'trimmed mean']
+
+# Market-cap buckets in crore: lower bounds and names
+MARKET_CAP_BUCKETS = [0, 500, 5000, 20000]
+MARKET_CAP_BUCKET_NAMES = ['Micro cap', 'Small cap', 'Mid cap', 'Large cap']
+
+# Industries with fewer usable multiples than this fall back to the market-cap bucket
+MIN_PEERS = 5
+
+# Share of peers cut from each end for the trimmed mean
+TRIM_FRACTION = 0.1
+
+# How the valuation uses peer multiples for Industry PE / Industry PBV:
+# fill replaces only the scraped values the valuation would clamp to 1 (missing or below 1),
+# replace uses the peers throughout
+PEER_MODES = ['fill', 'replace']
+
+# Function to get every company's multiples; loss-makers and other non-positive multiples are NaN
+def company_multiples(data):
+    enterprise_value = calculate_enterprise_value(data)
+    multiples = {
+        'PE': column_values(data, 'Price to Earning'),
+        'PBV': column_values(data, 'Price to book value'),
+        'EV/EBITDA': safe_divide(enterprise_value, column_values(data, 'Operating profit')),
+        'EV/Sales': safe_divide(enterprise_value, column_values(data, 'Sales')),
+    }
+    return {name: np.where(values > 0, values, np.nan) for name, values in multiples.items()}
+
+# Function to get each company's market-cap bucket position, -1 when the market cap is missing or negative
+def market_cap_buckets(data):
+    market_cap = column_values(data, 'Market Capitalization')
+    buckets = np.searchsorted(MARKET_CAP_BUCKETS, market_cap, side='right') - 1
+    return np.where(np.isnan(market_cap), -1, buckets)
+
+# Function to get count, median and trimmed mean of `values` per group code (0..groups-1, -1 ignored)
+def group_statistics(codes, groups, values):
+    usable = (codes >= 0) & ~np.isnan(values)
+    codes, values = codes[usable], values[usable]
+    order = np.lexsort((values, codes))
+    codes, values = codes[order], values[order]
+    count = np.bincount(codes, minlength=groups)
+    start = np.concatenate(([0], np.cumsum(count)[:-1]))
+    last = np.maximum(count - 1, 0)
+    has_values = count > 0
+    median = np.full(groups, np.nan)
+    median[has_values] = (values[(start + last // 2)[has_values]] + values[(start + (last + 1) // 2)[has_values]]) / 2
+    # Trimmed mean from the running sum of the sorted values
+    trim = np.floor(count * TRIM_FRACTION).astype(np.int64)
+    running = np.concatenate(([0.0], np.cumsum(values)))
+    kept = count - 2 * trim
+    with np.errstate(divide='ignore', invalid='ignore'):
+        trimmed_mean = (running[start + count - trim] - running[start + trim]) / kept
+    return count, median, np.where(kept > 0, trimmed_mean, np.nan)
+
+def _peer_table(codes, groups, multiples, index):
+    columns = {}
+    for name, values in multiples.items():
+        count, median, trimmed_mean = group_statistics(codes, groups, values)
+        columns[(name, 'count')] = count
+        columns[(name, 'median')] = median
+        columns[(name, 'trimmed mean')] = trimmed_mean
+    return pd.DataFrame(columns, index=index)
+
+# Function to build the peer index of a raw or processed all stocks DataFrame.
+# Returns a dict of DataFrames indexed by Industry and by market-cap bucket, with
+# (multiple, statistic) columns for every multiple in PEER_MULTIPLES.
+def build_peer_index(data):
+    multiples = company_multiples(data)
+    industry_codes, industries = pd.factorize(data['Industry'], sort=True)
+    return {
+        'industry': _peer_table(industry_codes, len(industries), multiples, pd.Index(industries, name='Industry')),
+        'bucket': _peer_table(market_cap_buckets(data), len(MARKET_CAP_BUCKETS), multiples,
+                              pd.Index(MARKET_CAP_BUCKET_NAMES, name='Market cap')),
+    }
+
+def _lookup(table, positions, column):
+    # Position -1 (no group) reads the NaN / zero appended at the end
+    values = table[column].to_numpy()
+    return np.append(values, 0 if column[1] == 'count' else np.nan)[positions]
+
+# Function to look up each company's peer multiples by position, without any groupby.
+# Returns 'Peer PE', 'Peer PBV', 'Peer EV/EBITDA' and 'Peer EV/Sales' plus 'Peer group',
+# the industry or market-cap bucket each PE came from.
+def peer_multiples(data, peer_index, statistic='median'):
+    industry = peer_index['industry']
+    bucket = peer_index['bucket']
+    industry_positions = industry.index.get_indexer(data['Industry'])
+    bucket_positions = market_cap_buckets(data)
+    result = {}
+    group_names = None
+    for name in PEER_MULTIPLES:
+        use_industry = _lookup(industry, industry_positions, (name, 'count')) >= MIN_PEERS
+        result[f'Peer {name}'] = np.where(
+            use_industry,
+            _lookup(industry, industry_positions, (name, statistic)),
+            _lookup(bucket, bucket_positions, (name, statistic)),
+        )
+        if name == 'PE':
+            bucket_names = np.append(bucket.index.to_numpy(dtype=object), None)[bucket_positions]
+            group_names = np.where(use_industry, data['Industry'].to_numpy(dtype=object), bucket_names)
+    result['Peer group'] = group_names
+    return pd.DataFrame(result, index=data.index)
+
+# Function to set Industry PE and Industry PBV from the peer index before valuation.
+# mode 'fill' only replaces missing scraped values and those below 1, which the valuation would
+# otherwise clamp to 1; 'replace' uses the peers
+# for every company that has them. The peer columns are added for display.
+def with_peer_multiples(data, peer_index, mode='fill', statistic='median'):
+    if mode not in PEER_MODES:
+        raise ValueError(f"Unknown peer multiple mode: {mode}")
+    peers = peer_multiples(data, peer_index, statistic)
+    data = data.copy()
+    for scraped, peer in (('Industry PE', 'Peer PE'), ('Industry PBV', 'Peer PBV')):
+        scraped_values = column_values(data, scraped)
+        peer_values = peers[peer].to_numpy()
+        replace = ~np.isnan(peer_values)
+        if mode == 'fill':
+            replace &= ~(scraped_values >= 1)
+        data[scraped] = np.where(replace, peer_values, scraped_values)
+    for column in peers.columns:
+        data[column] = peers[column]
+    return data
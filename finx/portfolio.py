@@ -0,0 +1,135 @@
+# Holdings analysis against a screener snapshot.
+import functools
+import io
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from finx.valuation import VALUATION_INPUT_COLUMNS, VALUATION_OUTPUT_COLUMNS, calculate_valuations
+
+# Columns shown in the "Processed Portfolio Data" table
+PORTFOLIO_COLUMNS = ['Instrument', 'Qty.', 'Avg. cost', 'LTP', 'P&L/%', 'Max Value', 'Final expected price', 'HOLD/SELL', 'Value as per EV/EBITDA Method', 'Value as per Revenue Method', 'Value as per PE Multiple', 'Value as per PB Multiple', 'PB_elements_is_1']
+
+# Column naming the source portfolio in a consolidated frame
+PORTFOLIO_KEY = 'Portfolio'
+
+# Function to index a processed snapshot by NSE Code, built once per snapshot.
+# Companies without an NSE Code cannot be held through the broker and are left out;
+# for a duplicated code the first row wins.
+def build_valuation_index(processed_data):
+    valuation_index = processed_data.dropna(subset=['NSE Code'])
+    valuation_index = valuation_index.drop_duplicates(subset='NSE Code', keep='first')
+    return valuation_index.set_index('NSE Code', drop=False)
+
+# Valuations of a holding the snapshot does not list, i.e. the NaN defaults of every method
+@functools.lru_cache(maxsize=1)
+def missing_holding_valuations():
+    empty_row = pd.DataFrame({column: [np.nan] for column in VALUATION_INPUT_COLUMNS})
+    return calculate_valuations(empty_row)[VALUATION_OUTPUT_COLUMNS].iloc[0].to_dict()
+
+# Function to add P&L/%, Max Value and HOLD/SELL to holdings that already carry Final expected price
+def calculate_hold_sell(merged_df):
+    merged_df['P&L/%'] = ((merged_df['LTP'] * merged_df['Qty.']) -
+                          (merged_df['Avg. cost'] * merged_df['Qty.'])) / \
+                         (merged_df['Avg. cost'] * merged_df['Qty.']) * 100
+    merged_df['Max Value'] = merged_df[['Avg. cost', 'LTP']].max(axis=1)
+    final_expected_price = merged_df['Final expected price']
+    merged_df['HOLD/SELL'] = np.where(
+        final_expected_price > merged_df['Max Value'],
+        "Hold and Sell at " + final_expected_price.astype(str),
+        'SELL'
+    )
+    return merged_df
+
+# Function to look up every holding in the valuation index and decide HOLD/SELL
+def process_portfolio_data(portfolio_df, valuation_index):
+    merged_df = portfolio_df.join(valuation_index, on="Instrument", lsuffix="_portfolio", rsuffix="_stocks")
+    merged_df = merged_df.reset_index(drop=True)
+    unmatched = ~merged_df['Instrument'].isin(valuation_index.index)
+    if unmatched.any():
+        # The join already left them NaN, so only the non-NaN defaults need filling in
+        for column, value in missing_holding_valuations().items():
+            if pd.notnull(value):
+                merged_df[column] = merged_df[column].mask(unmatched, value)
+    return calculate_hold_sell(merged_df)
+
+def _read_portfolio(file_data):
+    return pd.read_csv(io.BytesIO(file_data))
+
+# Function to parse (name, raw CSV bytes) portfolios and stack them with a Portfolio column.
+# workers > 1 parses the files in a process pool.
+def consolidate_portfolios(files, workers=None):
+    files = list(files)
+    if workers and workers > 1 and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            frames = list(executor.map(_read_portfolio, [file_data for _, file_data in files]))
+    else:
+        frames = [_read_portfolio(file_data) for _, file_data in files]
+    return stack_portfolios([name for name, _ in files], frames)
+
+# Function to stack parsed portfolio frames with a Portfolio column holding their names
+def stack_portfolios(names, frames):
+    if not frames:
+        return pd.DataFrame(columns=[PORTFOLIO_KEY])
+    consolidated = pd.concat(frames, ignore_index=True)
+    consolidated.insert(0, PORTFOLIO_KEY, np.repeat(names, [len(frame) for frame in frames]))
+    return consolidated
+
+def _with_values(processed):
+    invested = processed['Avg. cost'] * processed['Qty.']
+    current_value = processed['LTP'] * processed['Qty.']
+    return processed.assign(**{
+        'Invested': invested,
+        'Current value': current_value,
+        'Hold': processed['HOLD/SELL'] != 'SELL',
+        'Value to sell': current_value.where(processed['HOLD/SELL'] == 'SELL', 0),
+    })
+
+def _add_pnl(summary):
+    summary['P&L'] = summary['Current value'] - summary['Invested']
+    summary['P&L/%'] = summary['P&L'] / summary['Invested'] * 100
+    return summary
+
+# Function to summarise a consolidated frame from process_portfolio_data. Returns a dict of DataFrames:
+#   portfolios: holdings, invested, current value, P&L and HOLD/SELL counts per portfolio plus a Household row
+#   holdings: every instrument across portfolios, with its weight in the household and a HOLD/SELL on the combined position
+#   industry: household exposure per Industry
+def summarise_portfolios(processed):
+    frame = _with_values(processed)
+    portfolios = frame.groupby(PORTFOLIO_KEY, sort=False).agg(**{
+        'Holdings': ('Instrument', 'size'),
+        'Invested': ('Invested', 'sum'),
+        'Current value': ('Current value', 'sum'),
+        'Hold': ('Hold', 'sum'),
+        'Value to sell': ('Value to sell', 'sum'),
+    })
+    household = portfolios.sum().to_frame('Household').T.astype(portfolios.dtypes)
+    portfolios = pd.concat([portfolios, household]).rename_axis(PORTFOLIO_KEY)
+    portfolios['Sell'] = portfolios['Holdings'] - portfolios['Hold']
+    portfolios = _add_pnl(portfolios)
+    household_value = portfolios.loc['Household', 'Current value']
+
+    holdings = frame.groupby('Instrument', sort=False).agg(**{
+        'Portfolios': (PORTFOLIO_KEY, 'nunique'),
+        'Industry': ('Industry', 'first'),
+        'Qty.': ('Qty.', 'sum'),
+        'Invested': ('Invested', 'sum'),
+        'Current value': ('Current value', 'sum'),
+        'Final expected price': ('Final expected price', 'first'),
+    }).reset_index()
+    # The combined position is valued at its quantity-weighted cost and price
+    holdings['Avg. cost'] = holdings['Invested'] / holdings['Qty.']
+    holdings['LTP'] = holdings['Current value'] / holdings['Qty.']
+    holdings = calculate_hold_sell(holdings)
+    holdings['Weight%'] = holdings['Current value'] / household_value * 100
+    holdings = holdings.sort_values(by='Current value', ascending=False, ignore_index=True)
+
+    industry = frame.groupby('Industry', dropna=False, observed=True).agg(**{
+        'Holdings': ('Instrument', 'nunique'),
+        'Current value': ('Current value', 'sum'),
+    })
+    industry['Weight%'] = industry['Current value'] / household_value * 100
+    industry = industry.sort_values(by='Current value', ascending=False)
+
+    return {'portfolios': portfolios, 'holdings': holdings, 'industry': industry}
@@ -0,0 +1,42 @@
+# Stored portfolio files in the SQLite database.
+# portfolio_files lists each saved portfolio (name, upload time) and points at its CSV in
+# portfolio_storage, so listing portfolios never reads a blob. Deleting the blob deletes the
+# listing with it (ON DELETE CASCADE).
+from datetime import datetime
+
+from finx.db import connect, insert_blob, open_blob
+
+# Function to save a portfolio CSV under a name; returns its id
+def save_portfolio_file(db_path, name, file_data, upload_time=None):
+    upload_time = upload_time or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    with connect(db_path) as conn:
+        storage_id = insert_blob(conn, "portfolio_storage", "file_data", file_data)
+        return conn.execute("INSERT INTO portfolio_files (name, upload_time, storage_id) VALUES (?, ?, ?)",
+                            (name, upload_time, storage_id)).lastrowid
+
+# Function to list the stored portfolios as (id, name, upload_time), oldest first
+def list_portfolio_files(db_path):
+    with connect(db_path) as conn:
+        return conn.execute("SELECT id, name, upload_time FROM portfolio_files ORDER BY id").fetchall()
+
+# Function to open a stored portfolio CSV as a binary file streamed from the database, or None
+def open_portfolio_file(db_path, file_id):
+    with connect(db_path) as conn:
+        row = conn.execute("SELECT storage_id FROM portfolio_files WHERE id = ?", (file_id,)).fetchone()
+        return open_blob(conn, "portfolio_storage", "file_data", row[0]) if row else None
+
+# Function to get {id: (label, CSV bytes)} of the given portfolios in one query; the label is "name (upload_time)"
+def get_portfolio_files_data(db_path, file_ids):
+    file_ids = list(file_ids)
+    if not file_ids:
+        return {}
+    with connect(db_path) as conn:
+        rows = conn.execute(f"""SELECT m.id, m.name, m.upload_time, s.file_data FROM portfolio_files m
+                                JOIN portfolio_storage s ON s.id = m.storage_id
+                                WHERE m.id IN ({', '.join('?' * len(file_ids))})""", file_ids).fetchall()
+    return {file_id: (f"{name} ({upload_time})", file_data) for file_id, name, upload_time, file_data in rows}
+
+def delete_portfolio_file(db_path, file_id):
+    with connect(db_path) as conn:
+        conn.execute("DELETE FROM portfolio_storage WHERE id = (SELECT storage_id FROM portfolio_files WHERE id = ?)",
+                     (file_id,))
@@ -0,0 +1,97 @@
+# Multi-factor ranking of a processed snapshot.
+# Every factor is scored against the company's own industry: a percentile and a z-score from
+# one grouped pass over all factor columns. The per-industry aggregates and scores are computed
+# once per snapshot; a weighted composite and its top-K are then a matrix-vector product and a
+# partial selection, so changing weights does not recompute anything per industry.
+import numpy as np
+import pandas as pd
+
+from finx.valuation import column_values
+
+# Factors and their direction: 1 when higher is better, -1 when lower is better
+RANKING_FACTORS = {
+    'Gain%': 1,
+    'Return on equity': 1,
+    'Return on capital employed': 1,
+    'Return on invested capital': 1,
+    'OPM': 1,
+    'Promoter holding': 1,
+    'Change in promoter holding': 1,
+    'Change in FII holding': 1,
+    'Change in DII holding': 1,
+    'Cash Conversion Cycle': -1,
+    'Price to book value': -1,
+    'QoQ Sales': 1,
+    'QoQ Profits': 1,
+    'YOY Quarterly sales growth': 1,
+    'YOY Quarterly profit growth': 1,
+}
+
+# Default weight of every factor in the composite score
+DEFAULT_WEIGHTS = {factor: 1.0 for factor in RANKING_FACTORS}
+
+# Industries with fewer companies than this get no z-scores
+MIN_INDUSTRY_SIZE = 3
+
+# Function to score every company against its industry on each factor present in the data.
+# Returns a dict of DataFrames, factors as columns:
+#   percentile: industry percentile rank in (0, 1], 1 the best, ties averaged
+#   zscore: distance from the industry mean in industry standard deviations, positive the better side
+#   industry: count, mean and std of every factor per industry
+# Companies without an Industry, or without a value for a factor, get NaN for it.
+def factor_scores(processed_data, factors=RANKING_FACTORS):
+    factors = {factor: direction for factor, direction in factors.items() if factor in processed_data.columns}
+    signed = pd.DataFrame(
+        {factor: column_values(processed_data, factor) * direction for factor, direction in factors.items()},
+        index=processed_data.index,
+    )
+    grouped = signed.groupby(processed_data['Industry'], sort=True, observed=True)
+    count, mean, std = grouped.transform('count'), grouped.transform('mean'), grouped.transform('std')
+    zscore = (signed - mean) / std.where(count >= MIN_INDUSTRY_SIZE)
+    industry = pd.concat({'count': grouped.count(), 'mean': grouped.mean(), 'std': grouped.std()}, axis=1)
+    # The industry table reports the factors as they are, not sign-flipped
+    for factor, direction in factors.items():
+        industry[('mean', factor)] *= direction
+    return {
+        'percentile': grouped.rank(pct=True),
+        'zscore': zscore.replace([np.inf, -np.inf], np.nan),
+        'industry': industry,
+    }
+
+# Function to combine the factor scores into one weighted score per company.
+# Factors missing for a company are left out and the remaining weights renormalised;
+# a company with none of the weighted factors gets NaN.
+def composite_score(scores, weights=DEFAULT_WEIGHTS, kind='percentile'):
+    factor_values = scores[kind]
+    weight_row = np.array([weights.get(factor, 0.0) for factor in factor_values.columns], dtype='float64')
+    values = factor_values.to_numpy(dtype='float64')
+    present = ~np.isnan(values)
+    weighted = np.where(present, values, 0.0) @ weight_row
+    total_weight = present @ np.abs(weight_row)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return pd.Series(np.where(total_weight > 0, weighted / total_weight, np.nan), index=factor_values.index,
+                         name='Composite score')
+
+# Function to get the positions of the k highest scores, best first; NaN never makes the cut
+def top_k(score, k):
+    values = np.asarray(score, dtype='float64')
+    candidates = np.flatnonzero(~np.isnan(values))
+    k = min(k, len(candidates))
+    if k == 0:
+        return candidates
+    if k < len(candidates):
+        candidates = candidates[np.argpartition(-values[candidates], k - 1)[:k]]
+    return candidates[np.argsort(-values[candidates], kind='stable')]
+
+# Function to rank the top k companies by composite score, optionally only among `mask`.
+# Returns Name, NSE Code, Industry, the composite score and the factor scores of the composite.
+def rank_companies(processed_data, scores, weights=DEFAULT_WEIGHTS, k=50, kind='percentile', mask=None):
+    score = composite_score(scores, weights, kind).to_numpy()
+    if mask is not None:
+        score = np.where(np.asarray(mask, dtype=bool), score, np.nan)
+    positions = top_k(score, k)
+    weighted = [factor for factor in scores[kind].columns if weights.get(factor, 0.0)]
+    ranked = processed_data[['Name', 'NSE Code', 'Industry']].iloc[positions].reset_index(drop=True)
+    ranked.insert(0, 'Rank', np.arange(1, len(positions) + 1))
+    ranked['Composite score'] = score[positions]
+    return pd.concat([ranked, scores[kind][weighted].iloc[positions].reset_index(drop=True)], axis=1)
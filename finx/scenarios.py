@@ -0,0 +1,88 @@
+# Scenario matrix: evaluate many ValuationScenario settings across the whole universe at once.
+# Stock inputs are laid out as (N, 1) columns and scenario parameters as (1, M) rows, so the
+# valuation kernels broadcast to an N stocks x M scenarios result in a single pass.
+import dataclasses
+
+import numpy as np
+import pandas as pd
+
+from finx.valuation import (
+    DEFAULT_SCENARIO, blended_values, calculate_enterprise_value, column_values, ev_ebitda_values,
+    pb_inputs, pb_values, pe_inputs, pe_values, revenue_values, safe_divide,
+)
+
+# Scalar assumptions that can be swept
+SWEEP_FIELDS = ['revenue_growth_haircut', 'pe_growth_haircut', 'pb_growth_haircut']
+
+# Function to build scenarios that differ from `base` only in one scalar field, e.g. a haircut sweep
+def sweep(field, values, base=DEFAULT_SCENARIO):
+    return [
+        dataclasses.replace(base, name=f"{field}={value:g}", **{field: float(value)})
+        for value in values
+    ]
+
+# Function to stack one scalar field of every scenario into a (1, M) row
+def _row(scenarios, field):
+    return np.array([getattr(scenario, field) for scenario in scenarios], dtype='float64')[np.newaxis, :]
+
+# Function to stack a weights tuple into four (1, M) rows
+def _weight_rows(scenarios, field):
+    weights = np.array([getattr(scenario, field) for scenario in scenarios], dtype='float64')
+    return [weights[:, i][np.newaxis, :] for i in range(weights.shape[1])]
+
+# Function to stack the EV/EBITDA multipliers; scenarios with fewer multipliers are padded with NaN
+def _multiplier_rows(scenarios):
+    width = max(len(scenario.ev_ebitda_growth_multipliers) for scenario in scenarios)
+    multipliers = np.full((width, len(scenarios)), np.nan)
+    for j, scenario in enumerate(scenarios):
+        multipliers[:len(scenario.ev_ebitda_growth_multipliers), j] = scenario.ev_ebitda_growth_multipliers
+    return [multipliers[k][np.newaxis, :] for k in range(width)]
+
+def _stock_column(values):
+    return values[:, np.newaxis]
+
+# Evaluate every scenario for every stock of a raw all stocks frame.
+# Returns an N x M DataFrame of Final expected price (output="price") or Gain% (output="gain"),
+# indexed like `df` with one column per scenario name.
+def evaluate_scenarios(df, scenarios, output="price", max_cells=5_000_000):
+    scenarios = list(scenarios)
+    if output not in ("price", "gain"):
+        raise ValueError(f"Unknown output: {output}")
+
+    multipliers = _multiplier_rows(scenarios)
+    revenue_haircut = _row(scenarios, 'revenue_growth_haircut')
+    pe_haircut = _row(scenarios, 'pe_growth_haircut')
+    pe_weights = _weight_rows(scenarios, 'pe_weights')
+    pb_haircut = _row(scenarios, 'pb_growth_haircut')
+    pb_weights = _weight_rows(scenarios, 'pb_weights')
+    blend_weights = _weight_rows(scenarios, 'blend_weights')
+
+    # Bound the size of the N x M intermediates by evaluating the stocks in chunks
+    rows_per_chunk = max(1, max_cells // max(1, len(scenarios)))
+    results = []
+    for start in range(0, len(df), rows_per_chunk):
+        chunk = df.iloc[start:start + rows_per_chunk]
+        shares = column_values(chunk, 'Number of equity shares')
+        current_price = column_values(chunk, 'Current Price')
+        debt = column_values(chunk, 'Debt')
+        ebitda = column_values(chunk, 'Operating profit')
+        enterprise_value = calculate_enterprise_value(chunk)
+        ev_ebitda = safe_divide(enterprise_value, ebitda)
+
+        ev_ebitda_value = ev_ebitda_values(
+            _stock_column(ebitda), _stock_column(ev_ebitda), _stock_column(debt), _stock_column(shares),
+            _stock_column(column_values(chunk, 'Operating profit growth') / 100), multipliers,
+        )
+        revenue_value = revenue_values(
+            _stock_column(shares), _stock_column(current_price), _stock_column(column_values(chunk, 'Sales')),
+            _stock_column(column_values(chunk, 'Sales growth') / 100), revenue_haircut,
+        )
+        pe_value = pe_values(*[_stock_column(values) for values in pe_inputs(chunk)], pe_haircut, pe_weights)
+        pb_value = pb_values(*[_stock_column(values) for values in pb_inputs(chunk)], pb_haircut, pb_weights)
+        final_expected_price, gain = blended_values(
+            pe_value, ev_ebitda_value, revenue_value, pb_value, _stock_column(current_price), blend_weights,
+        )
+        results.append(final_expected_price if output == "price" else gain)
+
+    matrix = np.vstack(results) if results else np.empty((0, len(scenarios)))
+    return pd.DataFrame(matrix, index=df.index, columns=[scenario.name for scenario in scenarios])
@@ -0,0 +1,237 @@
+# Selenium scraping of screener.in exports.
+# A ScreenerSession keeps one logged-in Chrome alive across scrapes. Each download goes to
+# its own job directory, which is watched until the CSV is complete instead of sleeping.
+# ScreenerSessionPool hands sessions out to concurrent jobs and logs extra sessions in by
+# copying the cookies of an already authenticated one.
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+SCREENER_BASE_URL = "https://www.screener.in"
+
+# Suffixes Chrome uses for downloads that are still being written
+PARTIAL_DOWNLOAD_SUFFIXES = (".crdownload", ".tmp", ".part")
+
+def init_driver(download_dir, chromedriver_path, headless=True):
+    options = Options()
+    prefs = {"download.default_directory": download_dir}
+    options.add_experimental_option("prefs", prefs)
+    options.add_argument("--no-sandbox")
+    if headless:
+        options.add_argument("--headless")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-extensions")
+    options.add_argument("--disable-gpu")
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    options.add_experimental_option("useAutomationExtension", False)
+    options.add_argument(
+        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+    )
+    driver = webdriver.Chrome(service=Service(chromedriver_path), options=options)
+    return driver
+
+# Wait until a finished CSV shows up in `directory` and return its path.
+# A file counts as finished once no partial download is left and its size stopped changing.
+def wait_for_download(directory, timeout=60, poll_interval=0.1):
+    deadline = time.monotonic() + timeout
+    last_sizes = {}
+    while time.monotonic() < deadline:
+        names = os.listdir(directory)
+        partial = any(name.endswith(PARTIAL_DOWNLOAD_SUFFIXES) for name in names)
+        csv_files = [name for name in names if name.lower().endswith(".csv")]
+        if csv_files and not partial:
+            sizes = {name: os.path.getsize(os.path.join(directory, name)) for name in csv_files}
+            if sizes == last_sizes and all(size > 0 for size in sizes.values()):
+                newest = max(csv_files, key=lambda name: os.path.getmtime(os.path.join(directory, name)))
+                return os.path.join(directory, newest)
+            last_sizes = sizes
+        time.sleep(poll_interval)
+    raise TimeoutError(f"No completed CSV download in {directory} after {timeout} seconds.")
+
+# Function to remove a finished download together with its job directory
+def discard_download(path):
+    shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+
+class ScreenerSession:
+    def __init__(self, username, password, chromedriver_path, base_url=SCREENER_BASE_URL,
+                 download_root=None, headless=True, timeout=10):
+        self.username = username
+        self.password = password
+        self.chromedriver_path = chromedriver_path
+        self.base_url = base_url.rstrip("/")
+        self.download_root = download_root or tempfile.mkdtemp(prefix="screener-")
+        self.headless = headless
+        self.timeout = timeout
+        self.driver = None
+        os.makedirs(self.download_root, exist_ok=True)
+
+    def start(self, cookies=None):
+        if self.driver is None:
+            self.driver = init_driver(self.download_root, self.chromedriver_path, self.headless)
+            if cookies:
+                self.restore_cookies(cookies)
+            else:
+                self.login()
+        return self
+
+    def login(self):
+        driver = self.driver
+        driver.get(f"{self.base_url}/login/")
+        wait = WebDriverWait(driver, self.timeout)
+        wait.until(lambda d: d.find_element(By.NAME, "username")).send_keys(self.username)
+        driver.find_element(By.NAME, "password").send_keys(self.password)
+        driver.find_element(By.XPATH, "//button[@type='submit']").click()
+        # Logged in once the browser has left the login page
+        wait.until(lambda d: "/login" not in d.current_url)
+
+    def cookies(self):
+        return self.driver.get_cookies()
+
+    def restore_cookies(self, cookies):
+        # Cookies can only be set for the domain that is currently open
+        self.driver.get(self.base_url + "/")
+        for cookie in cookies:
+            self.driver.add_cookie({key: cookie[key] for key in ("name", "value", "path", "secure") if key in cookie})
+
+    def _open(self, url):
+        self.driver.get(url)
+        if "/login" in self.driver.current_url:
+            # Session expired, log in again and go back to the screen
+            self.login()
+            self.driver.get(url)
+
+    # Download the CSV export of a screen into a fresh job directory and return its path.
+    # A failed download removes its job directory, so a long-lived session does not collect them.
+    def download(self, url, timeout=60):
+        self.start()
+        job_dir = tempfile.mkdtemp(prefix="job-", dir=self.download_root)
+        try:
+            self.driver.execute_cdp_cmd("Page.setDownloadBehavior", {"behavior": "allow", "downloadPath": job_dir})
+            self._open(url)
+            download_button = WebDriverWait(self.driver, self.timeout).until(
+                EC.element_to_be_clickable((By.XPATH, "//button[contains(@class, 'tooltip-left')]"))
+            )
+            download_button.click()
+            return wait_for_download(job_dir, timeout)
+        except Exception:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+
+    def close(self):
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except WebDriverException:
+                pass
+            self.driver = None
+        shutil.rmtree(self.download_root, ignore_errors=True)
+
+
+class ScreenerSessionPool:
+    # Up to `size` sessions are created lazily; all but the first reuse the first one's cookies.
+    # A session dropped after a browser crash frees its slot, so a job waiting for a session
+    # starts a replacement instead of waiting for one that never comes back.
+    def __init__(self, username, password, chromedriver_path, size=2, **session_options):
+        self.username = username
+        self.password = password
+        self.chromedriver_path = chromedriver_path
+        self.size = size
+        self.session_options = session_options
+        self._idle = []
+        self._sessions = []
+        self._available = threading.Condition()
+        self._cookies = None
+        self._logging_in = False
+
+    # Function to create a session; under a shared download_root each session gets its own
+    # directory, since closing a session removes its download root
+    def _new_session(self):
+        options = dict(self.session_options)
+        if options.get('download_root'):
+            os.makedirs(options['download_root'], exist_ok=True)
+            options['download_root'] = tempfile.mkdtemp(prefix="session-", dir=options['download_root'])
+        return ScreenerSession(self.username, self.password, self.chromedriver_path, **options)
+
+    def _acquire(self):
+        with self._available:
+            # Until the first session has logged in there are no cookies to copy, so other new
+            # sessions wait for it rather than logging in as well
+            while not self._idle and (len(self._sessions) >= self.size or self._logging_in):
+                self._available.wait()
+            if self._idle:
+                return self._idle.pop()
+            session = self._new_session()
+            self._sessions.append(session)
+            cookies = self._cookies
+            self._logging_in = cookies is None
+        try:
+            session.start(cookies)
+            if cookies is None:
+                self._cookies = session.cookies()
+        except Exception:
+            self._drop(session)
+            raise
+        finally:
+            if cookies is None:
+                with self._available:
+                    self._logging_in = False
+                    self._available.notify_all()
+        return session
+
+    # Function to hand a session back to the pool, unless it was dropped meanwhile
+    def _release(self, session):
+        with self._available:
+            if session in self._sessions:
+                self._idle.append(session)
+                self._available.notify_all()
+
+    # Function to remove a session from the pool and close it; a waiting job may start a new one
+    def _drop(self, session):
+        with self._available:
+            if session in self._sessions:
+                self._sessions.remove(session)
+            self._available.notify_all()
+        session.close()
+
+    # Download one screen export with a pooled session and return the CSV path
+    def fetch(self, url, timeout=60):
+        session = self._acquire()
+        try:
+            return session.download(url, timeout)
+        except WebDriverException:
+            # A crashed browser is dropped from the pool instead of being handed out again
+            self._drop(session)
+            raise
+        finally:
+            self._release(session)
+
+    # Download several screen exports concurrently; returns {url: path or exception}
+    def fetch_many(self, urls, timeout=60):
+        urls = list(urls)
+        results = {}
+        with ThreadPoolExecutor(max_workers=max(1, min(self.size, len(urls)))) as executor:
+            futures = {url: executor.submit(self.fetch, url, timeout) for url in urls}
+            for url, future in futures.items():
+                try:
+                    results[url] = future.result()
+                except Exception as e:
+                    results[url] = e
+        return results
+
+    def close(self):
+        with self._available:
+            sessions, self._sessions, self._idle = self._sessions, [], []
+        for session in sessions:
+            session.close()
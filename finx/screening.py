@@ -0,0 +1,58 @@
+# SME / non-SME splits and the default screens shown in the Financial Dashboard.
+import pandas as pd
+
+from finx.instrumentation import span
+from finx.screens import CompiledScreen
+
+# Columns shown in the dashboard grids and in the "Download All Companies as CSV" export
+DISPLAY_COLUMNS = ['Name', 'Market Capitalisation', 'Current Price', 'Final expected price', 'Gain%', 'Value as per EV/EBITDA Method', 'Value as per Revenue Method', 'Value as per PE Multiple', 'Value as per PB Multiple', 'PB_elements_is_1']
+
+METHOD_COLUMNS = ['Value as per EV/EBITDA Method', 'Value as per Revenue Method', 'Value as per PE Multiple', 'Value as per PB Multiple']
+
+# Minimum Sales and Operating profit for the screened lists, keyed by the 'Is SME' value
+SCREEN_THRESHOLDS = {
+    0: {'Sales': 50, 'Operating profit': 10},
+    1: {'Sales': 5, 'Operating profit': 1},
+}
+
+# Function to get the default screen of an SME segment as a screen definition
+def default_screen(is_sme):
+    return {'all': (
+        [{'column': 'Is SME', 'op': '==', 'value': is_sme}]
+        + [{'column': column, 'op': '>', 'value': minimum} for column, minimum in SCREEN_THRESHOLDS[is_sme].items()]
+        + [{'column': column, 'op': '>', 'value': 0} for column in METHOD_COLUMNS]
+    )}
+
+DEFAULT_SCREENS = {is_sme: CompiledScreen(default_screen(is_sme)) for is_sme in SCREEN_THRESHOLDS}
+
+# Function to flag the companies that pass the screen for their SME segment
+def screen_mask(processed_data, is_sme):
+    return pd.Series(DEFAULT_SCREENS[is_sme].mask(processed_data), index=processed_data.index)
+
+# Function to keep companies that pass the screen for their SME segment
+def screen_companies(processed_data, is_sme):
+    return processed_data[screen_mask(processed_data, is_sme)]
+
+# The four dashboard lists, in tab order
+SPLIT_NAMES = ['non_sme', 'sme', 'non_sme_screened', 'sme_screened']
+
+# Function to flag the companies of one dashboard list
+def split_mask(processed_data, split):
+    if split == 'non_sme':
+        return processed_data['Is SME'] == 0
+    if split == 'sme':
+        return processed_data['Is SME'] == 1
+    if split == 'non_sme_screened':
+        return screen_mask(processed_data, 0)
+    if split == 'sme_screened':
+        return screen_mask(processed_data, 1)
+    raise ValueError(f"Unknown dashboard list: {split}")
+
+# Function to get one dashboard list, sorted by Gain%
+def split_company_list(processed_data, split):
+    with span('screening', len(processed_data)):
+        return processed_data[split_mask(processed_data, split)].sort_values(by='Gain%', ascending=False)
+
+# Function to split processed data into the four dashboard lists, each sorted by Gain%
+def split_companies(processed_data):
+    return {split: split_company_list(processed_data, split) for split in SPLIT_NAMES}
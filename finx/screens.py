@@ -0,0 +1,246 @@
+# Declarative screens, stored in the SQLite database and compiled to vectorized masks.
+# A screen is a JSON tree: {"all": [...]} and {"any": [...]} combine conditions with AND / OR,
+# and a condition is {"column": ..., "op": ..., "value": ...} with op one of
+#   >, >=, <, <=            numeric comparison; NaN never matches
+#   between                 value is [low, high] with low <= high, both inclusive
+#   ==, !=, in, not in      equality on any column, e.g. an Industry list
+# e.g. {"all": [{"column": "Industry", "op": "in", "value": ["Banks"]},
+#               {"column": "Market Capitalisation", "op": "between", "value": [500, 20000]},
+#               {"any": [{"column": "Gain%", "op": ">", "value": 20}, {"column": "Price to Earning", "op": "<", "value": 15}]}]}
+# A screen is validated and compiled once. ScreenData prepares each column of a snapshot once
+# (float arrays, factorized categories, sorted values), so any number of screens can then be
+# evaluated against it in a few array operations each.
+import json
+
+import numpy as np
+import pandas as pd
+
+from finx.db import connect
+from finx.valuation import column_values
+
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+ORDERED_OPS = {'>': np.greater, '>=': np.greater_equal, '<': np.less, '<=': np.less_equal}
+EQUALITY_OPS = ('==', '!=', 'in', 'not in')
+SCREEN_OPS = tuple(ORDERED_OPS) + ('between',) + EQUALITY_OPS
+
+
+class ScreenError(ValueError):
+    pass
+
+
+class ScreenData:
+    # Column arrays of one processed snapshot, prepared on first use and reused by every screen
+    def __init__(self, frame):
+        self.frame = frame
+        self._values = {}
+        self._sorted = {}
+        self._categories = {}
+
+    def __len__(self):
+        return len(self.frame)
+
+    def _column(self, column):
+        if column not in self.frame.columns:
+            raise ScreenError(f"Unknown column: {column}")
+        return self.frame[column]
+
+    # Function to get a column as float64, non-numeric entries as NaN
+    def values(self, column):
+        if column not in self._values:
+            self._column(column)
+            self._values[column] = column_values(self.frame, column)
+        return self._values[column]
+
+    # Function to get the sorted non-NaN values of a column, for counting a comparison without a mask
+    def sorted_values(self, column):
+        if column not in self._sorted:
+            values = self.values(column)
+            self._sorted[column] = np.sort(values[~np.isnan(values)])
+        return self._sorted[column]
+
+    # Function to get (codes, {category: code}) of a column; missing values get code -1
+    def categories(self, column):
+        if column not in self._categories:
+            codes, uniques = pd.factorize(self._column(column))
+            self._categories[column] = (codes, {category: code for code, category in enumerate(uniques)})
+        return self._categories[column]
+
+    # Function to get count, missing, min, median and max of the numeric columns, e.g. as hints in a screen editor
+    def column_stats(self, columns=None):
+        if columns is None:
+            columns = [column for column in self.frame.columns if pd.api.types.is_numeric_dtype(self.frame[column])]
+        stats = {}
+        for column in columns:
+            ordered = self.sorted_values(column)
+            stats[column] = {
+                'Count': len(ordered),
+                'Missing': len(self.frame) - len(ordered),
+                'Min': ordered[0] if len(ordered) else np.nan,
+                'Median': np.median(ordered) if len(ordered) else np.nan,
+                'Max': ordered[-1] if len(ordered) else np.nan,
+            }
+        return pd.DataFrame.from_dict(stats, orient='index')
+
+
+def _number(value, condition):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        number = np.nan
+    if not np.isfinite(number):
+        raise ScreenError(f"{condition['column']} {condition['op']} needs a finite number, got {value!r}")
+    return number
+
+# Function to validate a screen definition; returns it normalised (numbers as float, lists for in / between)
+def validate_screen(definition):
+    if not isinstance(definition, dict):
+        raise ScreenError(f"A screen node must be an object, got {definition!r}")
+    for combinator in ('all', 'any'):
+        if combinator in definition:
+            children = definition[combinator]
+            if len(definition) != 1 or not isinstance(children, list) or not children:
+                raise ScreenError(f"'{combinator}' must be the only key and hold a non-empty list")
+            return {combinator: [validate_screen(child) for child in children]}
+    if set(definition) != {'column', 'op', 'value'}:
+        raise ScreenError(f"A condition needs exactly column, op and value, got {sorted(definition)}")
+    op, value = definition['op'], definition['value']
+    if op not in SCREEN_OPS:
+        raise ScreenError(f"Unknown op {op!r}, expected one of {', '.join(SCREEN_OPS)}")
+    if op in ORDERED_OPS:
+        value = _number(value, definition)
+    elif op == 'between':
+        if not isinstance(value, (list, tuple)) or len(value) != 2:
+            raise ScreenError(f"{definition['column']} between needs [low, high]")
+        value = [_number(value[0], definition), _number(value[1], definition)]
+        if value[0] > value[1]:
+            raise ScreenError(f"{definition['column']} between needs low <= high, got {value}")
+    elif op in ('in', 'not in'):
+        if not isinstance(value, (list, tuple)):
+            raise ScreenError(f"{definition['column']} {op} needs a list")
+        value = list(value)
+    return {'column': str(definition['column']), 'op': op, 'value': value}
+
+# Function to get the mask of one condition
+def condition_mask(data, condition):
+    op, value = condition['op'], condition['value']
+    if op in ORDERED_OPS:
+        return ORDERED_OPS[op](data.values(condition['column']), value)
+    if op == 'between':
+        values = data.values(condition['column'])
+        return (values >= value[0]) & (values <= value[1])
+    codes, categories = data.categories(condition['column'])
+    # One flag per category plus a False one that code -1 (missing) picks up
+    wanted = np.zeros(len(categories) + 1, dtype=bool)
+    for category in (value if op in ('in', 'not in') else [value]):
+        if category in categories:
+            wanted[categories[category]] = True
+    mask = wanted[codes]
+    return ~mask if op in ('!=', 'not in') else mask
+
+# Function to count the matches of one condition; numeric comparisons are two binary searches on the sorted column
+def condition_count(data, condition):
+    op, value = condition['op'], condition['value']
+    if op not in ORDERED_OPS and op != 'between':
+        return int(condition_mask(data, condition).sum())
+    ordered = data.sorted_values(condition['column'])
+    if op == 'between':
+        return int(np.searchsorted(ordered, value[1], side='right') - np.searchsorted(ordered, value[0], side='left'))
+    if op == '>':
+        return int(len(ordered) - np.searchsorted(ordered, value, side='right'))
+    if op == '>=':
+        return int(len(ordered) - np.searchsorted(ordered, value, side='left'))
+    if op == '<':
+        return int(np.searchsorted(ordered, value, side='left'))
+    return int(np.searchsorted(ordered, value, side='right'))
+
+# Function to list the conditions of a screen in order
+def screen_conditions(definition):
+    for combinator in ('all', 'any'):
+        if combinator in definition:
+            return [condition for child in definition[combinator] for condition in screen_conditions(child)]
+    return [definition]
+
+
+class CompiledScreen:
+    # A validated screen. Trees of numeric comparisons are evaluated as one numexpr expression
+    # when numexpr is installed, everything else as numpy masks.
+    def __init__(self, definition, name=None):
+        self.definition = validate_screen(definition)
+        self.name = name
+        self.conditions = screen_conditions(self.definition)
+        self.columns = list(dict.fromkeys(condition['column'] for condition in self.conditions))
+        self.expression = None
+        if numexpr is not None and all(condition['op'] not in EQUALITY_OPS for condition in self.conditions):
+            self.expression = self._expression(self.definition)
+
+    def _expression(self, node):
+        for combinator, joiner in (('all', ' & '), ('any', ' | ')):
+            if combinator in node:
+                return '(' + joiner.join(self._expression(child) for child in node[combinator]) + ')'
+        variable = f"c{self.columns.index(node['column'])}"
+        if node['op'] == 'between':
+            low, high = node['value']
+            return f"(({variable} >= {low!r}) & ({variable} <= {high!r}))"
+        return f"({variable} {node['op']} {node['value']!r})"
+
+    def _mask(self, data, node):
+        for combinator, reduce in (('all', np.logical_and.reduce), ('any', np.logical_or.reduce)):
+            if combinator in node:
+                return reduce([self._mask(data, child) for child in node[combinator]])
+        return condition_mask(data, node)
+
+    # Function to get the boolean mask of a ScreenData or DataFrame
+    def mask(self, data):
+        if not isinstance(data, ScreenData):
+            data = ScreenData(data)
+        if self.expression is not None:
+            arrays = {f"c{i}": data.values(column) for i, column in enumerate(self.columns)}
+            return numexpr.evaluate(self.expression, local_dict=arrays)
+        return self._mask(data, self.definition)
+
+    def count(self, data):
+        return int(self.mask(data).sum())
+
+    # Function to get the match count of every condition on its own, e.g. for live feedback while editing
+    def condition_counts(self, data):
+        if not isinstance(data, ScreenData):
+            data = ScreenData(data)
+        return [condition_count(data, condition) for condition in self.conditions]
+
+# Function to get the match count of every screen against one snapshot (ScreenData or DataFrame), preparing each column once
+def screen_counts(screens, data):
+    if not isinstance(data, ScreenData):
+        data = ScreenData(data)
+    return pd.Series({name: screen.count(data) for name, screen in screens.items()}, name='Matches', dtype='int64')
+
+
+# Function to prepare the saved screens table; the schema itself is set up once per process by finx.db
+def init_screen_store(db_path):
+    connect(db_path)
+
+# Function to save (or replace) a screen under a name; the definition is validated first
+def save_screen(db_path, name, definition):
+    definition = validate_screen(definition)
+    with connect(db_path) as conn:
+        conn.execute("INSERT OR REPLACE INTO saved_screens (name, definition) VALUES (?, ?)",
+                     (name, json.dumps(definition)))
+        conn.commit()
+
+def delete_screen(db_path, name):
+    with connect(db_path) as conn:
+        conn.execute("DELETE FROM saved_screens WHERE name = ?", (name,))
+        conn.commit()
+
+# Function to get {name: definition} of the saved screens, ordered by name
+def load_screens(db_path):
+    with connect(db_path) as conn:
+        rows = conn.execute("SELECT name, definition FROM saved_screens ORDER BY name").fetchall()
+    return {name: json.loads(definition) for name, definition in rows}
+
+# Function to compile every saved screen once
+def load_compiled_screens(db_path):
+    return {name: CompiledScreen(definition, name) for name, definition in load_screens(db_path).items()}
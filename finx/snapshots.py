@@ -0,0 +1,112 @@
+# Versioned store for the all stocks snapshots in the SQLite database.
+# file_storage holds each distinct CSV once (deduplicated by content hash) and
+# file_metadata holds one dated version per save pointing at its storage row.
+from datetime import datetime
+
+from finx.cache import content_hash
+from finx.db import connect, insert_blob
+from finx.instrumentation import span
+from finx.universe import drop_orphan_universes
+
+# Number of dated versions kept by default
+SNAPSHOT_RETENTION = 30
+
+# Function to prepare the snapshot tables; the schema itself is set up once per process by finx.db
+def init_snapshot_store(db_path):
+    connect(db_path)
+
+# Function to delete versions beyond the retention count and storage rows no version points at
+def prune_snapshots(cursor, retention=SNAPSHOT_RETENTION):
+    cursor.execute("""DELETE FROM file_metadata WHERE id NOT IN (
+                        SELECT id FROM file_metadata ORDER BY id DESC LIMIT ?)""", (max(retention, 1),))
+    cursor.execute("""DELETE FROM file_storage WHERE id NOT IN (
+                        SELECT storage_id FROM file_metadata WHERE storage_id IS NOT NULL)""")
+    drop_orphan_universes(cursor)
+
+# Save a snapshot as a new version. Returns the new version id, or None when the
+# content is identical to the latest version and nothing was written.
+def save_snapshot(db_path, filename, file_data, retention=SNAPSHOT_RETENTION, upload_time=None):
+    file_hash = content_hash(file_data)
+    upload_time = upload_time or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    with span('snapshot_save'), connect(db_path) as conn:
+        cursor = conn.cursor()
+        latest = cursor.execute("""SELECT s.content_hash FROM file_metadata m
+                                   JOIN file_storage s ON s.id = m.storage_id
+                                   ORDER BY m.id DESC LIMIT 1""").fetchone()
+        if latest and latest[0] == file_hash:
+            return None
+
+        # Reuse the stored blob when an older version had the same content
+        existing = cursor.execute("SELECT id FROM file_storage WHERE content_hash = ?", (file_hash,)).fetchone()
+        if existing:
+            storage_id = existing[0]
+        else:
+            storage_id = insert_blob(conn, "file_storage", "file_data", file_data, content_hash=file_hash)
+        cursor.execute("INSERT INTO file_metadata (filename, upload_time, storage_id) VALUES (?, ?, ?)",
+                       (filename, upload_time, storage_id))
+        version_id = cursor.lastrowid
+        prune_snapshots(cursor, retention)
+        conn.commit()
+    return version_id
+
+# Function to get (filename, upload_time, file_data) of the latest version, or None
+def get_latest_snapshot(db_path):
+    with connect(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("""SELECT m.filename, m.upload_time, s.file_data FROM file_metadata m
+                          JOIN file_storage s ON s.id = m.storage_id
+                          ORDER BY m.id DESC LIMIT 1""")
+        return cursor.fetchone()
+
+# Function to get (version id, filename, upload_time, storage_id, content_hash) of the latest version without its blob
+def get_latest_snapshot_info(db_path):
+    with connect(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("""SELECT m.id, m.filename, m.upload_time, m.storage_id, s.content_hash FROM file_metadata m
+                          JOIN file_storage s ON s.id = m.storage_id
+                          ORDER BY m.id DESC LIMIT 1""")
+        return cursor.fetchone()
+
+# Function to get (version id, filename, upload_time, storage_id, content_hash) of the version stored before `version_id`, or None
+def get_previous_snapshot_info(db_path, version_id):
+    with connect(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("""SELECT m.id, m.filename, m.upload_time, m.storage_id, s.content_hash FROM file_metadata m
+                          JOIN file_storage s ON s.id = m.storage_id
+                          WHERE m.id < ? ORDER BY m.id DESC LIMIT 1""", (version_id,))
+        return cursor.fetchone()
+
+# Function to get the upload time of the latest version without reading its blob
+def get_latest_upload_time(db_path):
+    with connect(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT upload_time FROM file_metadata ORDER BY id DESC LIMIT 1")
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+# Function to list stored versions as (id, filename, upload_time, storage_id, content_hash), newest first
+def list_snapshots(db_path):
+    with connect(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("""SELECT m.id, m.filename, m.upload_time, m.storage_id, s.content_hash FROM file_metadata m
+                          JOIN file_storage s ON s.id = m.storage_id
+                          ORDER BY m.id DESC""")
+        return cursor.fetchall()
+
+# Function to get the raw CSV bytes of a storage row
+def get_storage_data(db_path, storage_id):
+    with connect(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT file_data FROM file_storage WHERE id = ?", (storage_id,))
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+# Function to get the raw CSV bytes of one version
+def get_snapshot_data(db_path, version_id):
+    with connect(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("""SELECT s.file_data FROM file_metadata m
+                          JOIN file_storage s ON s.id = m.storage_id
+                          WHERE m.id = ?""", (version_id,))
+        row = cursor.fetchone()
+    return row[0] if row else None
@@ -0,0 +1,110 @@
+# Typed, columnar copy of each stored all stocks snapshot.
+# The CSV blob is parsed once into a table universe_<storage id> with REAL/INTEGER/TEXT
+# columns and an index on NSE Code. Reads then select only the columns they need,
+# straight from SQLite's memory-mapped pages, instead of re-parsing the CSV.
+import pandas as pd
+
+from finx.db import connect, open_blob
+from finx.instrumentation import span
+from finx.valuation import VALUATION_INPUT_COLUMNS
+
+# Identifier and classification columns every consumer needs
+IDENTIFIER_COLUMNS = ['Name', 'NSE Code', 'Industry', 'Is SME']
+
+# Columns shown in the financial health summary
+HEALTH_SUMMARY_COLUMNS = [
+    'Promoter holding', 'Change in promoter holding', 'Change in FII holding', 'Change in DII holding',
+    'Cash Conversion Cycle', 'Return on equity', 'Return on capital employed', 'Return on invested capital',
+    'QoQ Sales', 'QoQ Profits', 'Net Profit latest quarter', 'Net profit 3quarters back', 'OPM',
+    'YOY Quarterly sales growth', 'YOY Quarterly profit growth',
+]
+
+# Default projection for the dashboard and portfolio analysis
+UNIVERSE_COLUMNS = IDENTIFIER_COLUMNS + [
+    column for column in VALUATION_INPUT_COLUMNS + HEALTH_SUMMARY_COLUMNS if column not in IDENTIFIER_COLUMNS
+]
+
+# Health summary columns only shown rounded; the net profit columns are shown in full and stay float64
+FLOAT32_COLUMNS = [
+    column for column in HEALTH_SUMMARY_COLUMNS
+    if column not in ('Net Profit latest quarter', 'Net profit 3quarters back')
+]
+
+CATEGORY_COLUMNS = ['Industry', 'Is SME']
+
+# Rows parsed and written at a time when a blob is materialised
+STORE_CHUNK_SIZE = 50_000
+
+# Function to convert loaded columns to compact dtypes, in place: float32 for the display-only
+# health columns, categoricals for Industry and Is SME. Valuation inputs stay float64.
+def compact_dtypes(data):
+    for column in FLOAT32_COLUMNS:
+        if column in data.columns:
+            data[column] = pd.to_numeric(data[column], errors='coerce').astype('float32')
+    for column in CATEGORY_COLUMNS:
+        if column in data.columns:
+            data[column] = data[column].astype('category')
+    return data
+
+def universe_table(storage_id):
+    return f"universe_{int(storage_id)}"
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+# Function to check whether a snapshot has already been materialised
+def has_universe(cursor, storage_id):
+    row = cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                         (universe_table(storage_id),)).fetchone()
+    return row is not None
+
+# Function to parse a stored CSV (a binary file) once and write it as a typed table, STORE_CHUNK_SIZE rows at a time
+def store_universe(conn, storage_id, source):
+    table = universe_table(storage_id)
+    with span('universe_materialise') as materialise, \
+            pd.read_csv(source, chunksize=STORE_CHUNK_SIZE) as reader:
+        rows = 0
+        for number, chunk in enumerate(reader):
+            chunk.to_sql(table, conn, if_exists="replace" if number == 0 else "append", index=False)
+            rows += len(chunk)
+        materialise.rows = rows
+    if 'NSE Code' in chunk.columns:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_nse ON {table}({_quote('NSE Code')})")
+    conn.commit()
+
+# Function to drop the typed tables of storage rows that no longer exist
+def drop_orphan_universes(cursor):
+    storage_ids = {row[0] for row in cursor.execute("SELECT id FROM file_storage")}
+    tables = [row[0] for row in cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'universe_%'"
+    )]
+    for table in tables:
+        suffix = table[len("universe_"):]
+        if suffix.isdigit() and int(suffix) not in storage_ids:
+            cursor.execute(f"DROP TABLE {table}")
+
+# Load the given columns of a snapshot, materialising it from the blob on first use; the blob is
+# streamed into the parser rather than read into memory first.
+# Columns the export does not have are skipped; columns=None loads every column.
+# The columns come back with compact dtypes (see compact_dtypes).
+def load_universe(db_path, storage_id, columns=UNIVERSE_COLUMNS):
+    with connect(db_path) as conn:
+        cursor = conn.cursor()
+        if not has_universe(cursor, storage_id):
+            source = open_blob(conn, "file_storage", "file_data", storage_id)
+            if source is None:
+                return None
+            with source:
+                store_universe(conn, storage_id, source)
+
+        table = universe_table(storage_id)
+        available = [row[1] for row in cursor.execute(f"PRAGMA table_info({table})")]
+        if columns is None:
+            selected = available
+        else:
+            selected = [column for column in columns if column in available]
+        query = f"SELECT {', '.join(_quote(column) for column in selected)} FROM {table}"
+        with span('universe_load') as load:
+            data = compact_dtypes(pd.read_sql_query(query, conn))
+            load.rows = len(data)
+        return data
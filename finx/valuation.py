@@ -0,0 +1,380 @@
+# Valuation methods used by the Financial Dashboard, the portfolio analysis and the CLI.
+# Nothing in here touches Streamlit, the database or the file system.
+import logging
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from finx.instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+# Utility Functions
+def calculate_ev(row):
+    return (row['Number of equity shares'] * row['Current Price']) + row['Debt'] - row['Cash Equivalents']
+
+def calculate_ev_ebitda(row):
+    if row['EBITDA'] != 0:
+        return row['Enterprise Value'] / row['EBITDA']
+    return None
+
+def calculate_equity_value_per_share(row, scene_growth_multiplier):
+    estimated_growth = row['Operating profit growth'] / 100
+    estimated_growth *= scene_growth_multiplier
+    estimated_ebitda = row['EBITDA'] * (1 + estimated_growth)
+    expected_ev = estimated_ebitda * row['EV/EBITDA']
+    expected_equity_value = expected_ev - row['Debt']
+    if row['Number of equity shares'] <= 0:
+        return None
+    return expected_equity_value / row['Number of equity shares']
+
+def calculate_ev_ebitda_share_price(df):
+    scene_multipliers = [1, 0.8, 0.7, 0.6]
+    for index, row in df.iterrows():
+        equity_values_per_scene = []
+        for multiplier in scene_multipliers:
+            equity_value = calculate_equity_value_per_share(row, multiplier)
+            if equity_value is not None:
+                equity_values_per_scene.append(equity_value)
+        if equity_values_per_scene:
+            df.loc[index, 'Value as per EV/EBITDA Method'] = sum(equity_values_per_scene) / len(equity_values_per_scene)
+        else:
+            df.loc[index, 'Value as per EV/EBITDA Method'] = None
+    return df
+
+def calculate_revenue_method_share_price(df):
+    for index, row in df.iterrows():
+        try:
+            market_cap = row['Number of equity shares'] * row['Current Price']
+            ttm_revenue = row['Sales']
+            revenue_multiple = market_cap / ttm_revenue if ttm_revenue != 0 else None
+            if revenue_multiple is not None:
+                revenue_growth_a = row['Sales growth'] / 100
+                estimated_revenue_a = ttm_revenue * (1 + revenue_growth_a)
+                expected_mcap_a = estimated_revenue_a * revenue_multiple
+                price_per_share_a = expected_mcap_a / row['Number of equity shares']
+
+                revenue_growth_b = revenue_growth_a * 0.9
+                estimated_revenue_b = ttm_revenue * (1 + revenue_growth_b)
+                expected_mcap_b = estimated_revenue_b * revenue_multiple
+                price_per_share_b = expected_mcap_b / row['Number of equity shares']
+
+                df.loc[index, 'Value as per Revenue Method'] = (price_per_share_a + price_per_share_b) / 2
+            else:
+                df.loc[index, 'Value as per Revenue Method'] = None
+        except:
+            df.loc[index, 'Value as per Revenue Method'] = None
+    return df
+
+def calculate_pe_method_share_price(df):
+    for index, row in df.iterrows():
+        try:
+            ttm_pat = row['Profit after tax'] if pd.notnull(row['Profit after tax']) else 1
+            pat_growth = (row['Profit growth'] / 100) if pd.notnull(row['Profit growth']) else 0
+            price_to_earning = max(row['Price to Earning'], 1) if pd.notnull(row['Price to Earning']) else 1
+            industry_pe = max(row['Industry PE'], 1) if pd.notnull(row['Industry PE']) else 1
+            num_equity_shares = row['Number of equity shares'] if pd.notnull(row['Number of equity shares']) else 1
+
+            estimated_pat_a = ttm_pat * (1 + pat_growth)
+            expected_mcap_a = estimated_pat_a * price_to_earning
+            price_per_share_a = expected_mcap_a / num_equity_shares
+
+            pat_growth_b = pat_growth * 0.7
+            estimated_pat_b = ttm_pat * (1 + pat_growth_b)
+            expected_mcap_b = estimated_pat_b * price_to_earning
+            price_per_share_b = expected_mcap_b / num_equity_shares
+
+            estimated_pat_c = ttm_pat * (1 + pat_growth)
+            expected_mcap_c = estimated_pat_c * industry_pe
+            price_per_share_c = expected_mcap_c / num_equity_shares
+
+            pat_growth_d = pat_growth * 0.7
+            estimated_pat_d = ttm_pat * (1 + pat_growth_d)
+            expected_mcap_d = estimated_pat_d * industry_pe
+            price_per_share_d = expected_mcap_d / num_equity_shares
+
+            final_value_pe = (
+                (price_per_share_a * 0.2) +
+                (price_per_share_b * 0.2) +
+                (price_per_share_c * 0.3) +
+                (price_per_share_d * 0.3)
+            )
+
+            df.loc[index, 'Value as per PE Multiple'] = final_value_pe
+        except Exception as e:
+            df.loc[index, 'Value as per PE Multiple'] = None
+    return df
+
+def calculate_pb_method_share_price(df):
+    for index, row in df.iterrows():
+        try:
+            price_to_book = max(row['Price to book value'], 1) if pd.notnull(row['Price to book value']) else 1
+            industry_pb = max(row['Industry PBV'], 1) if pd.notnull(row['Industry PBV']) else 1
+            book_value_2yr_back = max(row['Book value preceding year'], 1) if pd.notnull(row['Book value preceding year']) else 1
+            book_value = max(row['Book value'], 1) if pd.notnull(row['Book value']) else 1
+
+            if price_to_book == 1 or industry_pb==1 or book_value_2yr_back==1 or book_value==1:
+                PB_elements_is_1 = "yes"
+            else:
+                PB_elements_is_1 = "no"
+
+            growth_in_book_value_a = ((book_value / book_value_2yr_back)**0.5 - 1) * 100
+            growth_in_book_value_b = growth_in_book_value_a * 0.8
+            growth_in_book_value_c = growth_in_book_value_a
+            growth_in_book_value_d = growth_in_book_value_c * 0.8
+
+            expected_book_value_a = book_value * (1 + growth_in_book_value_a / 100)
+            expected_book_value_b = book_value * (1 + growth_in_book_value_b / 100)
+            expected_book_value_c = book_value * (1 + growth_in_book_value_c / 100)
+            expected_book_value_d = book_value * (1 + growth_in_book_value_d / 100)
+
+            expected_market_price_a = expected_book_value_a * price_to_book
+            expected_market_price_b = expected_book_value_b * price_to_book
+            expected_market_price_c = expected_book_value_c * industry_pb
+            expected_market_price_d = expected_book_value_d * industry_pb
+
+            final_expected_market_price_a = expected_market_price_a * 0.3
+            final_expected_market_price_b = expected_market_price_b * 0.3
+            final_expected_market_price_c = expected_market_price_c * 0.2
+            final_expected_market_price_d = expected_market_price_d * 0.2
+
+            average_market_price_per_share = (
+                final_expected_market_price_a +
+                final_expected_market_price_b +
+                final_expected_market_price_c +
+                final_expected_market_price_d
+            )
+
+            df.loc[index, 'Value as per PB Multiple'] = average_market_price_per_share
+            df.loc[index, 'PB_elements_is_1'] = PB_elements_is_1
+        except Exception as e:
+            df.loc[index, 'Value as per PB Multiple'] = None
+            logger.warning("Error processing row, for company %s: %s", df.loc[index, 'Name'], e)
+    return df
+
+def calculate_gain_percentage(df):
+    for index, row in df.iterrows():
+        try:
+            gain = ((
+                0.25 * row['Value as per PE Multiple'] +
+                0.25 * row['Value as per EV/EBITDA Method'] +
+                0.25 * row['Value as per Revenue Method'] +
+                0.25 * row['Value as per PB Multiple']
+            ) - row['Current Price']) / row['Current Price'] * 100
+
+            df.loc[index, 'Gain%'] = gain
+            df.loc[index, 'Final expected price'] = (
+                0.25 * row['Value as per PE Multiple'] +
+                0.25 * row['Value as per EV/EBITDA Method'] +
+                0.25 * row['Value as per Revenue Method'] +
+                0.25 * row['Value as per PB Multiple']
+            )
+        except Exception as e:
+            logger.warning("Error calculating gain for row %s: %s", index, e)
+            df.loc[index, 'Gain%'] = None 
+            df.loc[index, 'Final expected price'] = None
+    return df
+
+# Raw export columns read by the valuation methods
+VALUATION_INPUT_COLUMNS = [
+    'Number of equity shares', 'Current Price', 'Debt', 'Cash Equivalents', 'Operating profit',
+    'Operating profit growth', 'Sales', 'Sales growth', 'Profit after tax', 'Profit growth',
+    'Price to Earning', 'Industry PE', 'Price to book value', 'Industry PBV',
+    'Book value preceding year', 'Book value', 'Market Capitalization',
+]
+
+# Columns added by calculate_valuations
+VALUATION_OUTPUT_COLUMNS = [
+    'EBITDA', 'Market Capitalisation', 'Enterprise Value', 'EV/EBITDA',
+    'Value as per EV/EBITDA Method', 'Value as per Revenue Method', 'Value as per PE Multiple',
+    'Value as per PB Multiple', 'PB_elements_is_1', 'Gain%', 'Final expected price',
+]
+
+# Bump whenever a formula or default changes so cached snapshots are recomputed
+VALUATION_VERSION = 1
+
+# Scenario assumptions of the valuation methods. The defaults are the assumptions of the
+# per-row functions above; weights follow the order the values are combined in there.
+@dataclass(frozen=True)
+class ValuationScenario:
+    name: str = "Base"
+    ev_ebitda_growth_multipliers: tuple = (1, 0.8, 0.7, 0.6)
+    revenue_growth_haircut: float = 0.9
+    pe_growth_haircut: float = 0.7
+    pe_weights: tuple = (0.2, 0.2, 0.3, 0.3)  # own PE (full, haircut growth), industry PE (full, haircut growth)
+    pb_growth_haircut: float = 0.8
+    pb_weights: tuple = (0.3, 0.3, 0.2, 0.2)  # own PB (full, haircut growth), industry PBV (full, haircut growth)
+    blend_weights: tuple = (0.25, 0.25, 0.25, 0.25)  # PE, EV/EBITDA, Revenue, PB
+
+DEFAULT_SCENARIO = ValuationScenario()
+
+# Vectorized Valuation Engine
+# Column-wise versions of the per-row functions above. They give the same numbers,
+# including the max(...,1) clamps, NaN defaults and the PB_elements_is_1 flag.
+# A division by zero raises in the per-row code and ends up as None, so it is NaN here.
+# The *_values kernels take plain arrays so that finx.scenarios can broadcast stock
+# columns of shape (N, 1) against scenario parameters of shape (1, M).
+
+def column_values(df, name):
+    return pd.to_numeric(df[name], errors='coerce').to_numpy(dtype='float64')
+
+def _fill_nan(values, default):
+    return np.where(np.isnan(values), default, values)
+
+def _clamp_or_one(values):
+    return _fill_nan(np.maximum(values, 1.0), 1.0)
+
+def safe_divide(numerator, denominator):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = numerator / denominator
+    return np.where(denominator == 0, np.nan, result)
+
+def calculate_enterprise_value(df):
+    return column_values(df, 'Number of equity shares') * column_values(df, 'Current Price') + column_values(df, 'Debt') - column_values(df, 'Cash Equivalents')
+
+def calculate_ev_ebitda_multiple(df):
+    return safe_divide(column_values(df, 'Enterprise Value'), column_values(df, 'EBITDA'))
+
+# Average over the growth multipliers; a NaN multiplier is an unused slot when scenarios
+# with different numbers of multipliers are stacked
+def ev_ebitda_values(ebitda, ev_ebitda, debt, shares, growth, multipliers):
+    total = 0
+    count = 0
+    for multiplier in multipliers:
+        estimated_ebitda = ebitda * (1 + growth * multiplier)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            value = (estimated_ebitda * ev_ebitda - debt) / shares
+        used = ~np.isnan(multiplier)
+        total = total + np.where(used, value, 0)
+        count = count + used
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(shares <= 0, np.nan, total / count)
+
+def revenue_values(shares, current_price, ttm_revenue, revenue_growth_a, haircut):
+    revenue_multiple = safe_divide(shares * current_price, ttm_revenue)
+    revenue_growth_b = revenue_growth_a * haircut
+    price_per_share_a = safe_divide(ttm_revenue * (1 + revenue_growth_a) * revenue_multiple, shares)
+    price_per_share_b = safe_divide(ttm_revenue * (1 + revenue_growth_b) * revenue_multiple, shares)
+    return (price_per_share_a + price_per_share_b) / 2
+
+def pe_values(ttm_pat, pat_growth, price_to_earning, industry_pe, num_equity_shares, haircut, weights):
+    estimated_pat_a = ttm_pat * (1 + pat_growth)
+    estimated_pat_b = ttm_pat * (1 + pat_growth * haircut)
+    price_per_share_a = safe_divide(estimated_pat_a * price_to_earning, num_equity_shares)
+    price_per_share_b = safe_divide(estimated_pat_b * price_to_earning, num_equity_shares)
+    price_per_share_c = safe_divide(estimated_pat_a * industry_pe, num_equity_shares)
+    price_per_share_d = safe_divide(estimated_pat_b * industry_pe, num_equity_shares)
+    return (
+        (price_per_share_a * weights[0]) +
+        (price_per_share_b * weights[1]) +
+        (price_per_share_c * weights[2]) +
+        (price_per_share_d * weights[3])
+    )
+
+def pb_values(price_to_book, industry_pb, book_value_2yr_back, book_value, haircut, weights):
+    growth_in_book_value_a = ((book_value / book_value_2yr_back) ** 0.5 - 1) * 100
+    growth_in_book_value_b = growth_in_book_value_a * haircut
+    expected_book_value_a = book_value * (1 + growth_in_book_value_a / 100)
+    expected_book_value_b = book_value * (1 + growth_in_book_value_b / 100)
+    return (
+        expected_book_value_a * price_to_book * weights[0] +
+        expected_book_value_b * price_to_book * weights[1] +
+        expected_book_value_a * industry_pb * weights[2] +
+        expected_book_value_b * industry_pb * weights[3]
+    )
+
+def blended_values(pe_value, ev_ebitda_value, revenue_value, pb_value, current_price, weights):
+    final_expected_price = (
+        weights[0] * pe_value +
+        weights[1] * ev_ebitda_value +
+        weights[2] * revenue_value +
+        weights[3] * pb_value
+    )
+    gain = safe_divide(final_expected_price - current_price, current_price) * 100
+    final_expected_price = np.where(current_price == 0, np.nan, final_expected_price)
+    return final_expected_price, gain
+
+# Inputs of the PE method after the NaN defaults and max(...,1) clamps
+def pe_inputs(df):
+    return (
+        _fill_nan(column_values(df, 'Profit after tax'), 1.0),
+        _fill_nan(column_values(df, 'Profit growth') / 100, 0.0),
+        _clamp_or_one(column_values(df, 'Price to Earning')),
+        _clamp_or_one(column_values(df, 'Industry PE')),
+        _fill_nan(column_values(df, 'Number of equity shares'), 1.0),
+    )
+
+# Inputs of the PB method after the max(...,1) clamps
+def pb_inputs(df):
+    return (
+        _clamp_or_one(column_values(df, 'Price to book value')),
+        _clamp_or_one(column_values(df, 'Industry PBV')),
+        _clamp_or_one(column_values(df, 'Book value preceding year')),
+        _clamp_or_one(column_values(df, 'Book value')),
+    )
+
+def ev_ebitda_method_values(df, scenario=DEFAULT_SCENARIO):
+    return ev_ebitda_values(
+        column_values(df, 'EBITDA'), column_values(df, 'EV/EBITDA'), column_values(df, 'Debt'),
+        column_values(df, 'Number of equity shares'), column_values(df, 'Operating profit growth') / 100,
+        scenario.ev_ebitda_growth_multipliers,
+    )
+
+def revenue_method_values(df, scenario=DEFAULT_SCENARIO):
+    return revenue_values(
+        column_values(df, 'Number of equity shares'), column_values(df, 'Current Price'), column_values(df, 'Sales'),
+        column_values(df, 'Sales growth') / 100, scenario.revenue_growth_haircut,
+    )
+
+def pe_method_values(df, scenario=DEFAULT_SCENARIO):
+    return pe_values(*pe_inputs(df), scenario.pe_growth_haircut, scenario.pe_weights)
+
+def pb_method_values(df, scenario=DEFAULT_SCENARIO):
+    price_to_book, industry_pb, book_value_2yr_back, book_value = pb_inputs(df)
+    pb_elements_is_1 = np.where(
+        (price_to_book == 1) | (industry_pb == 1) | (book_value_2yr_back == 1) | (book_value == 1), "yes", "no"
+    )
+    average_market_price_per_share = pb_values(
+        price_to_book, industry_pb, book_value_2yr_back, book_value, scenario.pb_growth_haircut, scenario.pb_weights
+    )
+    return average_market_price_per_share, pb_elements_is_1
+
+def blended_price_and_gain(df, scenario=DEFAULT_SCENARIO):
+    return blended_values(
+        column_values(df, 'Value as per PE Multiple'), column_values(df, 'Value as per EV/EBITDA Method'),
+        column_values(df, 'Value as per Revenue Method'), column_values(df, 'Value as per PB Multiple'),
+        column_values(df, 'Current Price'), scenario.blend_weights,
+    )
+
+# Adds Enterprise Value, EV/EBITDA, the four method values, PB_elements_is_1, Gain% and Final expected price.
+# With copy=False the columns are added to `df` itself, for callers that own the frame.
+def calculate_valuations(df, scenario=DEFAULT_SCENARIO, copy=True):
+    if copy:
+        df = df.copy()
+    df['EBITDA'] = df['Operating profit']
+    df['Market Capitalisation'] = df['Market Capitalization']
+    df['Enterprise Value'] = calculate_enterprise_value(df)
+    df['EV/EBITDA'] = calculate_ev_ebitda_multiple(df)
+    rows = len(df)
+    with span('valuation.ev_ebitda', rows):
+        df['Value as per EV/EBITDA Method'] = ev_ebitda_method_values(df, scenario)
+    with span('valuation.revenue', rows):
+        df['Value as per Revenue Method'] = revenue_method_values(df, scenario)
+    with span('valuation.pe', rows):
+        df['Value as per PE Multiple'] = pe_method_values(df, scenario)
+    with span('valuation.pb', rows):
+        df['Value as per PB Multiple'], df['PB_elements_is_1'] = pb_method_values(df, scenario)
+    with span('valuation.blend', rows):
+        final_expected_price, gain = blended_price_and_gain(df, scenario)
+    df['Gain%'] = gain
+    df['Final expected price'] = final_expected_price
+    return df
+
+# Process Data Function
+def process_financial_data(input_file):
+    with span('csv_parse') as parse:
+        data = pd.read_csv(input_file)
+        parse.rows = len(data)
+    data = calculate_valuations(data)
+    return data
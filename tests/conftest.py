@@ -0,0 +1,21 @@
+import pytest
+
+from tests.screener_server import Screen, ScreenerStandIn
+
+# Screens the stand-in serves, as name -> CSV export
+SCREENS = {
+    'banks': b"Name,NSE Code,Current Price\nAlpha Bank,ALPHA,101.5\nBeta Bank,BETA,55.25\n",
+    'pharma': b"Name,NSE Code,Current Price\nGamma Labs,GAMMA,820.0\n",
+    'autos': b"Name,NSE Code,Current Price\nDelta Motors,DELTA,1220.0\n",
+    'steel': b"Name,NSE Code,Current Price\nEpsilon Steel,EPS,140.0\n",
+}
+
+
+@pytest.fixture
+def screener():
+    stand_in = ScreenerStandIn()
+    for name, content in SCREENS.items():
+        stand_in.screens[name] = Screen(content)
+    stand_in.start()
+    yield stand_in
+    stand_in.stop()
@@ -0,0 +1,148 @@
+# A local stand-in for the parts of screener.in the fetchers use: the Django login form, screen
+# pages holding the export form, and the CSV export with ETag / Last-Modified validators.
+import secrets
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs, urlsplit
+
+CSRF_TOKEN = "stand-in-csrf-token"
+
+LOGIN_PAGE = f"""<html><body>
+<form method="post" action="/login/">
+  <input type="hidden" name="csrfmiddlewaretoken" value="{CSRF_TOKEN}">
+  <input type="text" name="username">
+  <input type="password" name="password">
+  <button type="submit">Login</button>
+</form>
+</body></html>"""
+
+SCREEN_PAGE = """<html><body>
+<form method="get" action="/search/"><input type="text" name="q"></form>
+<form method="post" action="/screens/{name}/export/">
+  <input type="hidden" name="csrfmiddlewaretoken" value="{token}">
+  <button type="submit" class="button tooltip-left">Export</button>
+</form>
+</body></html>"""
+
+
+class Screen:
+    # One screen's export; validators=False leaves out ETag and Last-Modified
+    def __init__(self, content, validators=True):
+        self.validators = validators
+        self.set_content(content)
+
+    def set_content(self, content):
+        self.content = content
+        self.etag = f'"{secrets.token_hex(8)}"'
+        self.last_modified = formatdate(usegmt=True)
+
+
+class ScreenerStandIn:
+    def __init__(self, username="user", password="secret"):
+        self.username = username
+        self.password = password
+        self.screens = {}
+        self.sessions = set()
+        # path -> statuses answered before the real response, e.g. [503]
+        self.failures = {}
+        # (method, path) of every request, in order
+        self.requests = []
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def screen_url(self, name):
+        return f"{self.base_url}/screens/{name}/"
+
+    def count(self, method, path):
+        with self._lock:
+            return self.requests.count((method, path))
+
+    # Forget every login, as when the site expires the sessions
+    def expire_sessions(self):
+        with self._lock:
+            self.sessions.clear()
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                stand_in._handle(self, "GET")
+
+            def do_POST(self):
+                stand_in._handle(self, "POST")
+
+        return Handler
+
+    def _logged_in(self, request):
+        cookie = SimpleCookie(request.headers.get("Cookie", ""))
+        with self._lock:
+            return "sessionid" in cookie and cookie["sessionid"].value in self.sessions
+
+    def _handle(self, request, method):
+        path = urlsplit(request.path).path
+        form = {}
+        if method == "POST":
+            body = request.rfile.read(int(request.headers.get("Content-Length", 0))).decode()
+            form = {key: values[0] for key, values in parse_qs(body).items()}
+        with self._lock:
+            self.requests.append((method, path))
+            failures = self.failures.get(path)
+            status = failures.pop(0) if failures else None
+        if status is not None:
+            return self._send(request, status, b"")
+
+        if path == "/login/":
+            if method == "GET":
+                return self._send(request, 200, LOGIN_PAGE.encode())
+            if (form.get("csrfmiddlewaretoken") == CSRF_TOKEN and form.get("username") == self.username
+                    and form.get("password") == self.password):
+                session_id = secrets.token_hex(16)
+                with self._lock:
+                    self.sessions.add(session_id)
+                return self._send(request, 302, b"", {"Location": "/dash/", "Set-Cookie": f"sessionid={session_id}; Path=/"})
+            return self._send(request, 200, LOGIN_PAGE.encode())
+
+        parts = path.strip("/").split("/")
+        if parts[0] == "screens" and len(parts) >= 2 and parts[1] in self.screens:
+            if not self._logged_in(request):
+                return self._send(request, 302, b"", {"Location": f"/login/?next={path}"})
+            screen = self.screens[parts[1]]
+            if len(parts) == 2 and method == "GET":
+                return self._send(request, 200, SCREEN_PAGE.format(name=parts[1], token=CSRF_TOKEN).encode())
+            if len(parts) == 3 and parts[2] == "export" and method == "POST":
+                if form.get("csrfmiddlewaretoken") != CSRF_TOKEN:
+                    return self._send(request, 403, b"")
+                if screen.validators and request.headers.get("If-None-Match") == screen.etag:
+                    return self._send(request, 304, b"")
+                headers = {"Content-Type": "text/csv", "Content-Disposition": f'attachment; filename="{parts[1]}.csv"'}
+                if screen.validators:
+                    headers.update({"ETag": screen.etag, "Last-Modified": screen.last_modified})
+                return self._send(request, 200, screen.content, headers)
+        if method == "GET":
+            return self._send(request, 200, b"<html><body>Dashboard</body></html>")
+        return self._send(request, 404, b"")
+
+    def _send(self, request, status, body, headers=None):
+        request.send_response(status)
+        headers = {"Content-Type": "text/html; charset=utf-8", **(headers or {})}
+        for name, value in headers.items():
+            request.send_header(name, value)
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
@@ -0,0 +1,112 @@
+# run_backtest on a small hand-built panel with known returns, and on histories too short to score
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import screener_universe
+from finx.backtest import BACKTEST_GROUPS, DECILES, PANEL_COLUMNS, build_panel, run_backtest
+
+pytestmark = pytest.mark.filterwarnings("ignore::RuntimeWarning")
+
+CODES = [f"S{i}" for i in range(10)]
+DATES = ['2024-01-01', '2024-02-01', '2024-03-05']
+
+# Predicted upside in Gain% points, the same on every date
+GAINS = np.array([-40, -30, -20, -10, 10, 20, 30, 40, 50, 60], dtype=float)
+
+# Realised returns from the first to the second date (in predicted order), and from the second
+# to the third: half as large, with the two lowest swapped
+FIRST_RETURNS = np.array([-0.2, -0.1, -0.05, 0.01, 0.02, 0.03, 0.04, 0.05, 0.1, 0.2])
+SECOND_RETURNS = np.concatenate(([FIRST_RETURNS[1], FIRST_RETURNS[0]], FIRST_RETURNS[2:])) / 2
+
+
+@pytest.fixture(scope="module")
+def panel():
+    first_prices = np.full(len(CODES), 100.0)
+    second_prices = first_prices * (1 + FIRST_RETURNS)
+    third_prices = second_prices * (1 + SECOND_RETURNS)
+    frames = []
+    for date, prices in zip(DATES, [first_prices, second_prices, third_prices]):
+        frames.append(pd.DataFrame({
+            'Date': pd.Timestamp(date),
+            'NSE Code': CODES,
+            'Is SME': [1] * 5 + [0] * 5,
+            'Screened': [False] * 9 + [True],
+            'Current Price': prices,
+            'Final expected price': prices * (1 + GAINS / 100),
+            'Gain%': GAINS,
+        }))
+    return pd.concat(frames, ignore_index=True)[PANEL_COLUMNS]
+
+
+@pytest.fixture(scope="module")
+def result(panel):
+    return run_backtest(panel, horizon_days=30)
+
+
+def test_observations(result):
+    observations = result['observations']
+    # The last date has no snapshot 30 days later
+    assert len(observations) == 2 * len(CODES)
+    assert observations['Date'].unique().tolist() == [pd.Timestamp(date) for date in DATES[:2]]
+    np.testing.assert_allclose(observations['Realised return'], np.concatenate([FIRST_RETURNS, SECOND_RETURNS]))
+    np.testing.assert_allclose(observations['Predicted upside'], np.tile(GAINS / 100, 2))
+
+
+def test_hit_rate(result):
+    summary = result['summary']
+    # S3 was predicted to fall but rose, on both dates
+    assert summary.loc['all', 'Hit rate'] == pytest.approx(18 / 20)
+    assert summary.loc['sme', 'Hit rate'] == pytest.approx(8 / 10)
+    assert summary.loc['non_sme', 'Hit rate'] == 1.0
+    assert summary['Observations'].tolist() == [20, 10, 10, 2, 0]
+    assert summary.loc['all', 'Dates'] == 2
+
+
+def test_rank_ic(result):
+    # One adjacent swap among 10 stocks: 1 - 6 * 2 / (10 * 99)
+    swapped_ic = 1 - 12 / 990
+    np.testing.assert_allclose(result['rank_ic']['all'].to_numpy(), [1.0, swapped_ic, np.nan])
+    assert result['summary'].loc['all', 'Mean rank IC'] == pytest.approx((1 + swapped_ic) / 2)
+    ic = np.array([1.0, swapped_ic])
+    assert result['summary'].loc['all', 'IC t-stat'] == pytest.approx(ic.mean() / ic.std(ddof=1) * np.sqrt(2))
+    # Two screened stocks per date are too few for a rank IC
+    assert result['rank_ic']['non_sme_screened'].isna().all()
+    assert np.isnan(result['summary'].loc['non_sme_screened', 'Mean rank IC'])
+
+
+def test_decile_means(result):
+    deciles = result['deciles']
+    # Ten stocks a date: one per decile, dates weighted equally
+    np.testing.assert_allclose(deciles['all'].to_numpy(), (FIRST_RETURNS + SECOND_RETURNS) / 2)
+    summary = result['summary'].loc['all']
+    assert summary['Top decile return'] == pytest.approx(0.15)
+    assert summary['Bottom decile return'] == pytest.approx(-0.125)
+    assert summary['Top - bottom spread'] == pytest.approx(0.275)
+    # Five SME stocks a date fill every other decile
+    assert deciles['sme'].isna().tolist() == [True, False] * 5
+
+
+def assert_nothing_scored(result):
+    summary = result['summary']
+    assert summary.index.tolist() == BACKTEST_GROUPS
+    assert (summary['Observations'] == 0).all() and (summary['Dates'] == 0).all()
+    assert summary.drop(columns=['Observations', 'Dates']).isna().all().all()
+    assert result['observations'].empty
+    assert result['deciles'].shape == (DECILES, len(BACKTEST_GROUPS))
+    assert result['deciles'].isna().all().all()
+    assert result['rank_ic'].isna().all().all()
+
+
+def test_empty_history():
+    panel = build_panel([])
+    assert panel.columns.tolist() == PANEL_COLUMNS
+    result = run_backtest(panel)
+    assert_nothing_scored(result)
+    assert result['rank_ic'].empty
+
+
+def test_single_snapshot_history():
+    result = run_backtest(build_panel([('2024-01-01', screener_universe(50, seed=29))]))
+    assert_nothing_scored(result)
+    assert len(result['rank_ic']) == 1
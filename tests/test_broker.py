@@ -0,0 +1,194 @@
+# KiteData and RateLimiter against a fake KiteConnect, on a fake clock that sleeping advances
+import pytest
+
+pytest.importorskip("kiteconnect")
+
+from kiteconnect.exceptions import InputException, NetworkException
+
+from finx.broker import LTP_BATCH_SIZE, QUOTE_RATE, RATE_LIMIT_RETRIES, KiteData, RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeKite:
+    # Quotes every instrument at `price`; `errors` are raised, in order, by the next calls
+    def __init__(self, holdings=(), price=100.0):
+        self._holdings = list(holdings)
+        self.price = price
+        self.errors = []
+        self.holdings_calls = 0
+        self.ltp_calls = []
+
+    def _maybe_fail(self):
+        if self.errors:
+            raise self.errors.pop(0)
+
+    def holdings(self):
+        self.holdings_calls += 1
+        self._maybe_fail()
+        return [dict(holding) for holding in self._holdings]
+
+    def ltp(self, keys):
+        self.ltp_calls.append(list(keys))
+        self._maybe_fail()
+        return {key: {'instrument_token': self.token(key), 'last_price': self.price} for key in keys}
+
+    @staticmethod
+    def token(key):
+        return sum(ord(character) for character in key)
+
+
+HOLDINGS = [
+    {'tradingsymbol': 'TCS', 'quantity': 10, 'average_price': 3000.0, 'last_price': 3500.0, 'exchange': 'NSE'},
+    {'tradingsymbol': 'INFY', 'quantity': 5, 'average_price': 1400.0, 'last_price': 1500.0, 'exchange': 'BSE'},
+]
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def kite_data(kite, clock, **kwargs):
+    return KiteData(kite, clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def rate_limited():
+    return NetworkException("Too many requests", code=429)
+
+
+def test_rate_limiter_spaces_calls(clock):
+    limiter = RateLimiter(4, clock=clock, sleep=clock.sleep)
+    for _ in range(3):
+        limiter.wait()
+    assert clock.sleeps == [0.25, 0.25]
+
+    # A caller arriving after the interval is not held back
+    clock.now += 1.0
+    limiter.wait()
+    assert clock.sleeps == [0.25, 0.25]
+
+
+def test_holdings_are_cached_for_their_ttl(clock):
+    kite = FakeKite(HOLDINGS)
+    data = kite_data(kite, clock, holdings_ttl=60.0)
+    frame = data.holdings()
+    assert frame.columns.tolist() == ['Instrument', 'Qty.', 'Avg. cost', 'LTP']
+    assert frame['Instrument'].tolist() == ['TCS', 'INFY']
+
+    clock.now += 59.0
+    data.holdings()
+    assert kite.holdings_calls == 1
+    clock.now += 1.0
+    data.holdings()
+    assert kite.holdings_calls == 2
+    data.holdings(refresh=True)
+    assert kite.holdings_calls == 3
+
+
+def test_holdings_warm_the_price_cache(clock):
+    kite = FakeKite(HOLDINGS)
+    data = kite_data(kite, clock)
+    portfolio = data.holdings()
+    # INFY is held on BSE; its price is cached and quoted there
+    assert data.last_prices(['TCS', 'INFY']) == {'TCS': 3500.0, 'INFY': 1500.0}
+    assert data.refresh_prices(portfolio)['LTP'].tolist() == [3500.0, 1500.0]
+    assert kite.ltp_calls == []
+    assert data.last_prices(['INFY', 'WIPRO'], refresh=True) == {'INFY': 100.0, 'WIPRO': 100.0}
+    assert kite.ltp_calls == [['BSE:INFY', 'NSE:WIPRO']]
+
+
+def test_prices_expire_after_the_quote_ttl(clock):
+    kite = FakeKite()
+    data = kite_data(kite, clock, quote_ttl=5.0)
+    assert data.last_prices(['TCS', 'INFY', 'TCS']) == {'TCS': 100.0, 'INFY': 100.0}
+    clock.now += 4.0
+    kite.price = 101.0
+    assert data.last_prices(['TCS']) == {'TCS': 100.0}
+    assert len(kite.ltp_calls) == 1
+
+    clock.now += 1.0
+    assert data.last_prices(['TCS', 'INFY']) == {'TCS': 101.0, 'INFY': 101.0}
+    assert kite.ltp_calls[1] == ['NSE:TCS', 'NSE:INFY']
+
+
+def test_stale_prices_are_fetched_in_batches(clock):
+    kite = FakeKite()
+    data = kite_data(kite, clock)
+    instruments = [f"S{number}" for number in range(2 * LTP_BATCH_SIZE + 1)]
+    data.last_prices(instruments[:10])
+    prices = data.last_prices(instruments)
+    assert len(prices) == len(instruments)
+    # The ten cached prices are not asked for again
+    assert [len(batch) for batch in kite.ltp_calls] == [10, LTP_BATCH_SIZE, len(instruments) - 10 - LTP_BATCH_SIZE]
+    assert kite.ltp_calls[1][0] == "NSE:S10"
+    # Quote calls after the first are held to the quote rate limit
+    assert clock.sleeps == [1.0 / QUOTE_RATE] * 2
+
+
+def test_rate_limited_calls_back_off_and_retry(clock):
+    kite = FakeKite()
+    kite.errors = [rate_limited(), rate_limited()]
+    data = kite_data(kite, clock)
+    assert data.last_prices(['TCS']) == {'TCS': 100.0}
+    assert len(kite.ltp_calls) == 3
+    # Backoff of 1 s then 2 s; the limiter needs no extra wait after those
+    assert clock.sleeps == [1, 2]
+
+
+def test_rate_limited_calls_give_up_after_the_retries(clock):
+    kite = FakeKite()
+    kite.errors = [rate_limited() for _ in range(RATE_LIMIT_RETRIES + 1)]
+    data = kite_data(kite, clock)
+    with pytest.raises(NetworkException):
+        data.holdings()
+    assert kite.holdings_calls == RATE_LIMIT_RETRIES + 1
+    assert [sleep for sleep in clock.sleeps if sleep >= 1] == [2 ** attempt for attempt in range(RATE_LIMIT_RETRIES)]
+
+
+def test_other_errors_are_not_retried(clock):
+    kite = FakeKite()
+    kite.errors = [InputException("Invalid instrument")]
+    data = kite_data(kite, clock)
+    with pytest.raises(InputException):
+        data.last_prices(['TCS'])
+    assert len(kite.ltp_calls) == 1
+    assert clock.sleeps == []
+
+
+def test_instrument_tokens_refetch_only_unknown_instruments(clock):
+    kite = FakeKite(HOLDINGS)
+    data = kite_data(kite, clock)
+    # Holdings carry no tokens, so the first lookup asks for quotes
+    data.holdings()
+    assert data.instrument_tokens(['TCS']) == {'TCS': FakeKite.token('NSE:TCS')}
+    assert kite.ltp_calls == [['NSE:TCS']]
+
+    data.instrument_tokens(['TCS'])
+    assert len(kite.ltp_calls) == 1
+
+    # An unknown instrument refetches the whole list, even fresh prices
+    tokens = data.instrument_tokens(['TCS', 'INFY'])
+    assert tokens == {'TCS': FakeKite.token('NSE:TCS'), 'INFY': FakeKite.token('BSE:INFY')}
+    assert kite.ltp_calls[1] == ['NSE:TCS', 'BSE:INFY']
+
+
+def test_refresh_prices_keeps_unquoted_ltp(clock):
+    kite = FakeKite(HOLDINGS)
+    data = kite_data(kite, clock)
+    portfolio = data.holdings()
+    portfolio.loc[len(portfolio)] = [None, 1, 10.0, 12.0]
+    refreshed = data.refresh_prices(portfolio, refresh=True)
+    assert refreshed['LTP'].tolist() == [100.0, 100.0, 12.0]
+    assert portfolio['LTP'].tolist() == [3500.0, 1500.0, 12.0]
@@ -0,0 +1,152 @@
+# Schema migrations, foreign keys and incremental BLOB I/O of the SQLite store
+import hashlib
+import sqlite3
+
+import pytest
+
+from benchmarks.synthetic import screener_universe
+from finx import db, portfolio_store
+from finx.cache import SnapshotCache, get_processed_snapshot
+from finx.db import MIGRATIONS, close_connections, connect, insert_blob, migrate, open_blob
+from finx.snapshots import get_snapshot_data, list_snapshots, save_snapshot
+from finx.universe import load_universe
+
+SNAPSHOT_CSV = screener_universe(20, seed=5).to_csv(index=False).encode()
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    yield str(tmp_path / "store.db")
+    close_connections()
+
+
+# Function to create a database the way the app left it before versioned snapshots:
+# one unlinked row per file table and portfolio blobs in the listed table
+def create_legacy_database(path, portfolios):
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("CREATE TABLE file_metadata (id INTEGER PRIMARY KEY AUTOINCREMENT, filename TEXT, upload_time TEXT)")
+        conn.execute("CREATE TABLE file_storage (id INTEGER PRIMARY KEY AUTOINCREMENT, file_data BLOB)")
+        conn.execute("""CREATE TABLE portfolio_files (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT,
+                        file_data BLOB, upload_time TEXT)""")
+        conn.execute("INSERT INTO file_metadata (filename, upload_time) VALUES ('all_stocks.csv', '2024-01-02 10:00:00')")
+        conn.execute("INSERT INTO file_storage (file_data) VALUES (?)", (SNAPSHOT_CSV,))
+        conn.executemany("INSERT INTO portfolio_files (name, file_data, upload_time) VALUES (?, ?, ?)", portfolios)
+    conn.close()
+
+
+def schema(conn):
+    return sorted(conn.execute("SELECT type, name, sql FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'").fetchall())
+
+
+def foreign_keys(conn, table):
+    return [(row[2], row[3], row[4], row[6]) for row in conn.execute(f"PRAGMA foreign_key_list({table})")]
+
+
+def test_legacy_database_is_upgraded(db_path):
+    portfolios = [('holdings.csv', b"Instrument,Qty.\nTCS,1\n", '2024-01-03 09:00:00'),
+                  (None, None, None)]
+    create_legacy_database(db_path, portfolios)
+
+    conn = connect(db_path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+    [(version_id, filename, upload_time, storage_id, file_hash)] = list_snapshots(db_path)
+    assert (filename, upload_time, storage_id) == ('all_stocks.csv', '2024-01-02 10:00:00', 1)
+    assert file_hash == hashlib.sha256(SNAPSHOT_CSV).hexdigest()
+    assert get_snapshot_data(db_path, version_id) == SNAPSHOT_CSV
+
+    # Missing portfolio names, times and blobs become empty values
+    assert portfolio_store.list_portfolio_files(db_path) == [(1, 'holdings.csv', '2024-01-03 09:00:00'), (2, '', '')]
+    with portfolio_store.open_portfolio_file(db_path, 1) as f:
+        assert f.read() == b"Instrument,Qty.\nTCS,1\n"
+    with portfolio_store.open_portfolio_file(db_path, 2) as f:
+        assert f.read() == b""
+    assert foreign_keys(conn, "file_metadata") == [('file_storage', 'storage_id', 'id', 'NO ACTION')]
+    assert foreign_keys(conn, "portfolio_files") == [('portfolio_storage', 'storage_id', 'id', 'CASCADE')]
+    assert conn.execute("PRAGMA foreign_key_check").fetchall() == []
+
+    # New versions are stored alongside the upgraded one
+    save_snapshot(db_path, "next.csv", SNAPSHOT_CSV + b"\n")
+    assert [row[1] for row in list_snapshots(db_path)] == ["next.csv", "all_stocks.csv"]
+
+
+def test_unlinked_versions_are_dropped_on_upgrade(db_path):
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("""CREATE TABLE file_metadata (id INTEGER PRIMARY KEY AUTOINCREMENT, filename TEXT,
+                        upload_time TEXT, storage_id INTEGER)""")
+        conn.execute("CREATE TABLE file_storage (id INTEGER PRIMARY KEY AUTOINCREMENT, file_data BLOB, content_hash TEXT)")
+        conn.execute("INSERT INTO file_storage (file_data, content_hash) VALUES (?, 'hash')", (SNAPSHOT_CSV,))
+        conn.executemany("INSERT INTO file_metadata (filename, upload_time, storage_id) VALUES (?, ?, ?)",
+                         [('kept.csv', 't1', 1), ('orphan.csv', 't2', 7)])
+    conn.close()
+    assert [row[1] for row in list_snapshots(db_path)] == ['kept.csv']
+
+
+def test_migrations_run_once(db_path):
+    create_legacy_database(db_path, [('holdings.csv', b"a\n", 't')])
+    conn = sqlite3.connect(db_path)
+    assert migrate(conn) == len(MIGRATIONS)
+    migrated = schema(conn), conn.execute("SELECT * FROM file_metadata").fetchall()
+    assert migrate(conn) == len(MIGRATIONS)
+    assert (schema(conn), conn.execute("SELECT * FROM file_metadata").fetchall()) == migrated
+    conn.close()
+
+    # A second process finds the database migrated
+    shared = connect(db_path)
+    assert schema(shared) == migrated[0]
+    assert shared.execute("SELECT * FROM portfolio_files").fetchall() == [(1, 'holdings.csv', 't', 1)]
+
+
+def test_deleting_a_portfolio_cascades(db_path):
+    first = portfolio_store.save_portfolio_file(db_path, "first.csv", b"first")
+    second = portfolio_store.save_portfolio_file(db_path, "second.csv", b"second")
+    portfolio_store.delete_portfolio_file(db_path, first)
+
+    assert [row[0] for row in portfolio_store.list_portfolio_files(db_path)] == [second]
+    with connect(db_path) as conn:
+        assert conn.execute("SELECT file_data FROM portfolio_storage").fetchall() == [(b"second",)]
+
+
+def test_foreign_keys_are_enforced(db_path):
+    save_snapshot(db_path, "all_stocks.csv", SNAPSHOT_CSV)
+    with pytest.raises(sqlite3.IntegrityError):
+        with connect(db_path) as conn:
+            conn.execute("DELETE FROM file_storage")
+    with pytest.raises(sqlite3.IntegrityError):
+        with connect(db_path) as conn:
+            conn.execute("INSERT INTO portfolio_files (name, upload_time, storage_id) VALUES ('x', 't', 99)")
+    assert len(list_snapshots(db_path)) == 1
+
+
+@pytest.mark.parametrize('blobopen', [True, False], ids=['blobopen', 'whole'])
+def test_blob_round_trip(db_path, monkeypatch, blobopen):
+    if blobopen and not db.HAS_BLOBOPEN:
+        pytest.skip("sqlite3 has no blobopen")
+    monkeypatch.setattr(db, "HAS_BLOBOPEN", blobopen)
+    monkeypatch.setattr(db, "BLOB_CHUNK_SIZE", 1000)
+    data = bytes(range(256)) * 40 + b"tail"
+    with connect(db_path) as conn:
+        rowid = insert_blob(conn, "portfolio_storage", "file_data", data)
+        empty = insert_blob(conn, "portfolio_storage", "file_data", b"")
+    with connect(db_path) as conn:
+        with open_blob(conn, "portfolio_storage", "file_data", rowid) as f:
+            assert f.read(10) == data[:10]
+            assert f.read() == data[10:]
+        with open_blob(conn, "portfolio_storage", "file_data", empty) as f:
+            assert f.read() == b""
+        assert open_blob(conn, "portfolio_storage", "file_data", rowid + 100) is None
+
+
+def test_insert_blob_sets_other_columns(db_path):
+    with connect(db_path) as conn:
+        rowid = insert_blob(conn, "file_storage", "file_data", bytearray(b"abc"), content_hash="h")
+        assert conn.execute("SELECT file_data, content_hash FROM file_storage WHERE id = ?", (rowid,)).fetchone() == (b"abc", "h")
+
+
+def test_missing_snapshot_blob_is_reported(db_path, tmp_path):
+    connect(db_path)
+    assert load_universe(db_path, 42) is None
+    cache = SnapshotCache(str(tmp_path / "cache"))
+    with pytest.raises(LookupError, match="snapshot deadbeef is missing"):
+        get_processed_snapshot(cache, "deadbeef", lambda: load_universe(db_path, 42), source="universe")
@@ -0,0 +1,119 @@
+# delta_valuations against a full calculate_valuations run, and the change report between snapshots
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import screener_universe
+from finx.delta import VALUATION_TERMS, change_report, delta_valuations, match_previous
+from finx.universe import compact_dtypes
+from finx.valuation import DEFAULT_SCENARIO, calculate_valuations
+
+pytestmark = pytest.mark.filterwarnings("ignore::RuntimeWarning")
+
+ROWS = 300
+
+
+@pytest.fixture(scope="module")
+def universe():
+    return screener_universe(ROWS, seed=11)
+
+
+# Function to get the next export: a few price and book value changes, removed listings,
+# new listings and a new code listed twice
+def next_snapshot(universe):
+    data = universe.copy()
+    data.loc[::7, 'Current Price'] *= 1.05
+    data.loc[3::11, 'Book value'] += 1.0
+    data.loc[5, 'Current Price'] = np.nan
+    data = data.drop(index=[10, 20, 30]).reset_index(drop=True)
+    new_rows = universe.iloc[[40, 41, 42]].copy()
+    new_rows['NSE Code'] = ['NEW1', 'DUP', 'DUP']
+    new_rows['Current Price'] = [12.0, 34.0, 56.0]
+    return pd.concat([data, new_rows], ignore_index=True)
+
+
+def price_refresh(universe, step=20):
+    data = universe.copy()
+    data.loc[::step, 'Current Price'] *= 0.9
+    return data
+
+
+@pytest.mark.parametrize('compact', [False, True], ids=['raw', 'compact'])
+def test_delta_matches_full_run(universe, compact):
+    data = next_snapshot(universe)
+    previous = universe.copy()
+    if compact:
+        previous, data = compact_dtypes(previous), compact_dtypes(data)
+    processed, recomputed = delta_valuations(calculate_valuations(previous), data)
+    pd.testing.assert_frame_equal(processed, calculate_valuations(data))
+    assert recomputed['PE Multiple'] < len(data)
+
+
+@pytest.mark.parametrize('compact', [False, True], ids=['raw', 'compact'])
+def test_price_refresh_recomputes_only_price_terms(universe, compact):
+    previous, data = universe.copy(), price_refresh(universe)
+    if compact:
+        previous, data = compact_dtypes(previous), compact_dtypes(data)
+    processed, recomputed = delta_valuations(calculate_valuations(previous), data)
+    pd.testing.assert_frame_equal(processed, calculate_valuations(data))
+    # Rows whose price was missing before and after do not count as changed
+    changed = int((universe['Current Price'].notna().to_numpy() & (np.arange(ROWS) % 20 == 0)).sum())
+    assert recomputed == {
+        'Enterprise Value': changed, 'EV/EBITDA Method': changed, 'Revenue Method': changed,
+        'PE Multiple': 0, 'PB Multiple': 0, 'Final expected price': changed,
+    }
+
+
+def test_unchanged_snapshot_recomputes_nothing(universe):
+    previous = calculate_valuations(universe)
+    processed, recomputed = delta_valuations(previous, universe.copy())
+    pd.testing.assert_frame_equal(processed, previous)
+    assert set(recomputed.values()) == {0}
+
+
+def test_many_changes_fall_back_to_a_full_run(universe):
+    previous = calculate_valuations(universe)
+    data = price_refresh(universe, step=2)
+    full_run = {term[0]: len(data) for term in VALUATION_TERMS}
+
+    processed, recomputed = delta_valuations(previous, data, max_changed=0.2)
+    assert recomputed == full_run
+    pd.testing.assert_frame_equal(processed, calculate_valuations(data))
+
+    _, recomputed = delta_valuations(previous, data, max_changed=1.0)
+    assert recomputed['PE Multiple'] == 0
+
+
+def test_missing_previous_is_a_full_run(universe):
+    processed, recomputed = delta_valuations(None, universe, DEFAULT_SCENARIO)
+    assert recomputed == {term[0]: len(universe) for term in VALUATION_TERMS}
+    pd.testing.assert_frame_equal(processed, calculate_valuations(universe))
+
+
+def test_match_previous_skips_ambiguous_codes():
+    previous = pd.DataFrame({'NSE Code': ['A', 'B', 'B', None, 'C']})
+    data = pd.DataFrame({'NSE Code': ['C', 'B', 'A', 'D', None, 'A']})
+    # B is listed twice before, A twice after; neither can be matched
+    assert match_previous(previous, data).tolist() == [4, -1, -1, -1, -1, -1]
+
+
+def processed_frame(codes, prices, gains):
+    return pd.DataFrame({
+        'Name': [f"Company {code}" for code in codes], 'NSE Code': codes,
+        'Current Price': prices, 'Gain%': gains,
+    })
+
+
+def test_change_report():
+    previous = processed_frame(['A', 'B', 'C', 'D', None], [10.0, 20.0, 30.0, 40.0, 5.0], [5.0, 50.0, -10.0, 0.0, 1.0])
+    current = processed_frame(['B', 'A', 'C', 'E', None], [21.0, 11.0, 31.0, 50.0, 6.0], [35.0, 25.0, -19.0, 15.0, 90.0])
+    report = change_report(previous, current, gain_threshold=10.0)
+
+    assert report['new_listings']['NSE Code'].tolist() == ['E']
+    assert report['removed_listings']['NSE Code'].tolist() == ['D']
+    moves = report['gain_moves']
+    # Largest move first; C moved by only 9 points
+    assert moves['NSE Code'].tolist() == ['A', 'B']
+    assert moves['Previous Gain%'].tolist() == [5.0, 50.0]
+    assert moves['Gain% change'].tolist() == [20.0, -15.0]
+    assert moves.columns.tolist() == ['Name', 'NSE Code', 'Current Price', 'Previous Gain%', 'Gain%', 'Gain% change']
@@ -0,0 +1,122 @@
+# ScreenerHttpFetcher and fetch_screen_export against the local stand-in for screener.in
+import os
+
+import pytest
+import requests
+
+from finx.fetcher import FetchError, ScreenExport, ScreenerHttpFetcher, fetch_screen_export
+from tests.conftest import SCREENS
+from tests.screener_server import Screen
+
+
+@pytest.fixture
+def fetcher(screener):
+    fetcher = ScreenerHttpFetcher("user", "secret", base_url=screener.base_url, timeout=5, retries=1)
+    yield fetcher
+    fetcher.close()
+
+
+class FakeBrowserPool:
+    # Stands in for ScreenerSessionPool: "downloads" the screen into a job directory of its own
+    def __init__(self, root, content):
+        self.root = root
+        self.content = content
+        self.fetched = []
+
+    def fetch(self, url):
+        self.fetched.append(url)
+        job_dir = os.path.join(self.root, f"job-{len(self.fetched)}")
+        os.makedirs(job_dir)
+        path = os.path.join(job_dir, "export.csv")
+        with open(path, "wb") as f:
+            f.write(self.content)
+        return path
+
+
+def test_fetch_logs_in_once(screener, fetcher):
+    export = fetcher.fetch(screener.screen_url('banks'))
+    assert isinstance(export, ScreenExport)
+    assert export.name == "banks.csv"
+    assert export.getvalue() == SCREENS['banks']
+    fetcher.fetch(screener.screen_url('pharma'))
+    assert screener.count("POST", "/login/") == 1
+
+
+def test_wrong_password_fails(screener):
+    fetcher = ScreenerHttpFetcher("user", "wrong", base_url=screener.base_url, timeout=5)
+    with pytest.raises(FetchError):
+        fetcher.fetch(screener.screen_url('banks'))
+    fetcher.close()
+
+
+def test_unchanged_screen_is_revalidated(screener, fetcher):
+    url = screener.screen_url('banks')
+    screen = screener.screens['banks']
+    fetcher.fetch(url)
+    # Content changed behind an unchanged ETag: only a 304 for the remembered ETag reports it unchanged
+    screen.content = SCREENS['banks'] + b"Stale Bank,STALE,1.0\n"
+    assert fetcher.fetch(url) is None
+    assert screener.count("POST", "/screens/banks/export/") == 2
+    assert fetcher._validators[url]['etag'] == screen.etag
+    assert fetcher._validators[url]['last_modified'] == screen.last_modified
+
+    screen.set_content(SCREENS['banks'] + b"Zeta Bank,ZETA,12.0\n")
+    export = fetcher.fetch(url)
+    assert export.getvalue() == screen.content
+    assert fetcher._validators[url]['etag'] == screen.etag
+
+
+def test_unchanged_content_without_validators_is_not_modified(screener, fetcher):
+    screener.screens['steel'] = Screen(SCREENS['steel'], validators=False)
+    url = screener.screen_url('steel')
+    first = fetcher.fetch(url)
+    assert fetcher._validators[url] == {'etag': None, 'last_modified': None, 'content_hash': first.content_hash}
+    assert fetcher.fetch(url) is None
+
+    screener.screens['steel'].set_content(b"Name,NSE Code,Current Price\n")
+    assert fetcher.fetch(url).getvalue() == b"Name,NSE Code,Current Price\n"
+
+
+def test_expired_session_logs_in_again(screener, fetcher):
+    fetcher.fetch(screener.screen_url('banks'))
+    screener.expire_sessions()
+    assert fetcher.fetch(screener.screen_url('pharma')).getvalue() == SCREENS['pharma']
+    assert screener.count("POST", "/login/") == 2
+
+
+def test_screen_page_get_is_retried(screener, fetcher):
+    screener.failures["/screens/banks/"] = [503]
+    assert fetcher.fetch(screener.screen_url('banks')).getvalue() == SCREENS['banks']
+    assert screener.count("GET", "/screens/banks/") == 2
+
+
+def test_export_post_is_not_retried(screener, fetcher):
+    screener.failures["/screens/banks/export/"] = [503]
+    with pytest.raises(requests.HTTPError):
+        fetcher.fetch(screener.screen_url('banks'))
+    assert screener.count("POST", "/screens/banks/export/") == 1
+
+
+def test_fetch_screen_export_uses_http(screener, fetcher, tmp_path):
+    pool = FakeBrowserPool(str(tmp_path), b"unused")
+    export = fetch_screen_export(screener.screen_url('autos'), fetcher, pool)
+    assert export.getvalue() == SCREENS['autos']
+    assert pool.fetched == []
+
+
+def test_fetch_screen_export_falls_back_to_browser(screener, fetcher, tmp_path):
+    url = screener.screen_url('autos')
+    screener.failures["/screens/autos/export/"] = [500]
+    pool = FakeBrowserPool(str(tmp_path), SCREENS['autos'])
+    export = fetch_screen_export(url, fetcher, pool)
+    assert pool.fetched == [url]
+    assert export == ScreenExport(url, "export.csv", SCREENS['autos'], export.content_hash)
+    assert len(export.content_hash) == 64
+    # The browser's download is removed once read
+    assert not os.path.exists(tmp_path / "job-1")
+
+
+def test_fetch_screen_export_without_browser_raises(screener, fetcher):
+    screener.failures["/screens/autos/export/"] = [500]
+    with pytest.raises(requests.HTTPError):
+        fetch_screen_export(screener.screen_url('autos'), fetcher)
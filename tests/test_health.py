@@ -0,0 +1,100 @@
+# HealthTable against the per-row financial_health_summary f-strings it replaced
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import screener_universe
+from finx.health import MAX_COMPARE, HealthTable
+from finx.universe import compact_dtypes
+
+
+# Function to format one company the way app.py's financial_health_summary did
+def financial_health_summary(row):
+    return {
+        "SME": "Yes" if row['Is SME'] == 1 else "No",
+        "Market Capitalisation": f"{row['Market Capitalization']:,}",
+        "Promoters Holding%": f"{row['Promoter holding']/100:.2%}",
+        "Change in PM": f"{row['Change in promoter holding']:.2f}",
+        "Change in FII Hold%": f"{row['Change in FII holding']/100:.2%}",
+        "Change in DII Hold%": f"{row['Change in DII holding']/100:.2%}",
+        "Cash Conversion Cycle": f"{row['Cash Conversion Cycle']:.2f}",
+        "Price to Book Value%": f"{row['Price to book value']/100:.2%}",
+        "ROE%": f"{row['Return on equity']/100:.2%}",
+        "ROCE%": f"{row['Return on capital employed']/100:.2%}",
+        "ROIC%": f"{row['Return on invested capital']/100:.2%}",
+        "QOQ Sales%": f"{row['QoQ Sales']/100:.2%}",
+        "QOQ Profit%": f"{row['QoQ Profits']/100:.2%}",
+        "Net Profit (Latest Quarter)": f"{row['Net Profit latest quarter']:,}",
+        "Net Profit (3 Quarters Back)": f"{row['Net profit 3quarters back']:,}",
+        "OPM%": f"{row['OPM']/100:.2%}",
+        "YOY Sales%": f"{row['YOY Quarterly sales growth']/100:.2%}",
+        "YOY Profit%": f"{row['YOY Quarterly profit growth']/100:.2%}"
+    }
+
+
+def universe_with_edge_rows():
+    universe = screener_universe(200, seed=23)
+    universe.loc[0, universe.columns[4:]] = np.nan
+    universe.loc[1, 'Is SME'] = np.nan
+    universe.loc[2, 'NSE Code'] = np.nan
+    universe.loc[3, ['Market Capitalization', 'Net Profit latest quarter']] = [1234567.891, -98765.4321]
+    return universe
+
+
+@pytest.fixture(params=['raw', 'compact'])
+def frame(request):
+    universe = universe_with_edge_rows()
+    return compact_dtypes(universe) if request.param == 'compact' else universe
+
+
+def test_summary_matches_per_row_formatting(frame):
+    table = HealthTable(frame)
+    assert frame['Is SME'].isna().any() and frame['Is SME'].eq(1).any()
+    assert frame['OPM'].isna().any()
+    for position in range(len(frame)):
+        # The app formatted the row of a one-company selection
+        _, row = next(frame.iloc[[position]].iterrows())
+        assert table.summary(table.labels[position]) == financial_health_summary(row), position
+
+
+def test_float32_rows_format_like_float32(frame):
+    table = HealthTable(frame)
+    summary = table.summary(table.labels[5])
+    row = frame.iloc[5]
+    assert summary["ROE%"] == f"{row['Return on equity']/100:.2%}"
+    if frame['Return on equity'].dtype == np.float32:
+        assert table.values["ROE%"].dtype == np.float32
+
+
+def test_position_by_label_name_and_code():
+    frame = pd.DataFrame({
+        'Name': ['Alpha', 'Beta', 'Alpha', 'Gamma'],
+        'NSE Code': ['ALP', 'BET', 'ALP2', None],
+        'Is SME': [0, 1, 0, 0],
+    })
+    table = HealthTable(frame)
+    assert table.options() == ['Alpha (ALP)', 'Beta (BET)', 'Alpha (ALP2)', 'Gamma']
+    assert table.position('Beta (BET)') == 1
+    assert table.position('Alpha (ALP2)') == 2
+    # A name listed twice finds its first row
+    assert table.position('Alpha') == 0
+    assert table.position('ALP2') == 2
+    assert table.position('Gamma') == 3
+    assert table.position('') is None
+    assert table.position('Delta') is None
+    assert table.summary('Delta') is None
+    assert table.summary('BET') == {"SME": "Yes"}
+
+
+def test_compare_skips_unknown_keys_and_truncates():
+    frame = universe_with_edge_rows()
+    table = HealthTable(frame)
+    keys = ['not listed', frame['NSE Code'].iloc[4], table.labels[0], 'missing too']
+    view = table.compare(keys)
+    assert view.columns.tolist() == [table.labels[4], table.labels[0]]
+    assert view.index.tolist() == [label for label, _, _ in table.metrics]
+    assert view[table.labels[4]].to_dict() == table.summary(table.labels[4])
+
+    view = table.compare(table.labels[:MAX_COMPARE + 10])
+    assert view.columns.tolist() == table.labels[:MAX_COMPARE].tolist()
+    assert table.compare([]).shape == (len(table.metrics), 0)
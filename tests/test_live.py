@@ -0,0 +1,78 @@
+# Recorded ticks replayed through TickBuffer into LivePortfolio.apply
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("kiteconnect")
+
+from benchmarks.synthetic import holdings, screener_universe
+from finx.live import LIVE_COLUMNS, LivePortfolio, TickBuffer, TickReplay
+from finx.portfolio import build_valuation_index, process_portfolio_data
+from finx.valuation import calculate_valuations
+
+
+@pytest.fixture(scope="module")
+def processed_portfolio():
+    universe = screener_universe(500, seed=3)
+    valuation_index = build_valuation_index(calculate_valuations(universe))
+    portfolio = holdings(40, universe, seed=3).drop_duplicates(subset='Instrument').reset_index(drop=True)
+    return portfolio, valuation_index, process_portfolio_data(portfolio, valuation_index)
+
+
+def recorded_ticks(instruments):
+    # Three rounds of ticks for the first half of the instruments; the last round's prices win
+    rows = []
+    for round_number, tick_time in enumerate([0.0, 0.5, 2.0]):
+        for position, instrument in enumerate(instruments):
+            rows.append({'time': tick_time, 'Instrument': instrument, 'last_price': 100.0 + position + round_number})
+    return pd.DataFrame(rows).sample(frac=1.0, random_state=0)
+
+
+def test_tick_buffer_keeps_latest_price():
+    buffer = TickBuffer()
+    buffer.push([{'instrument_token': 1, 'last_price': 10.0}, {'instrument_token': 2, 'last_price': 20.0}])
+    buffer.push([{'instrument_token': 1, 'last_price': 11.0}])
+    assert buffer.received == 3
+    assert buffer.drain() == {1: 11.0, 2: 20.0}
+    assert buffer.drain() == {}
+
+
+def test_replay_sleeps_between_tick_times():
+    sleeps = []
+    replay = TickReplay(recorded_ticks(['A', 'B']), TickBuffer(), key='Instrument', speed=2.0, sleep=sleeps.append)
+    replay.run()
+    assert sleeps == [0.25, 0.75]
+    assert replay.buffer.received == 6
+
+
+def test_replayed_ticks_update_only_ticked_rows(processed_portfolio):
+    portfolio, valuation_index, processed = processed_portfolio
+    ticked = portfolio['Instrument'].iloc[:len(portfolio) // 2].tolist()
+    buffer = TickBuffer()
+    replay = TickReplay(recorded_ticks(ticked), buffer, key='Instrument', sleep=lambda seconds: None)
+    replay.start()
+    replay.join(timeout=10)
+    assert not replay.is_alive()
+
+    live = LivePortfolio(processed)
+    prices = buffer.drain()
+    assert prices == {instrument: 102.0 + position for position, instrument in enumerate(ticked)}
+    assert live.apply(prices) == len(ticked)
+    assert live.apply({'NOT HELD': 1.0}) == 0
+    assert live.updates == 1
+
+    # The ticked rows match a full process_portfolio_data run at the live prices
+    repriced = portfolio.copy()
+    repriced['LTP'] = repriced['Instrument'].map(prices).fillna(repriced['LTP'])
+    expected = process_portfolio_data(repriced, valuation_index)
+    ticked_rows = expected['Instrument'].isin(ticked).to_numpy()
+    for column in ['LTP', 'P&L/%', 'Max Value', 'HOLD/SELL']:
+        np.testing.assert_array_equal(live.frame.loc[ticked_rows, column].to_numpy(),
+                                      expected.loc[ticked_rows, column].to_numpy())
+    final_expected_price = expected.loc[ticked_rows, 'Final expected price'].to_numpy(dtype='float64')
+    ltp = expected.loc[ticked_rows, 'LTP'].to_numpy(dtype='float64')
+    np.testing.assert_allclose(live.frame.loc[ticked_rows, 'Gain%'].to_numpy(dtype='float64'),
+                               (final_expected_price - ltp) / ltp * 100)
+
+    # Rows that did not tick keep the snapshot's values
+    pd.testing.assert_frame_equal(live.frame.loc[~ticked_rows, LIVE_COLUMNS], processed.loc[~ticked_rows, LIVE_COLUMNS])
@@ -0,0 +1,133 @@
+# Peer-group multiples against a pandas groupby reference, the market-cap fallback and the peer modes
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import screener_universe
+from finx.peers import (
+    MARKET_CAP_BUCKET_NAMES, MIN_PEERS, PEER_MULTIPLES, TRIM_FRACTION, build_peer_index, company_multiples,
+    group_statistics, market_cap_buckets, with_peer_multiples,
+)
+
+pytestmark = pytest.mark.filterwarnings("ignore::RuntimeWarning")
+
+
+# The trimmed mean is a difference of running sums over the whole sorted column, so it can be
+# off from a per-group sum in the last few digits
+TRIMMED_MEAN_RTOL = 1e-9
+
+
+@pytest.fixture(scope="module")
+def universe():
+    return screener_universe(2000, seed=17)
+
+
+def trimmed_mean(values):
+    values = np.sort(values.to_numpy())
+    trim = int(np.floor(len(values) * TRIM_FRACTION))
+    kept = values[trim:len(values) - trim]
+    return kept.mean() if len(kept) else np.nan
+
+
+# Function to get the expected (count, median, trimmed mean) table of one multiple with a pandas groupby
+def reference_statistics(groups, values, index):
+    frame = pd.DataFrame({'group': groups, 'value': values}).dropna()
+    grouped = frame.groupby('group')['value']
+    return pd.DataFrame({
+        'count': grouped.count(), 'median': grouped.median(), 'trimmed mean': grouped.apply(trimmed_mean),
+    }).reindex(index).fillna({'count': 0})
+
+
+def assert_matches_reference(table, groups, multiples):
+    for name in PEER_MULTIPLES:
+        expected = reference_statistics(groups, multiples[name], table.index)
+        np.testing.assert_array_equal(table[(name, 'count')].to_numpy(), expected['count'].to_numpy())
+        for statistic, rtol in [('median', 0), ('trimmed mean', TRIMMED_MEAN_RTOL)]:
+            np.testing.assert_allclose(table[(name, statistic)].to_numpy(), expected[statistic].to_numpy(),
+                                       rtol=rtol, equal_nan=True, err_msg=f"{name} {statistic}")
+
+
+def test_industry_statistics_match_groupby(universe):
+    peer_index = build_peer_index(universe)
+    assert_matches_reference(peer_index['industry'], universe['Industry'].to_numpy(), company_multiples(universe))
+
+
+def test_bucket_statistics_match_groupby(universe):
+    peer_index = build_peer_index(universe)
+    buckets = market_cap_buckets(universe)
+    names = np.append(np.array(MARKET_CAP_BUCKET_NAMES, dtype=object), None)[buckets]
+    assert_matches_reference(peer_index['bucket'], names, company_multiples(universe))
+
+
+def test_group_statistics_of_small_groups():
+    codes = np.array([0, 0, 0, 1, -1, 2, 2])
+    values = np.array([3.0, 1.0, 2.0, 7.0, 100.0, np.nan, np.nan])
+    count, median, trimmed = group_statistics(codes, 4, values)
+    assert count.tolist() == [3, 1, 0, 0]
+    np.testing.assert_array_equal(median, [2.0, 7.0, np.nan, np.nan])
+    np.testing.assert_array_equal(trimmed, [2.0, 7.0, np.nan, np.nan])
+
+
+# Function to build a universe of two industries: Banks with enough usable PEs, Steel with too few
+def two_industries():
+    rows = 2 * MIN_PEERS + 2
+    data = screener_universe(rows, seed=19)
+    data['Industry'] = ['Banks'] * (MIN_PEERS + 2) + ['Steel'] * MIN_PEERS
+    data['Market Capitalization'] = [100.0] * (MIN_PEERS + 2) + [1000.0] * MIN_PEERS
+    data['Price to Earning'] = [10.0, 12.0, 14.0, 16.0, 18.0, 20.0, 22.0] + [30.0, 40.0, -5.0, np.nan, np.nan]
+    data['Price to book value'] = 2.0
+    return data
+
+
+def test_small_industries_fall_back_to_the_market_cap_bucket():
+    data = two_industries()
+    peer_index = build_peer_index(data)
+    assert peer_index['industry'].loc['Steel', ('PE', 'count')] < MIN_PEERS
+    peers = with_peer_multiples(data, peer_index, mode='replace')
+
+    banks = peers['Industry'] == 'Banks'
+    assert (peers.loc[banks, 'Peer PE'] == 16.0).all()
+    assert (peers.loc[banks, 'Peer group'] == 'Banks').all()
+    # Steel's two usable PEs make a Small cap bucket of its own
+    assert (peers.loc[~banks, 'Peer PE'] == 35.0).all()
+    assert (peers.loc[~banks, 'Peer group'] == 'Small cap').all()
+
+
+def test_trimmed_mean_statistic():
+    data = two_industries()
+    peers = with_peer_multiples(data, build_peer_index(data), mode='replace', statistic='trimmed mean')
+    # Seven Banks PEs: one trimmed from each end
+    assert peers.loc[peers['Industry'] == 'Banks', 'Peer PE'].iloc[0] == pytest.approx(16.0)
+
+
+def test_fill_replaces_only_missing_and_below_one():
+    data = two_industries().iloc[:MIN_PEERS + 2].copy()
+    scraped = [np.nan, 0.0, 0.5, 0.999, 1.0, 1.5, 25.0]
+    data['Industry PE'] = scraped
+    data['Industry PBV'] = scraped
+    peer_index = build_peer_index(data)
+
+    filled = with_peer_multiples(data, peer_index, mode='fill')
+    assert filled['Industry PE'].tolist() == [16.0, 16.0, 16.0, 16.0, 1.0, 1.5, 25.0]
+    assert filled['Industry PBV'].tolist() == [2.0, 2.0, 2.0, 2.0, 1.0, 1.5, 25.0]
+
+    replaced = with_peer_multiples(data, peer_index, mode='replace')
+    assert replaced['Industry PE'].tolist() == [16.0] * len(scraped)
+    # The input frame is left alone
+    np.testing.assert_array_equal(data['Industry PE'].to_numpy(), scraped)
+
+
+def test_companies_without_peers_keep_scraped_values():
+    data = two_industries()
+    data['Industry PE'] = np.nan
+    data.loc[data.index[-1], 'Market Capitalization'] = np.nan
+    data.loc[data.index[-1], 'Industry'] = None
+    peers = with_peer_multiples(data, build_peer_index(data), mode='replace')
+    assert np.isnan(peers['Industry PE'].iloc[-1])
+    assert pd.isna(peers['Peer group'].iloc[-1])
+
+
+def test_unknown_mode_is_rejected():
+    data = two_industries()
+    with pytest.raises(ValueError, match="Unknown peer multiple mode"):
+        with_peer_multiples(data, build_peer_index(data), mode='blend')
@@ -0,0 +1,276 @@
+# ScreenerSession and ScreenerSessionPool against the local stand-in, with init_driver replaced by
+# a fake Chrome that browses the stand-in over HTTP and "downloads" exports into its download directory
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+import pytest
+
+pytest.importorskip("selenium")
+
+import requests
+from selenium.common.exceptions import NoSuchElementException, TimeoutException, WebDriverException
+from selenium.webdriver.common.by import By
+
+from finx import scraper
+from finx.fetcher import csrf_token, export_form
+from finx.scraper import ScreenerSession, ScreenerSessionPool, wait_for_download
+from tests.conftest import SCREENS
+
+
+class FakeElement:
+    def __init__(self, driver, kind, name=None):
+        self.driver = driver
+        self.kind = kind
+        self.name = name
+
+    def send_keys(self, text):
+        self.driver.fields[self.name] = text
+
+    def is_displayed(self):
+        return True
+
+    def is_enabled(self):
+        return True
+
+    def click(self):
+        self.driver.click(self)
+
+
+class FakeDriver:
+    # `crashes` maps a URL to an Event; opening that URL waits for the event, then raises like a dead Chrome
+    def __init__(self, download_dir, crashes):
+        self.http = requests.Session()
+        self.download_dir = download_dir
+        self.crashes = crashes
+        self.page = ""
+        self.current_url = "about:blank"
+        self.fields = {}
+        self.added_cookies = []
+        self.quit_called = False
+        # A stalled download stays a .crdownload file
+        self.stalled = False
+
+    def _load(self, response):
+        response.raise_for_status()
+        self.page = response.text
+        self.current_url = response.url
+
+    def get(self, url):
+        if url in self.crashes:
+            self.crashes[url].wait(10)
+            raise WebDriverException("chrome not reachable")
+        self._load(self.http.get(url))
+
+    def find_element(self, by, value):
+        if by == By.NAME and f'name="{value}"' in self.page:
+            return FakeElement(self, 'input', value)
+        if by == By.XPATH and "@type='submit'" in value and 'type="submit"' in self.page:
+            return FakeElement(self, 'submit')
+        if by == By.XPATH and "tooltip-left" in value and "tooltip-left" in self.page:
+            return FakeElement(self, 'export')
+        raise NoSuchElementException(value)
+
+    def click(self, element):
+        if element.kind == 'submit':
+            data = {'csrfmiddlewaretoken': csrf_token(self.page), **self.fields}
+            self._load(self.http.post(urljoin(self.current_url, "/login/"), data=data))
+        elif element.kind == 'export':
+            action, token = export_form(self.page, self.current_url)
+            response = self.http.post(action, data={'csrfmiddlewaretoken': token})
+            response.raise_for_status()
+            filename = re.search(r'filename="([^"]+)"', response.headers['Content-Disposition']).group(1)
+            self._download(filename, response.content)
+
+    # Like Chrome: the file is written under a .crdownload name and renamed once complete
+    def _download(self, filename, content):
+        partial = os.path.join(self.download_dir, filename + ".crdownload")
+        with open(partial, "wb") as f:
+            f.write(content[:len(content) // 2])
+        if self.stalled:
+            return
+
+        def finish():
+            with open(partial, "ab") as f:
+                f.write(content[len(content) // 2:])
+            os.replace(partial, os.path.join(self.download_dir, filename))
+        threading.Timer(0.2, finish).start()
+
+    def execute_cdp_cmd(self, command, params):
+        assert command == "Page.setDownloadBehavior"
+        self.download_dir = params['downloadPath']
+
+    def get_cookies(self):
+        return [{'name': cookie.name, 'value': cookie.value, 'path': cookie.path, 'secure': cookie.secure}
+                for cookie in self.http.cookies]
+
+    def add_cookie(self, cookie):
+        self.added_cookies.append(cookie)
+        self.http.cookies.set(cookie['name'], cookie['value'], path=cookie.get('path', '/'))
+
+    def quit(self):
+        self.quit_called = True
+        self.http.close()
+
+
+class Drivers(list):
+    # The fake drivers started so far, plus the crashes they share
+    crashes = None
+
+
+@pytest.fixture
+def drivers(monkeypatch):
+    started = Drivers()
+    crashes = {}
+
+    def fake_init_driver(download_dir, chromedriver_path, headless=True):
+        driver = FakeDriver(download_dir, crashes)
+        started.append(driver)
+        return driver
+
+    monkeypatch.setattr(scraper, "init_driver", fake_init_driver)
+    started.crashes = crashes
+    return started
+
+
+@pytest.fixture
+def session_options(screener, tmp_path):
+    return {'base_url': screener.base_url, 'download_root': str(tmp_path / "downloads"), 'timeout': 5}
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_session_logs_in_and_downloads(screener, drivers, session_options):
+    session = ScreenerSession("user", "secret", "chromedriver", **session_options)
+    path = session.download(screener.screen_url('banks'), timeout=5)
+    assert read(path) == SCREENS['banks']
+    assert os.path.basename(path) == "banks.csv"
+    assert screener.count("POST", "/login/") == 1
+
+    # The same browser stays logged in for the next screen
+    assert read(session.download(screener.screen_url('pharma'), timeout=5)) == SCREENS['pharma']
+    assert screener.count("POST", "/login/") == 1
+    assert len(drivers) == 1
+
+    session.close()
+    assert drivers[0].quit_called
+    assert not os.path.exists(session_options['download_root'])
+
+
+def test_failed_downloads_remove_their_job_directory(screener, drivers, session_options):
+    session = ScreenerSession("user", "secret", "chromedriver", **{**session_options, 'timeout': 0.3}).start()
+    drivers[0].stalled = True
+    with pytest.raises(TimeoutError):
+        session.download(screener.screen_url('banks'), timeout=0.3)
+    # A page without the export button times out waiting for it
+    with pytest.raises(TimeoutException):
+        session.download(screener.screen_url('unknown'), timeout=0.3)
+    assert os.listdir(session_options['download_root']) == []
+
+    drivers[0].stalled = False
+    path = session.download(screener.screen_url('banks'), timeout=5)
+    assert os.listdir(session_options['download_root']) == [os.path.basename(os.path.dirname(path))]
+    session.close()
+
+
+def test_session_logs_in_again_after_expiry(screener, drivers, session_options):
+    session = ScreenerSession("user", "secret", "chromedriver", **session_options)
+    session.download(screener.screen_url('banks'), timeout=5)
+    screener.expire_sessions()
+    assert read(session.download(screener.screen_url('banks'), timeout=5)) == SCREENS['banks']
+    assert screener.count("POST", "/login/") == 2
+    session.close()
+
+
+def test_session_login_fails_with_wrong_password(screener, drivers, session_options):
+    session = ScreenerSession("user", "wrong", "chromedriver", **{**session_options, 'timeout': 0.5})
+    with pytest.raises(TimeoutException):
+        session.start()
+    session.close()
+
+
+def test_pool_logs_in_once_and_reuses_cookies(screener, drivers, session_options):
+    pool = ScreenerSessionPool("user", "secret", "chromedriver", size=2, **session_options)
+    urls = [screener.screen_url(name) for name in SCREENS]
+    results = pool.fetch_many(urls, timeout=5)
+    assert [read(results[url]) for url in urls] == list(SCREENS.values())
+    assert len(drivers) == 2
+    assert screener.count("POST", "/login/") == 1
+    # The second browser was logged in with the first one's session cookie
+    assert [cookie['name'] for cookie in drivers[1].added_cookies] == ['sessionid']
+    pool.close()
+    assert all(driver.quit_called for driver in drivers)
+
+
+def test_fetch_many_reports_a_crash_and_replaces_the_session(screener, drivers, session_options):
+    crashing_url = screener.screen_url('autos')
+    drivers.crashes[crashing_url] = threading.Event()
+    drivers.crashes[crashing_url].set()
+    pool = ScreenerSessionPool("user", "secret", "chromedriver", size=1, **session_options)
+    urls = [crashing_url, screener.screen_url('banks')]
+    results = pool.fetch_many(urls, timeout=5)
+    assert isinstance(results[crashing_url], WebDriverException)
+    assert read(results[urls[1]]) == SCREENS['banks']
+    assert drivers[0].quit_called
+    assert len(drivers) == 2
+    pool.close()
+
+
+def test_waiting_job_starts_a_replacement_for_a_crashed_session(screener, drivers, session_options):
+    # A full pool whose only session crashes must not leave the job waiting for it stuck forever
+    crashing_url = screener.screen_url('autos')
+    crash = drivers.crashes[crashing_url] = threading.Event()
+    pool = ScreenerSessionPool("user", "secret", "chromedriver", size=1, **session_options)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        crashing = executor.submit(pool.fetch, crashing_url, 5)
+        deadline = time.monotonic() + 5
+        while not drivers and time.monotonic() < deadline:
+            time.sleep(0.01)
+        waiting = executor.submit(pool.fetch, screener.screen_url('banks'), 5)
+        time.sleep(0.2)
+        assert not waiting.done()
+        crash.set()
+        with pytest.raises(WebDriverException):
+            crashing.result(timeout=10)
+        assert read(waiting.result(timeout=10)) == SCREENS['banks']
+    assert len(drivers) == 2
+    pool.close()
+
+
+def test_wait_for_download_returns_the_finished_csv(tmp_path):
+    (tmp_path / "other.txt").write_text("not a download")
+    (tmp_path / "export.csv").write_bytes(b"a,b\n1,2\n")
+    assert wait_for_download(str(tmp_path), timeout=2, poll_interval=0.01) == str(tmp_path / "export.csv")
+
+
+def test_wait_for_download_waits_for_partial_files(tmp_path):
+    (tmp_path / "export.csv").write_bytes(b"a,b\n1,2\n")
+    (tmp_path / "second.csv.crdownload").write_bytes(b"a,b\n")
+    with pytest.raises(TimeoutError):
+        wait_for_download(str(tmp_path), timeout=0.3, poll_interval=0.01)
+
+
+def test_wait_for_download_ignores_empty_files(tmp_path):
+    (tmp_path / "export.csv").write_bytes(b"")
+    with pytest.raises(TimeoutError):
+        wait_for_download(str(tmp_path), timeout=0.3, poll_interval=0.01)
+
+
+def test_wait_for_download_sees_a_download_finish(tmp_path):
+    partial = tmp_path / "export.csv.crdownload"
+    partial.write_bytes(b"a,b\n")
+
+    def finish():
+        time.sleep(0.2)
+        partial.write_bytes(b"a,b\n1,2\n")
+        partial.rename(tmp_path / "export.csv")
+
+    threading.Thread(target=finish).start()
+    path = wait_for_download(str(tmp_path), timeout=5, poll_interval=0.01)
+    assert read(path) == b"a,b\n1,2\n"
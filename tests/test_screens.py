@@ -0,0 +1,145 @@
+# Screen validation, compiled masks against pandas expressions, and binary-search condition counts
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import screener_universe
+from finx import screens
+from finx.screens import ORDERED_OPS, CompiledScreen, ScreenData, ScreenError, condition_count, validate_screen
+
+pytestmark = pytest.mark.filterwarnings("ignore::RuntimeWarning")
+
+
+@pytest.fixture(scope="module")
+def universe():
+    return screener_universe(500, seed=13)
+
+
+@pytest.fixture(params=['numpy', 'numexpr'])
+def engine(request, monkeypatch):
+    if request.param == 'numexpr':
+        pytest.importorskip("numexpr")
+    else:
+        monkeypatch.setattr(screens, "numexpr", None)
+    return request.param
+
+
+@pytest.mark.parametrize('definition, message', [
+    ([], "must be an object"),
+    ({'all': []}, "non-empty list"),
+    ({'any': {'column': 'OPM', 'op': '>', 'value': 1}}, "non-empty list"),
+    ({'all': [{'column': 'OPM', 'op': '>', 'value': 1}], 'any': []}, "must be the only key"),
+    ({'column': 'OPM', 'op': '>'}, "exactly column, op and value"),
+    ({'column': 'OPM', 'op': '>', 'value': 1, 'extra': 2}, "exactly column, op and value"),
+    ({'column': 'OPM', 'op': '=>', 'value': 1}, "Unknown op"),
+    ({'column': 'OPM', 'op': '>', 'value': 'high'}, "needs a finite number"),
+    ({'column': 'OPM', 'op': '<=', 'value': float('nan')}, "needs a finite number"),
+    ({'column': 'OPM', 'op': '<', 'value': None}, "needs a finite number"),
+    ({'column': 'OPM', 'op': 'between', 'value': 5}, r"needs \[low, high\]"),
+    ({'column': 'OPM', 'op': 'between', 'value': [1, 2, 3]}, r"needs \[low, high\]"),
+    ({'column': 'OPM', 'op': 'between', 'value': [1, float('inf')]}, "needs a finite number"),
+    ({'column': 'OPM', 'op': 'between', 'value': [10, 5]}, "needs low <= high"),
+    ({'column': 'Industry', 'op': 'in', 'value': 'Banks'}, "needs a list"),
+    ({'column': 'Industry', 'op': 'not in', 'value': None}, "needs a list"),
+])
+def test_invalid_screens_are_rejected(definition, message):
+    with pytest.raises(ScreenError, match=message):
+        validate_screen(definition)
+
+
+def test_screens_are_normalised():
+    definition = {'any': [{'column': 'OPM', 'op': 'between', 'value': ("1", 2)},
+                          {'column': 'Industry', 'op': 'in', 'value': ('Banks',)}]}
+    assert validate_screen(definition) == {'any': [{'column': 'OPM', 'op': 'between', 'value': [1.0, 2.0]},
+                                                   {'column': 'Industry', 'op': 'in', 'value': ['Banks']}]}
+    assert validate_screen({'column': 'OPM', 'op': 'between', 'value': [3, 3]})['value'] == [3.0, 3.0]
+
+
+def test_unknown_column_is_reported(universe):
+    screen = CompiledScreen({'column': 'No such column', 'op': '>', 'value': 1})
+    with pytest.raises(ScreenError, match="Unknown column"):
+        screen.mask(universe)
+
+
+NUMERIC_SCREEN = {'all': [
+    {'column': 'Market Capitalization', 'op': 'between', 'value': [100, 5000]},
+    {'any': [{'column': 'Return on equity', 'op': '>', 'value': 15},
+             {'column': 'Price to Earning', 'op': '<=', 'value': 20}]},
+    {'column': 'Debt', 'op': '<', 'value': 500},
+]}
+
+MIXED_SCREEN = {'any': [
+    {'all': [{'column': 'Industry', 'op': 'in', 'value': ['Banks', 'Finance', 'Not an industry']},
+             {'column': 'OPM', 'op': '>=', 'value': 10}]},
+    {'all': [{'column': 'Industry', 'op': 'not in', 'value': ['Steel']},
+             {'column': 'Is SME', 'op': '==', 'value': 1},
+             {'column': 'Sales growth', 'op': '>', 'value': 30}]},
+    {'column': 'Industry', 'op': '!=', 'value': 'IT - Software'},
+]}
+
+
+def expected_numeric(df):
+    return (df['Market Capitalization'].between(100, 5000)
+            & ((df['Return on equity'] > 15) | (df['Price to Earning'] <= 20))
+            & (df['Debt'] < 500))
+
+
+def expected_mixed(df):
+    return ((df['Industry'].isin(['Banks', 'Finance', 'Not an industry']) & (df['OPM'] >= 10))
+            | (~df['Industry'].isin(['Steel']) & (df['Is SME'] == 1) & (df['Sales growth'] > 30))
+            | (df['Industry'] != 'IT - Software'))
+
+
+@pytest.mark.parametrize('definition, expected', [(NUMERIC_SCREEN, expected_numeric), (MIXED_SCREEN, expected_mixed)],
+                         ids=['numeric', 'mixed'])
+def test_mask_matches_pandas(universe, engine, definition, expected):
+    screen = CompiledScreen(definition)
+    assert (screen.expression is not None) == (engine == 'numexpr' and definition is NUMERIC_SCREEN)
+    mask = screen.mask(universe)
+    np.testing.assert_array_equal(mask, expected(universe).to_numpy())
+    assert screen.count(ScreenData(universe)) == int(expected(universe).sum())
+
+
+def test_numexpr_and_numpy_agree(universe, monkeypatch):
+    pytest.importorskip("numexpr")
+    compiled = CompiledScreen(NUMERIC_SCREEN).mask(universe)
+    monkeypatch.setattr(screens, "numexpr", None)
+    np.testing.assert_array_equal(compiled, CompiledScreen(NUMERIC_SCREEN).mask(universe))
+
+
+@pytest.mark.parametrize('op', list(ORDERED_OPS) + ['between'])
+def test_condition_count_matches_mask(universe, op):
+    data = ScreenData(universe)
+    column = 'Return on equity'
+    assert universe[column].isna().any()
+    values = universe[column].dropna()
+    # Thresholds below, at, between and above the column's values, including values it holds
+    thresholds = [values.min() - 1, values.min(), values.median(), values.iloc[0], values.max(), values.max() + 1]
+    for threshold in thresholds:
+        value = [threshold - 5, threshold] if op == 'between' else threshold
+        condition = validate_screen({'column': column, 'op': op, 'value': value})
+        assert condition_count(data, condition) == int(screens.condition_mask(data, condition).sum()), (op, threshold)
+
+
+def test_condition_counts_of_a_screen(universe):
+    screen = CompiledScreen(MIXED_SCREEN)
+    data = ScreenData(universe)
+    assert screen.condition_counts(data) == [int(screens.condition_mask(data, condition).sum())
+                                             for condition in screen.conditions]
+
+
+def test_membership_with_missing_categories():
+    frame = pd.DataFrame({'Industry': pd.Categorical(['Banks', None, 'Steel', 'Banks', None])})
+    data = ScreenData(frame)
+
+    def mask(op, value):
+        return CompiledScreen({'column': 'Industry', 'op': op, 'value': value}).mask(data).tolist()
+
+    assert mask('in', ['Banks']) == [True, False, False, True, False]
+    # Categories the column does not have match nothing; missing values are never in a list
+    assert mask('in', ['Cement']) == [False] * 5
+    assert mask('not in', ['Cement']) == [True] * 5
+    assert mask('not in', ['Banks', 'Steel']) == [False, True, False, False, True]
+    assert mask('==', 'Steel') == [False, False, True, False, False]
+    assert mask('!=', 'Steel') == [True, True, False, True, True]
+    assert mask('not in', ['Banks']) == (~frame['Industry'].isin(['Banks'])).tolist()
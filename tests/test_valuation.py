@@ -0,0 +1,92 @@
+# calculate_valuations against the row-wise calculate_* chain it replaced
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import screener_universe
+from finx.valuation import (
+    VALUATION_OUTPUT_COLUMNS, calculate_ev, calculate_ev_ebitda, calculate_ev_ebitda_share_price,
+    calculate_gain_percentage, calculate_pb_method_share_price, calculate_pe_method_share_price,
+    calculate_revenue_method_share_price, calculate_valuations,
+)
+
+pytestmark = pytest.mark.filterwarnings("ignore::RuntimeWarning")
+
+# The vectorized kernels group some products differently from the row-wise code, so the results
+# can differ in the last bit or so (e.g. the PB method by 1 ULP)
+RTOL = 1e-12
+
+
+# Function to value a frame the way process_financial_data did before calculate_valuations
+def rowwise_valuations(data):
+    data = data.copy()
+    data['EBITDA'] = data['Operating profit']
+    data['Market Capitalisation'] = data['Market Capitalization']
+    data['Enterprise Value'] = data.apply(calculate_ev, axis=1)
+    data['EV/EBITDA'] = data.apply(calculate_ev_ebitda, axis=1)
+    data = calculate_ev_ebitda_share_price(data)
+    data = calculate_revenue_method_share_price(data)
+    data = calculate_pe_method_share_price(data)
+    data = calculate_pb_method_share_price(data)
+    data = calculate_gain_percentage(data)
+    return data
+
+
+# Function to get a synthetic universe with the awkward rows of real exports: the generator's
+# missing values, zero operating profit and negative book values, plus one row per edge case
+def edge_case_universe(rows):
+    universe = screener_universe(rows, seed=7)
+    edge_cases = [
+        {'Operating profit': 0.0},
+        {'Book value': -25.0, 'Book value preceding year': -20.0},
+        {'Book value': 0.5, 'Price to book value': 0.4, 'Industry PBV': np.nan},
+        {'Number of equity shares': 0.0},
+        {'Number of equity shares': -1.0},
+        {'Current Price': 0.0},
+        {'Sales': 0.0},
+        {'Price to Earning': np.nan, 'Industry PE': 0.5, 'Profit after tax': np.nan, 'Profit growth': np.nan},
+        {column: np.nan for column in universe.columns[4:]},
+    ]
+    extra = universe.iloc[:len(edge_cases)].copy()
+    for position, values in enumerate(edge_cases):
+        for column, value in values.items():
+            extra.iloc[position, extra.columns.get_loc(column)] = value
+    extra['NSE Code'] = [f"EDGE{position}" for position in range(len(edge_cases))]
+    return pd.concat([universe, extra], ignore_index=True)
+
+
+@pytest.fixture(scope="module")
+def valued():
+    universe = edge_case_universe(400)
+    return universe, rowwise_valuations(universe), calculate_valuations(universe)
+
+
+def test_universe_has_edge_cases(valued):
+    universe, _, _ = valued
+    assert universe['Operating profit'].eq(0).any()
+    assert universe['Book value'].lt(0).any()
+    assert universe['Current Price'].isna().any()
+
+
+@pytest.mark.parametrize('column', [column for column in VALUATION_OUTPUT_COLUMNS if column != 'PB_elements_is_1'])
+def test_values_match_rowwise(valued, column):
+    _, expected, actual = valued
+    np.testing.assert_allclose(
+        pd.to_numeric(actual[column], errors='coerce').to_numpy(dtype='float64'),
+        pd.to_numeric(expected[column], errors='coerce').to_numpy(dtype='float64'),
+        rtol=RTOL, atol=0, equal_nan=True, err_msg=column,
+    )
+
+
+def test_pb_flag_matches_rowwise(valued):
+    _, expected, actual = valued
+    # The row-wise code leaves the flag unset on rows it could not value
+    valued_rows = expected['Value as per PB Multiple'].notna().to_numpy()
+    np.testing.assert_array_equal(actual['PB_elements_is_1'].to_numpy()[valued_rows],
+                                  expected['PB_elements_is_1'].to_numpy()[valued_rows])
+
+
+def test_inputs_are_left_alone(valued):
+    universe, _, actual = valued
+    pd.testing.assert_frame_equal(actual[universe.columns], universe)
+    assert 'Enterprise Value' not in universe.columns